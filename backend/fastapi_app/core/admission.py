@@ -0,0 +1,250 @@
+"""
+Admission Control
+Bounds concurrent executions before they reach a connection pool. Each
+backend has a global limit plus a per-tenant limit (the client address, or
+API key / tenant header when ADMISSION_TRUST_HEADERS says a proxy sets
+them); requests over either limit wait in a bounded queue ordered by
+priority (interactive before batch), then arrival. Requests that
+find the queue full or outlive the queue deadline are rejected with a
+Retry-After estimate instead of piling onto the database.
+"""
+from __future__ import annotations
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Any, AsyncIterator, List, Mapping, Optional, Tuple
+import asyncio
+import bisect
+import hashlib
+import itertools
+import math
+import time
+from .config import settings
+from .metrics import record
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int, controller: str):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.controller = controller
+
+    def detail(self) -> Dict[str, Any]:
+        messages = {
+            "queue_full": "Too many concurrent requests; admission queue is full",
+            "queue_timeout": "Too many concurrent requests; timed out waiting for a slot",
+        }
+        return {
+            "error": messages.get(self.reason, self.reason),
+            "error_type": self.reason,
+            "backend": self.controller,
+            "retry_after": self.retry_after,
+        }
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tenant: str = field(compare=False)
+    weight: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class Ticket:
+    controller: "AdmissionController"
+    tenant: str
+    weight: int
+    granted_at: float
+    waited_ms: float
+    released: bool = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+def identity(headers: Mapping[str, str], client_host: Optional[str], default_priority: str = "interactive",
+             trust_headers: Optional[bool] = None) -> Tuple[str, str]:
+    """
+    (tenant, priority) for a request. X-API-Key / X-Tenant-ID and a raised
+    X-Request-Priority only count when the headers are trusted (set by a
+    proxy in front of the service); otherwise a caller could rotate them to
+    escape its tenant limit. Any caller may lower its own priority. API
+    keys are hashed so they never appear in stats.
+    """
+    trusted = settings.ADMISSION_TRUST_HEADERS if trust_headers is None else trust_headers
+    tenant = f"ip:{client_host or 'unknown'}"
+    api_key = headers.get("x-api-key") if trusted else None
+    if api_key:
+        tenant = "key:" + hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:12]
+    elif trusted and headers.get("x-tenant-id"):
+        tenant = headers["x-tenant-id"]
+    priority = (headers.get("x-request-priority") or default_priority).lower()
+    if priority not in PRIORITIES or (not trusted and PRIORITIES[priority] < PRIORITIES.get(default_priority, 0)):
+        priority = default_priority
+    return tenant, priority
+
+
+class AdmissionController:
+    """
+    Slot accounting for one backend. Must be used from a single event loop;
+    grants happen on release without any locking.
+    """
+
+    def __init__(self, name: str, global_limit: int, tenant_limit: int, max_queue: int, queue_timeout_ms: int):
+        self.name = name
+        self.global_limit = max(1, global_limit)
+        self.tenant_limit = max(1, tenant_limit)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout_ms = queue_timeout_ms
+        self.in_use = 0
+        self.tenant_in_use: Dict[str, int] = {}
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        # Smoothed slot hold time, used for Retry-After estimates
+        self._hold_seconds = 1.0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_full = 0
+        self.timed_out = 0
+
+    def _fits(self, tenant: str, weight: int) -> bool:
+        return (
+            self.in_use + weight <= self.global_limit
+            and self.tenant_in_use.get(tenant, 0) + weight <= self.tenant_limit
+        )
+
+    def _grant(self, tenant: str, weight: int) -> None:
+        self.in_use += weight
+        self.tenant_in_use[tenant] = self.tenant_in_use.get(tenant, 0) + weight
+        self.admitted += 1
+
+    def retry_after(self) -> int:
+        backlog = len(self._queue) + 1
+        return max(1, math.ceil(self._hold_seconds * backlog / self.global_limit))
+
+    async def acquire(self, tenant: str, priority: str = "interactive", weight: int = 1) -> Ticket:
+        """Wait for a slot; raises AdmissionRejected when the queue is full or the deadline passes."""
+        rank = PRIORITIES.get(priority, PRIORITIES["interactive"])
+        weight = max(1, min(weight, self.global_limit, self.tenant_limit))
+        started = time.monotonic()
+        # Don't overtake equal/higher priority waiters unless they are only held back by their own tenant limit
+        ahead = any(
+            w.priority <= rank and self.tenant_in_use.get(w.tenant, 0) + w.weight <= self.tenant_limit
+            for w in self._queue
+        )
+        if self._fits(tenant, weight) and not ahead:
+            self._grant(tenant, weight)
+            return Ticket(self, tenant, weight, time.monotonic(), 0.0)
+        if len(self._queue) >= self.max_queue:
+            self.rejected_full += 1
+            raise AdmissionRejected("queue_full", self.retry_after(), self.name)
+        waiter = _Waiter(rank, next(self._seq), tenant, weight, asyncio.get_running_loop().create_future())
+        bisect.insort(self._queue, waiter)
+        self.queued += 1
+        timeout = self.queue_timeout_ms / 1000 if self.queue_timeout_ms > 0 else None
+        try:
+            await asyncio.wait({waiter.future}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(waiter)
+            self.timed_out += 1
+            raise AdmissionRejected("queue_timeout", self.retry_after(), self.name)
+        now = time.monotonic()
+        return Ticket(self, tenant, weight, now, round((now - started) * 1000, 2))
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            # Granted while we were giving up: hand the slot back
+            self._release(Ticket(self, waiter.tenant, waiter.weight, time.monotonic(), 0.0))
+            return
+        waiter.future.cancel()
+        if waiter in self._queue:
+            self._queue.remove(waiter)
+
+    def _release(self, ticket: Ticket) -> None:
+        self.in_use -= ticket.weight
+        left = self.tenant_in_use.get(ticket.tenant, 0) - ticket.weight
+        if left > 0:
+            self.tenant_in_use[ticket.tenant] = left
+        else:
+            self.tenant_in_use.pop(ticket.tenant, None)
+        held = time.monotonic() - ticket.granted_at
+        self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * held
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        for waiter in list(self._queue):
+            if self.in_use + waiter.weight > self.global_limit:
+                # Keep global capacity for the head waiter rather than letting smaller requests starve it
+                break
+            if not self._fits(waiter.tenant, waiter.weight):
+                continue
+            self._queue.remove(waiter)
+            self._grant(waiter.tenant, waiter.weight)
+            waiter.future.set_result(True)
+
+    @asynccontextmanager
+    async def slot(self, tenant: str, priority: str = "interactive", weight: int = 1) -> AsyncIterator[Optional[Ticket]]:
+        if not settings.ADMISSION_ENABLED:
+            yield None
+            return
+        ticket = await self.acquire(tenant, priority, weight)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "global_limit": self.global_limit,
+            "tenant_limit": self.tenant_limit,
+            "in_use": self.in_use,
+            "queue_depth": len(self._queue),
+            "queue_capacity": self.max_queue,
+            "tenants_active": len(self.tenant_in_use),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_timeout": self.timed_out,
+            "avg_hold_ms": round(self._hold_seconds * 1000, 1),
+        }
+
+
+@asynccontextmanager
+async def admitted(
+    controller: AdmissionController,
+    request: Any,
+    default_priority: str = "interactive",
+    weight: int = 1,
+) -> AsyncIterator[Optional[Ticket]]:
+    """Hold a slot on controller for an HTTP request (identified by its headers and client address)."""
+    client = getattr(request, "client", None)
+    tenant, priority = identity(request.headers, client.host if client else None, default_priority)
+    async with controller.slot(tenant, priority, weight) as ticket:
+        if ticket is not None:
+            record("queue", ticket.waited_ms)
+        yield ticket
+
+
+sql_admission = AdmissionController(
+    "sql",
+    global_limit=settings.ADMISSION_GLOBAL_LIMIT,
+    tenant_limit=settings.ADMISSION_TENANT_LIMIT,
+    max_queue=settings.ADMISSION_QUEUE_SIZE,
+    queue_timeout_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS,
+)
+mongo_admission = AdmissionController(
+    "mongodb",
+    global_limit=settings.ADMISSION_MONGO_GLOBAL_LIMIT,
+    tenant_limit=settings.ADMISSION_TENANT_LIMIT,
+    max_queue=settings.ADMISSION_QUEUE_SIZE,
+    queue_timeout_ms=settings.ADMISSION_QUEUE_TIMEOUT_MS,
+)
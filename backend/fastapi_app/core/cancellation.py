@@ -0,0 +1,256 @@
+"""
+Query Cancellation
+Execution deadlines and server-side cancellation of in-flight statements.
+MySQL SELECTs get a MAX_EXECUTION_TIME optimizer hint; anything still running
+at the deadline (or when the client goes away) is stopped with KILL QUERY on
+a fresh unpooled connection, so a saturated pool cannot delay the kill.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlglot import exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.tokens import TokenType
+from .config import settings
+from .engines import get_unpooled_engine
+from .sql_ast import READ_TYPES, parse_sql, outermost_select, after_with
+
+# MySQL error codes for statements stopped by MAX_EXECUTION_TIME / KILL QUERY
+MYSQL_TIMEOUT_ERRORS = {3024, 1317, 1028}
+
+
+class CancelToken:
+    """
+    Handle for cancelling one statement. The executor binds a kill function
+    once it knows which server connection runs the statement; cancel() may be
+    called from any thread before or after binding.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kill: Optional[Callable[[], None]] = None
+        # Cleared while a kill is in flight
+        self._kill_done = threading.Event()
+        self._kill_done.set()
+        self.cancelled = False
+        self.reason: Optional[str] = None
+
+    def bind(self, kill: Optional[Callable[[], None]]) -> bool:
+        """Register the kill function; False means the token is already cancelled."""
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._kill = kill
+            return True
+
+    def unbind(self) -> None:
+        with self._lock:
+            self._kill = None
+        # Called before the connection goes back to the pool: a kill already taken by
+        # cancel() must land first, or it could interrupt the connection's next statement
+        self._kill_done.wait()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        # The kill runs outside the lock so a slow kill never blocks unbind()'s bookkeeping
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            self.reason = reason
+            kill = self._kill
+            if kill is None:
+                return
+            self._kill_done.clear()
+        try:
+            kill()
+        except Exception:
+            pass
+        finally:
+            self._kill_done.set()
+
+
+class CancelGroup:
+    """Cancels a set of tokens together (e.g. the losers of a first-success batch)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens: List[CancelToken] = []
+        self.cancelled = False
+        self.reason: Optional[str] = None
+
+    def new_token(self) -> CancelToken:
+        token = CancelToken()
+        with self._lock:
+            self._tokens.append(token)
+            cancelled, reason = self.cancelled, self.reason
+        if cancelled:
+            token.cancel(reason or "cancelled")
+        return token
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            self.cancelled = True
+            self.reason = reason
+            tokens = list(self._tokens)
+        for token in tokens:
+            token.cancel(reason)
+
+
+def effective_timeout_ms(requested: Optional[int]) -> Optional[int]:
+    """Per-request deadline, bounded by the global EXEC_TIMEOUT_MS (0 disables the global one)."""
+    global_ms = settings.EXEC_TIMEOUT_MS or None
+    if requested and global_ms:
+        return min(requested, global_ms)
+    return requested or global_ms
+
+
+def _has_execution_time_hint(select: exp.Select) -> bool:
+    hint = select.args.get("hint")
+    return hint is not None and any(
+        isinstance(h, exp.Func) and (h.name if isinstance(h, exp.Anonymous) else h.sql_name()).upper() == "MAX_EXECUTION_TIME"
+        for h in hint.expressions
+    )
+
+
+@lru_cache(maxsize=1024)
+def _hinted(query: str, timeout_ms: int) -> str:
+    hint = f"MAX_EXECUTION_TIME({timeout_ms})"
+    try:
+        tokens = Dialect.get_or_raise("mysql").tokenize(query)
+    except Exception:
+        return query
+    tree = parse_sql(query)
+    if tree is None:
+        # Unparseable (MySQL-only modifiers): only a leading SELECT is known to be the outer block
+        if not tokens or tokens[0].token_type != TokenType.SELECT:
+            return query
+        start, depth = 0, 0
+    else:
+        if not isinstance(tree, READ_TYPES):
+            return query
+        located = outermost_select(tree)
+        if located is None or _has_execution_time_hint(located[0]):
+            return query
+        depth = located[1]
+        start = after_with(tokens) if tree.args.get("with") else 0
+    level = 0
+    for i, token in enumerate(tokens):
+        if i >= start and level == depth and token.token_type == TokenType.SELECT:
+            nxt = tokens[i + 1] if i + 1 < len(tokens) else None
+            if nxt is not None and nxt.token_type == TokenType.HINT:
+                # One hint comment per query block: join the existing one
+                return f"{query[:nxt.end + 1]} {hint}{query[nxt.end + 1:]}"
+            return f"{query[:token.end + 1]} /*+ {hint} */{query[token.end + 1:]}"
+        if token.token_type == TokenType.L_PAREN:
+            level += 1
+        elif token.token_type == TokenType.R_PAREN:
+            level -= 1
+    return query
+
+
+def add_max_execution_time(query: str, timeout_ms: int) -> str:
+    """
+    Add a MySQL MAX_EXECUTION_TIME hint to the outermost query block of a
+    read statement: the main SELECT after a WITH clause, or the leftmost
+    branch of a UNION (parenthesised or not). The AST picks the block and
+    the hint is spliced into the original text, so the rest of the SQL is
+    kept verbatim. Statements that already carry the hint, and writes, are
+    returned unchanged.
+    """
+    return _hinted(query, int(timeout_ms))
+
+
+def _mysql_connection_id(conn: Connection) -> int:
+    info = conn.info
+    if "mysql_connection_id" not in info:
+        dbapi_conn = conn.connection.dbapi_connection
+        thread_id = getattr(dbapi_conn, "thread_id", None)
+        info["mysql_connection_id"] = thread_id() if callable(thread_id) else conn.execute(text("SELECT CONNECTION_ID()")).scalar()
+    return int(info["mysql_connection_id"])
+
+
+def _kill_engine(engine: Engine) -> Engine:
+    # Unpooled: when the deadline fires the pool is typically full of the statements being killed
+    return get_unpooled_engine(engine.url.render_as_string(hide_password=False))
+
+
+def kill_function(engine: Engine, conn: Connection) -> Optional[Callable[[], None]]:
+    """Build a callable that interrupts whatever conn is currently running."""
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        conn_id = _mysql_connection_id(conn)
+        killer_engine = _kill_engine(engine)
+
+        def kill() -> None:
+            with killer_engine.connect() as killer:
+                killer.execute(text(f"KILL QUERY {conn_id}"))
+        return kill
+    if dialect == "sqlite":
+        dbapi_conn = conn.connection.dbapi_connection
+        return getattr(dbapi_conn, "interrupt", None)
+    return None
+
+
+async def async_kill_function(engine: Engine, conn: Any) -> Optional[Callable[[], None]]:
+    """
+    kill_function for an AsyncConnection. The kill itself runs on an unpooled
+    sync engine for the same URI, from the deadline timer thread.
+    """
+    raw = await conn.get_raw_connection()
+    if conn.dialect.name == "sqlite":
+        # aiosqlite runs the sqlite3 connection in its own thread; interrupt() is thread-safe
+        inner = getattr(raw.driver_connection, "_conn", None)
+        return getattr(inner, "interrupt", None)
+    if conn.dialect.name != "mysql":
+        return None
+    if "mysql_connection_id" not in raw.info:
+        thread_id = getattr(raw.driver_connection, "thread_id", None)
+        if callable(thread_id):
+            raw.info["mysql_connection_id"] = thread_id()
+        else:
+            raw.info["mysql_connection_id"] = (await conn.execute(text("SELECT CONNECTION_ID()"))).scalar()
+    conn_id = int(raw.info["mysql_connection_id"])
+    killer_engine = _kill_engine(engine)
+
+    def kill() -> None:
+        with killer_engine.connect() as killer:
+            killer.execute(text(f"KILL QUERY {conn_id}"))
+    return kill
+
+
+@contextmanager
+def deadline(token: CancelToken, timeout_ms: Optional[int]) -> Iterator[None]:
+    """Cancel token with reason "timeout" if the block is still running after timeout_ms."""
+    if not timeout_ms:
+        yield
+        return
+    timer = threading.Timer(timeout_ms / 1000, token.cancel, args=("timeout",))
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        timer.cancel()
+
+
+def is_timeout_error(exc: BaseException) -> bool:
+    orig = getattr(exc, "orig", None)
+    args = getattr(orig, "args", None) or ()
+    return bool(args) and args[0] in MYSQL_TIMEOUT_ERRORS
+
+
+def cancellation_error(token: CancelToken, exc: BaseException, timeout_ms: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Structured error for a statement stopped by a deadline or cancellation, else None."""
+    if token.cancelled and token.reason != "timeout":
+        return {"error": f"Query cancelled: {token.reason}", "error_type": "cancelled"}
+    if token.cancelled or is_timeout_error(exc) or "interrupted" in str(exc).lower():
+        return {
+            "error": f"Query exceeded execution deadline of {timeout_ms} ms",
+            "error_type": "timeout",
+            "timeout_ms": timeout_ms,
+        }
+    return None
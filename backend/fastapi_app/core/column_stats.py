@@ -0,0 +1,430 @@
+"""
+Column Statistics
+Background collector of per-column statistics for MySQL schemas in the
+catalog: estimated row counts, distinct counts, null fractions, min/max and
+top-k values. Collection stays cheap on large tables: row counts come from
+information_schema TABLE_ROWS, distinct counts of indexed columns from
+index CARDINALITY, min/max of leading index columns from the index, and
+everything else from a bounded sample (random primary-key windows when the
+key is numeric, else the first rows) read through the replica router with
+a MAX_EXECUTION_TIME hint. Results are stored per schema catalog version
+(and under COLUMN_STATS_DIR when set, so they survive restarts) and feed
+the validator, ranker and NLU value linker.
+"""
+from __future__ import annotations
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import datetime
+import decimal
+import json
+import math
+import os
+import queue
+import random
+import re
+import threading
+import time
+from sqlalchemy import text
+from sqlglot import exp
+from .config import settings
+from .cancellation import add_max_execution_time
+from .engines import get_engine
+from .routing import connection
+from .schema_catalog import catalog
+
+_TABLE_ROWS_SQL = text(
+    """
+    SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.tables
+    WHERE table_schema = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+    """
+)
+
+_INDEX_COLUMNS_SQL = text(
+    """
+    SELECT TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, CARDINALITY, NON_UNIQUE
+    FROM information_schema.statistics
+    WHERE table_schema = DATABASE()
+    """
+)
+
+# Values of these types are not summarised beyond their null fraction
+_OPAQUE_TYPES = {
+    "blob", "tinyblob", "mediumblob", "longblob", "binary", "varbinary", "text", "mediumtext", "longtext",
+    "json", "geometry", "point", "linestring", "polygon", "multipoint", "multilinestring", "multipolygon",
+    "geometrycollection", "bit",
+}
+# Free-form text: values are only kept for low-cardinality columns (status codes, not names or emails)
+_STRING_TYPES = {"char", "varchar", "tinytext", "enum", "set"}
+_NUMERIC_KEY_TYPES = {"tinyint", "smallint", "mediumint", "int", "integer", "bigint"}
+# Longest string value kept in min/max/top-k
+MAX_VALUE_CHARS = 64
+# Primary-key windows per sampled table
+SAMPLE_WINDOWS = 4
+
+
+def _quote(identifier: str) -> str:
+    return "`" + identifier.replace("`", "``") + "`"
+
+
+def _plain(value: Any) -> Any:
+    """JSON-friendly, bounded representation of a column value."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime.date, datetime.time, datetime.timedelta)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode("utf-8", "replace")
+    value = str(value)
+    return value if len(value) <= MAX_VALUE_CHARS else value[:MAX_VALUE_CHARS]
+
+
+def estimate_distinct(values: List[Any], total_rows: int) -> int:
+    """
+    Distinct count of a column from a sample with the GEE estimator
+    (sqrt(N/n) * f1 + sum of values seen more than once), bounded by the
+    table size.
+    """
+    n = len(values)
+    if n == 0:
+        return 0
+    counts = Counter(values)
+    if total_rows <= n:
+        return len(counts)
+    singletons = sum(1 for c in counts.values() if c == 1)
+    estimate = math.sqrt(total_rows / n) * singletons + (len(counts) - singletons)
+    return int(min(total_rows, max(len(counts), round(estimate))))
+
+
+def _sample(conn_uri: str, table: str, columns: List[str], pk: Optional[str], rows: int) -> List[Tuple[Any, ...]]:
+    select_list = ", ".join(_quote(c) for c in columns)
+    limit = max(1, settings.COLUMN_STATS_SAMPLE_ROWS)
+    budget = settings.COLUMN_STATS_TIME_BUDGET_MS
+    if pk is None or rows <= limit:
+        sql = add_max_execution_time(f"SELECT {select_list} FROM {_quote(table)} LIMIT {limit}", budget)
+        with connection(conn_uri, sql) as (_, _, conn):
+            return list(conn.execute(text(sql)))
+    # Random windows over the primary key: index range reads, spread over the table
+    bounds_sql = f"SELECT MIN({_quote(pk)}), MAX({_quote(pk)}) FROM {_quote(table)}"
+    per_window = max(1, limit // SAMPLE_WINDOWS)
+    window_sql = add_max_execution_time(
+        f"SELECT {select_list} FROM {_quote(table)} WHERE {_quote(pk)} >= :start ORDER BY {_quote(pk)} LIMIT {per_window}", budget
+    )
+    with connection(conn_uri, window_sql) as (_, _, conn):
+        low, high = conn.execute(text(bounds_sql)).one()
+        if low is None:
+            return []
+        sampled: List[Tuple[Any, ...]] = []
+        for start in sorted(random.randint(int(low), int(high)) for _ in range(SAMPLE_WINDOWS)):
+            sampled.extend(conn.execute(text(window_sql), {"start": start}))
+        return sampled
+
+
+def _index_bounds(conn_uri: str, table: str, column: str) -> Tuple[Any, Any]:
+    sql = add_max_execution_time(f"SELECT MIN({_quote(column)}), MAX({_quote(column)}) FROM {_quote(table)}", settings.COLUMN_STATS_TIME_BUDGET_MS)
+    with connection(conn_uri, sql) as (_, _, conn):
+        return tuple(conn.execute(text(sql)).one())
+
+
+def _column_stats(values: List[Any], data_type: str, total_rows: int, index: Optional[Dict[str, Any]],
+                  bounds: Optional[Tuple[Any, Any]]) -> Dict[str, Any]:
+    sampled = len(values)
+    present = [v for v in values if v is not None]
+    out: Dict[str, Any] = {
+        "type": data_type,
+        "null_frac": round(1 - len(present) / sampled, 4) if sampled else None,
+    }
+    if data_type in _OPAQUE_TYPES:
+        return out
+    present = [_plain(v) for v in present]
+    if index is not None and index["unique"]:
+        out["distinct"] = total_rows
+        out["distinct_source"] = "unique_index"
+    elif index is not None and index["cardinality"]:
+        out["distinct"] = int(index["cardinality"])
+        out["distinct_source"] = "index"
+    else:
+        out["distinct"] = estimate_distinct(present, max(total_rows, sampled))
+        out["distinct_source"] = "sample"
+    k = settings.COLUMN_STATS_TOP_K
+    if data_type in _STRING_TYPES and out["distinct"] > k:
+        # Not a small domain: sample values may be personal data and are not stored or put into prompts
+        return out
+    if bounds is not None:
+        out["min"], out["max"] = _plain(bounds[0]), _plain(bounds[1])
+    elif present:
+        try:
+            out["min"], out["max"] = min(present), max(present)
+        except TypeError:
+            pass
+    counts = Counter(present)
+    # Top values are only informative when some value repeats
+    if counts and counts.most_common(1)[0][1] > 1:
+        out["top_values"] = [{"value": v, "frac": round(c / sampled, 4)} for v, c in counts.most_common(k)]
+        # The whole value domain is known (low-cardinality column such as a status): the sample
+        # covered every row, or an index count confirms it saw every distinct value. A sample-based
+        # distinct estimate cannot tell a rare value from a missing one.
+        covered = out["distinct_source"] != "sample" or sampled >= total_rows
+        out["complete"] = covered and len(counts) <= k and out["distinct"] <= len(counts)
+    return out
+
+
+def collect(uri: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Statistics for every table of schema (the catalog document of uri)."""
+    engine = get_engine(uri)
+    with engine.connect() as conn:
+        table_rows = {t: int(r or 0) for t, r in conn.execute(_TABLE_ROWS_SQL)}
+        index_rows = conn.execute(_INDEX_COLUMNS_SQL).fetchall()
+    widths = Counter((r[0], r[1]) for r in index_rows)
+    indexes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for table, index_name, seq, column, cardinality, non_unique in index_rows:
+        # CARDINALITY of later index columns counts prefix combinations, so only leading columns are used
+        if int(seq) != 1:
+            continue
+        entry = indexes.setdefault((table, column), {"cardinality": 0, "unique": False})
+        entry["cardinality"] = max(entry["cardinality"], int(cardinality or 0))
+        # Only a single-column unique index makes the column itself unique
+        entry["unique"] = entry["unique"] or (int(non_unique) == 0 and widths[(table, index_name)] == 1)
+    tables: Dict[str, Any] = {}
+    for table in schema.get("tables", []):
+        columns = schema.get("columns", {}).get(table, [])
+        names = [c["name"] for c in columns]
+        types = {c["name"]: (c.get("type") or "").lower() for c in columns}
+        pk_columns = schema.get("primary_keys", {}).get(table, [])
+        pk = pk_columns[0] if len(pk_columns) == 1 and types.get(pk_columns[0]) in _NUMERIC_KEY_TYPES else None
+        rows = table_rows.get(table, 0)
+        started = time.monotonic()
+        try:
+            sample = _sample(uri, table, names, pk, rows) if names else []
+        except Exception as e:
+            tables[table] = {"rows": rows, "error": str(e)}
+            continue
+        column_stats = {}
+        for i, name in enumerate(names):
+            index = indexes.get((table, name))
+            bounds = None
+            if index is not None and types[name] not in _OPAQUE_TYPES and types[name] not in _STRING_TYPES:
+                try:
+                    bounds = _index_bounds(uri, table, name)
+                except Exception:
+                    bounds = None
+            column_stats[name] = _column_stats([r[i] for r in sample], types[name], max(rows, len(sample)), index, bounds)
+        tables[table] = {
+            "rows": max(rows, len(sample)),
+            "sampled": len(sample),
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+            "columns": column_stats,
+        }
+    return {"db": schema.get("db"), "tables": tables}
+
+
+class ColumnStatsCollector:
+    def __init__(self, directory: Optional[str], refresh_interval: float, max_versions: int):
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.max_versions = max(1, max_versions)
+        self._stats: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._uris: Dict[str, float] = {}  # uri -> monotonic time of last collection
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._queued: set = set()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.runs = 0
+        self.errors = 0
+
+    def _path(self, version: str) -> Optional[str]:
+        return os.path.join(self.directory, f"column-stats-{version}.json") if self.directory else None
+
+    def _remember(self, version: str, document: Dict[str, Any]) -> None:
+        with self._lock:
+            self._stats[version] = document
+            self._stats.move_to_end(version)
+            while len(self._stats) > self.max_versions:
+                self._stats.popitem(last=False)
+
+    def _store(self, version: str, document: Dict[str, Any]) -> None:
+        self._remember(version, document)
+        path = self._path(version)
+        if path:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(document, f, default=str)
+            os.replace(tmp, path)
+
+    def get(self, version: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Stats collected for a schema version (memory first, then COLUMN_STATS_DIR)."""
+        if not version:
+            return None
+        with self._lock:
+            document = self._stats.get(version)
+        if document is not None:
+            return document
+        path = self._path(version)
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    document = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._remember(version, document)
+            return document
+        return None
+
+    def collect_now(self, uri: str) -> Dict[str, Any]:
+        """Collect stats for the current schema version of uri in the calling thread."""
+        entry = catalog.get(uri)
+        started = time.time()
+        document = collect(uri, entry.schema)
+        document.update({
+            "schema_version": entry.version,
+            "collected_at": datetime.datetime.fromtimestamp(started, datetime.timezone.utc).isoformat(),
+            "elapsed_ms": round((time.time() - started) * 1000, 1),
+        })
+        self._store(entry.version, document)
+        with self._lock:
+            self._uris[uri] = time.monotonic()
+            self.runs += 1
+        return document
+
+    def request(self, uri: Optional[str]) -> None:
+        """Queue a background collection for uri unless one is queued or recent stats exist."""
+        if not uri or not settings.COLUMN_STATS_ENABLED:
+            return
+        with self._lock:
+            last = self._uris.get(uri)
+            if uri in self._queued or (last is not None and time.monotonic() - last < self.refresh_interval):
+                return
+            self._queued.add(uri)
+        self._queue.put(uri)
+        self._ensure_worker()
+
+    def invalidate(self, uri: str) -> None:
+        """Let the next request() for uri collect again regardless of age."""
+        with self._lock:
+            self._uris.pop(uri, None)
+
+    def _ensure_worker(self) -> None:
+        if self._stop.is_set() or (self._worker is not None and self._worker.is_alive()):
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="column-stats", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                uri = self._queue.get(timeout=self.refresh_interval)
+            except queue.Empty:
+                # Periodic refresh; a schema change also shows up here as a new catalog version
+                with self._lock:
+                    uris = list(self._uris)
+                for uri in uris:
+                    self.invalidate(uri)
+                    self.request(uri)
+                continue
+            if uri is None:
+                return
+            try:
+                self.collect_now(uri)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Column stats collection failed for {uri.split('@')[-1]}: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(uri)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._queue.put(None)
+        if self._worker is not None:
+            self._worker.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"versions": len(self._stats), "uris": len(self._uris), "runs": self.runs, "errors": self.errors}
+
+
+column_stats = ColumnStatsCollector(settings.COLUMN_STATS_DIR, settings.COLUMN_STATS_REFRESH_INTERVAL, settings.SCHEMA_CATALOG_MAX_VERSIONS)
+
+
+def stats_for(schema: Optional[Dict[str, Any]] = None, schema_version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Stats for a request's schema: by explicit version, else the version tag of a catalog document."""
+    return column_stats.get(schema_version or (schema or {}).get("schema_version"))
+
+
+def column(stats: Optional[Dict[str, Any]], table: str, name: str) -> Optional[Dict[str, Any]]:
+    if not stats:
+        return None
+    entry = stats.get("tables", {}).get(table) or {}
+    return (entry.get("columns") or {}).get(name)
+
+
+def equality_literals(tree: exp.Expression) -> Iterable[Tuple[Optional[str], str, Any]]:
+    """(table or alias resolved to table, column, literal) for col = literal / col IN (...) predicates."""
+    aliases = {t.alias_or_name.lower(): t.name for t in tree.find_all(exp.Table)}
+    tables = list(dict.fromkeys(aliases.values()))
+
+    def resolve(col: exp.Column) -> Optional[str]:
+        if col.table:
+            return aliases.get(col.table.lower(), col.table)
+        return tables[0] if len(tables) == 1 else None
+
+    for eq in tree.find_all(exp.EQ):
+        col, lit = eq.this, eq.expression
+        if isinstance(lit, exp.Column) and isinstance(col, exp.Literal):
+            col, lit = lit, col
+        if isinstance(col, exp.Column) and isinstance(lit, exp.Literal):
+            yield resolve(col), col.name, lit.this
+    for node in tree.find_all(exp.In):
+        if isinstance(node.this, exp.Column):
+            for lit in node.expressions:
+                if isinstance(lit, exp.Literal):
+                    yield resolve(node.this), node.this.name, lit.this
+
+
+def _same(a: Any, b: Any) -> bool:
+    return str(a).lower() == str(b).lower()
+
+
+def value_check(tree: exp.Expression, stats: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Filter literals checked against column stats: "known" when the value is
+    among a column's top values, "unknown" when the column's whole value
+    domain was seen and the literal is not in it (the filter matches nothing),
+    "unseen" when it is only missing from a partial sample (informational).
+    """
+    out: Dict[str, List[str]] = {"known": [], "unknown": [], "unseen": []}
+    if not stats:
+        return out
+    for table, name, value in equality_literals(tree):
+        col = column(stats, table, name) if table else None
+        if not col or "top_values" not in col:
+            continue
+        label = f"{table}.{name} = {value!r}"
+        if any(_same(v["value"], value) for v in col["top_values"]):
+            out["known"].append(label)
+        elif col.get("complete"):
+            out["unknown"].append(label)
+        else:
+            out["unseen"].append(label)
+    return out
+
+
+def link_values(text_value: str, stats: Optional[Dict[str, Any]]) -> List[Tuple[str, str, Any]]:
+    """(table, column, value) for string top values of any column mentioned in the text."""
+    if not stats:
+        return []
+    lowered = text_value.lower()
+    found = []
+    for table, entry in stats.get("tables", {}).items():
+        for name, col in (entry.get("columns") or {}).items():
+            for item in col.get("top_values", []):
+                value = item["value"]
+                if isinstance(value, str) and len(value) > 1 and re.search(rf"(?<!\w){re.escape(value.lower())}(?!\w)", lowered):
+                    found.append((table, name, value))
+    return found
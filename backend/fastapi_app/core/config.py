@@ -17,6 +17,105 @@ class Settings:
     SAFETY_BLOCK_DDL = os.getenv("SAFETY_BLOCK_DDL", "true").lower() == "true"
     SAFETY_REQUIRE_WHERE = os.getenv("SAFETY_REQUIRE_WHERE", "true").lower() == "true"
     SELECT_LIMIT_CAP = int(os.getenv("SELECT_LIMIT_CAP", "1000"))
+    EXEC_TIMEOUT_MS = int(os.getenv("EXEC_TIMEOUT_MS", "30000"))
+
+    COST_GUARD_MODE = os.getenv("COST_GUARD_MODE", "warn").lower()  # off | warn | block
+    COST_GUARD_WARN_ROWS = int(os.getenv("COST_GUARD_WARN_ROWS", "100000"))
+    COST_GUARD_MAX_ROWS = int(os.getenv("COST_GUARD_MAX_ROWS", "5000000"))
+    COST_GUARD_FULL_SCAN_ROWS = int(os.getenv("COST_GUARD_FULL_SCAN_ROWS", "1000000"))
+    COST_GUARD_BLOCK_CARTESIAN = os.getenv("COST_GUARD_BLOCK_CARTESIAN", "true").lower() == "true"
+    COST_GUARD_CACHE_TTL = float(os.getenv("COST_GUARD_CACHE_TTL", "300"))
+
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_ENGINE_CACHE_SIZE = int(os.getenv("DB_ENGINE_CACHE_SIZE", "8"))
+    # Comma-separated read replicas of DB_URI; reads are spread across them
+    DB_REPLICA_URIS = [u.strip() for u in os.getenv("DB_REPLICA_URIS", "").split(",") if u.strip()]
+    DB_REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin").lower()  # round_robin | least_connections
+    DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "0"))  # 0 disables lag checks
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+    DB_REPLICA_LAG_QUERY = os.getenv("DB_REPLICA_LAG_QUERY")  # e.g. a heartbeat-table lag in seconds
+    DB_ASYNC_EXECUTION = os.getenv("DB_ASYNC_EXECUTION", "true").lower() == "true"
+    STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "500"))
+    # Server-side PREPARE/EXECUTE for parameterized MySQL statements. PyMySQL/aiomysql only speak the text
+    # protocol, so each run costs SET + EXECUTE (two round trips) against one for a plain bound execute;
+    # off by default, enable only where scripts/bench_prepared.py shows a net win
+    PREPARED_STATEMENTS = os.getenv("PREPARED_STATEMENTS", "false").lower() == "true"
+    PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("PREPARED_STATEMENT_CACHE_SIZE", "64"))
+
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    # Defaults to DB_POOL_SIZE + DB_MAX_OVERFLOW so admitted statements never wait on the pool
+    ADMISSION_GLOBAL_LIMIT = int(os.getenv("ADMISSION_GLOBAL_LIMIT", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+    ADMISSION_MONGO_GLOBAL_LIMIT = int(os.getenv("ADMISSION_MONGO_GLOBAL_LIMIT", "50"))
+    ADMISSION_TENANT_LIMIT = int(os.getenv("ADMISSION_TENANT_LIMIT", "4"))
+    ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+    ADMISSION_QUEUE_TIMEOUT_MS = int(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "5000"))
+    # Only behind a proxy that sets (or strips) X-API-Key, X-Tenant-ID and X-Request-Priority
+    ADMISSION_TRUST_HEADERS = os.getenv("ADMISSION_TRUST_HEADERS", "false").lower() == "true"
+
+    PAGINATION_ENABLED = os.getenv("PAGINATION_ENABLED", "true").lower() == "true"
+    PAGINATION_CURSOR_TTL = float(os.getenv("PAGINATION_CURSOR_TTL", "300"))
+
+    RESULT_HANDLE_MAX_ROWS = int(os.getenv("RESULT_HANDLE_MAX_ROWS", "1000000"))
+    RESULT_HANDLE_SPILL_BYTES = int(os.getenv("RESULT_HANDLE_SPILL_BYTES", str(32 * 1024 * 1024)))
+    RESULT_HANDLE_ROW_GROUP = int(os.getenv("RESULT_HANDLE_ROW_GROUP", "8192"))
+    RESULT_HANDLE_TTL = float(os.getenv("RESULT_HANDLE_TTL", "600"))
+    RESULT_HANDLE_MAX_HANDLES = int(os.getenv("RESULT_HANDLE_MAX_HANDLES", "32"))
+    RESULT_HANDLE_DIR = os.getenv("RESULT_HANDLE_DIR") or None  # spill directory (default: system temp)
+
+    # Comma-separated DB_URI tables snapshotted into a local analytic engine for aggregate reads
+    MIRROR_TABLES = [t.strip() for t in os.getenv("MIRROR_TABLES", "").split(",") if t.strip()]
+    MIRROR_ENGINE = os.getenv("MIRROR_ENGINE", "duckdb").lower()  # duckdb | sqlite
+    MIRROR_PATH = os.getenv("MIRROR_PATH") or None  # default: in-memory DuckDB / temp SQLite file
+    MIRROR_REFRESH_INTERVAL = float(os.getenv("MIRROR_REFRESH_INTERVAL", "300"))
+    MIRROR_MAX_STALENESS = float(os.getenv("MIRROR_MAX_STALENESS", "600"))  # older snapshots are not used
+    MIRROR_BATCH_ROWS = int(os.getenv("MIRROR_BATCH_ROWS", "10000"))
+
+    SCHEMA_CATALOG_TTL = float(os.getenv("SCHEMA_CATALOG_TTL", "30"))  # seconds before the fingerprint is re-checked
+    SCHEMA_CATALOG_MAX_VERSIONS = int(os.getenv("SCHEMA_CATALOG_MAX_VERSIONS", "32"))
+
+    # Schema pruning for /generate prompts: most relevant tables within a token budget
+    SCHEMA_PROMPT_TOKEN_BUDGET = int(os.getenv("SCHEMA_PROMPT_TOKEN_BUDGET", "1500"))
+    SCHEMA_PROMPT_TOP_K = int(os.getenv("SCHEMA_PROMPT_TOP_K", "8"))
+    SCHEMA_PROMPT_MAX_COLUMNS = int(os.getenv("SCHEMA_PROMPT_MAX_COLUMNS", "40"))  # per table
+    RANK_UNKNOWN_VALUE_PENALTY = float(os.getenv("RANK_UNKNOWN_VALUE_PENALTY", "0.3"))  # filter value absent from a column whose whole domain is known
+    RANK_OFF_GRAPH_JOIN_PENALTY = float(os.getenv("RANK_OFF_GRAPH_JOIN_PENALTY", "0.5"))  # scaled by share of non-FK joins
+    SCHEMA_EMBED_CACHE_SIZE = int(os.getenv("SCHEMA_EMBED_CACHE_SIZE", "20000"))  # cached name embeddings
+
+    # Background column statistics (distinct counts, null fractions, min/max, top values) per schema version
+    # Off by default: collection samples every table of each inspected schema
+    COLUMN_STATS_ENABLED = os.getenv("COLUMN_STATS_ENABLED", "false").lower() == "true"
+    COLUMN_STATS_SAMPLE_ROWS = int(os.getenv("COLUMN_STATS_SAMPLE_ROWS", "2000"))  # per table
+    COLUMN_STATS_TOP_K = int(os.getenv("COLUMN_STATS_TOP_K", "10"))
+    COLUMN_STATS_TIME_BUDGET_MS = int(os.getenv("COLUMN_STATS_TIME_BUDGET_MS", "2000"))  # per sampling statement
+    COLUMN_STATS_REFRESH_INTERVAL = float(os.getenv("COLUMN_STATS_REFRESH_INTERVAL", "3600"))
+    COLUMN_STATS_DIR = os.getenv("COLUMN_STATS_DIR") or None  # persist stats per schema version
+
+    # MongoDB schema inference: $sample size and time budget per collection, independent of collection size
+    MONGO_SCHEMA_SAMPLE_SIZE = int(os.getenv("MONGO_SCHEMA_SAMPLE_SIZE", "500"))
+    MONGO_SCHEMA_TIME_BUDGET_MS = int(os.getenv("MONGO_SCHEMA_TIME_BUDGET_MS", "2000"))
+    MONGO_SCHEMA_REFRESH_INTERVAL = float(os.getenv("MONGO_SCHEMA_REFRESH_INTERVAL", "600"))
+    MONGO_SCHEMA_MAX_DEPTH = int(os.getenv("MONGO_SCHEMA_MAX_DEPTH", "6"))
+    MONGO_SCHEMA_MAX_FIELDS = int(os.getenv("MONGO_SCHEMA_MAX_FIELDS", "500"))
+    # /mongodb/inspect fan-out: worker threads, per-database operation timeout and overall deadline
+    MONGO_INSPECT_WORKERS = int(os.getenv("MONGO_INSPECT_WORKERS", "8"))
+    MONGO_INSPECT_DB_TIMEOUT_MS = int(os.getenv("MONGO_INSPECT_DB_TIMEOUT_MS", "3000"))
+    MONGO_INSPECT_TIMEOUT_MS = int(os.getenv("MONGO_INSPECT_TIMEOUT_MS", "10000"))
+
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "60"))
+    RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+    QUERY_LOG_DB = os.getenv("QUERY_LOG_DB", "twdb")
+    QUERY_LOG_COLLECTION = os.getenv("QUERY_LOG_COLLECTION", "query_logs")
+    QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+    QUERY_LOG_BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", "200"))
+    QUERY_LOG_FLUSH_INTERVAL = float(os.getenv("QUERY_LOG_FLUSH_INTERVAL", "0.5"))
+    QUERY_LOG_BLOCK_MS = int(os.getenv("QUERY_LOG_BLOCK_MS", "0"))
+
+    SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
 
     OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
     MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
@@ -0,0 +1,183 @@
+"""
+Cost Guard
+Pre-execution check of MySQL's EXPLAIN FORMAT=JSON plan. Flags full scans of
+large tables, cartesian joins, temporary tables and filesorts, and blocks or
+warns when estimated rows examined exceed configured thresholds. Plan
+summaries are cached per statement fingerprint so repeated queries skip the
+EXPLAIN round trip.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Any, List, Mapping, Optional, Tuple
+import json
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from .config import settings
+from .sql_ast import parse_sql, is_read_only, fingerprint, fingerprint_key
+
+_plans: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_lock = threading.Lock()
+PLAN_CACHE_SIZE = 1024
+
+
+def _produced(item: Any) -> Optional[float]:
+    table = item.get("table") if isinstance(item, dict) else None
+    if not isinstance(table, dict) or table.get("rows_produced_per_join") is None:
+        return None
+    try:
+        return float(table["rows_produced_per_join"])
+    except (TypeError, ValueError):
+        return None
+
+
+def _walk_tables(node: Any, out: List[Tuple[Dict[str, Any], float]], flags: Dict[str, bool], scans: float = 1.0) -> None:
+    """Collect (table node, times it is scanned) pairs; scans > 1 for inner tables of nested-loop joins."""
+    if isinstance(node, dict):
+        if node.get("using_temporary_table"):
+            flags["temporary_table"] = True
+        if node.get("using_filesort"):
+            flags["filesort"] = True
+        table = node.get("table")
+        if isinstance(table, dict) and "access_type" in table:
+            # Join-buffered (hash / block nested loop) tables are read once, not once per outer row
+            out.append((table, 1.0 if table.get("using_join_buffer") else scans))
+        for key, value in node.items():
+            if key == "nested_loop" and isinstance(value, list):
+                # rows_produced_per_join is the row count of the join prefix up to that table,
+                # i.e. how many times the next table is probed
+                inner = scans
+                for item in value:
+                    _walk_tables(item, out, flags, inner)
+                    produced = _produced(item)
+                    if produced is not None:
+                        inner = scans * max(1.0, produced)
+            else:
+                # Subqueries under a table are materialized once, not per probe
+                _walk_tables(value, out, flags, 1.0 if key == "table" else scans)
+    elif isinstance(node, list):
+        for item in node:
+            _walk_tables(item, out, flags, scans)
+
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce an EXPLAIN FORMAT=JSON document to the numbers the guard checks."""
+    tables: List[Tuple[Dict[str, Any], float]] = []
+    flags = {"temporary_table": False, "filesort": False}
+    _walk_tables(plan, tables, flags)
+    summary_tables = []
+    rows_examined = 0
+    full_scans = []
+    cartesian = []
+    for t, scans in tables:
+        rows = int(t.get("rows_examined_per_scan") or 0)
+        rows_examined += int(rows * scans)
+        name = t.get("table_name")
+        access = t.get("access_type")
+        summary_tables.append({"table": name, "access_type": access, "rows_examined_per_scan": rows, "scans": int(scans)})
+        if access == "ALL":
+            full_scans.append({"table": name, "rows": rows})
+            if t.get("using_join_buffer") and not t.get("attached_condition"):
+                cartesian.append(name)
+    cost_info = (plan.get("query_block") or {}).get("cost_info") or {}
+    try:
+        query_cost = float(cost_info.get("query_cost", 0))
+    except (TypeError, ValueError):
+        query_cost = 0.0
+    return {
+        "query_cost": query_cost,
+        "rows_examined": rows_examined,
+        "tables": summary_tables,
+        "full_scans": full_scans,
+        "cartesian_joins": cartesian,
+        "temporary_table": flags["temporary_table"],
+        "filesort": flags["filesort"],
+    }
+
+
+def evaluate(summary: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply thresholds to a plan summary: returns {"blocked", "warnings", "plan"}."""
+    problems: List[str] = []
+    warnings: List[str] = []
+    rows = summary["rows_examined"]
+    if settings.COST_GUARD_MAX_ROWS and rows > settings.COST_GUARD_MAX_ROWS:
+        problems.append(f"estimated rows examined {rows} exceeds {settings.COST_GUARD_MAX_ROWS}")
+    elif settings.COST_GUARD_WARN_ROWS and rows > settings.COST_GUARD_WARN_ROWS:
+        warnings.append(f"estimated rows examined {rows} exceeds {settings.COST_GUARD_WARN_ROWS}")
+    for scan in summary["full_scans"]:
+        if settings.COST_GUARD_FULL_SCAN_ROWS and scan["rows"] > settings.COST_GUARD_FULL_SCAN_ROWS:
+            problems.append(f"full table scan of {scan['table']} (~{scan['rows']} rows)")
+    for table in summary["cartesian_joins"]:
+        msg = f"cartesian join with {table} (no join condition)"
+        (problems if settings.COST_GUARD_BLOCK_CARTESIAN else warnings).append(msg)
+    if summary["temporary_table"]:
+        warnings.append("uses a temporary table")
+    if summary["filesort"]:
+        warnings.append("uses filesort")
+    blocked = settings.COST_GUARD_MODE == "block" and bool(problems)
+    if not blocked:
+        warnings = problems + warnings
+        problems = []
+    return {"blocked": blocked, "reasons": problems, "warnings": warnings, "plan": summary}
+
+
+def _cached(key: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        entry = _plans.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > settings.COST_GUARD_CACHE_TTL:
+            del _plans[key]
+            return None
+        _plans.move_to_end(key)
+        return entry[1]
+
+
+def _store(key: str, summary: Dict[str, Any]) -> None:
+    with _lock:
+        _plans[key] = (time.monotonic(), summary)
+        _plans.move_to_end(key)
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+
+
+def check(
+    conn: Connection,
+    uri: str,
+    query: str,
+    params: Optional[Mapping[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Run the guard for query on conn (MySQL, read-only statements only).
+    Parameterized statements are explained with their bound values and the
+    plan is cached per template.
+    Returns None when the guard is off or does not apply; EXPLAIN failures
+    never block execution.
+    """
+    if settings.COST_GUARD_MODE == "off" or conn.dialect.name != "mysql":
+        return None
+    tree = parse_sql(query)
+    if tree is None or not is_read_only(tree):
+        return None
+    key = fingerprint_key(uri, fingerprint(query))
+    summary = _cached(key)
+    cached = summary is not None
+    if summary is None:
+        try:
+            raw = conn.execute(text(f"EXPLAIN FORMAT=JSON {query}"), dict(params or {})).scalar()
+            summary = summarize_plan(json.loads(raw))
+        except Exception:
+            return None
+        _store(key, summary)
+    result = evaluate(summary)
+    result["cached"] = cached
+    return result
+
+
+def blocked_error(guard: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "error": "Query blocked by cost guard: " + "; ".join(guard["reasons"]),
+        "error_type": "cost_guard",
+        "cost": guard,
+    }
@@ -0,0 +1,155 @@
+"""
+Engine Registry
+Process-wide pooled SQLAlchemy engines keyed by database URI.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import importlib.util
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool
+from .config import settings
+
+_engines: "OrderedDict[str, Engine]" = OrderedDict()
+_unpooled_engines: "OrderedDict[str, Engine]" = OrderedDict()
+_async_engines: "OrderedDict[str, AsyncEngine]" = OrderedDict()
+_lock = threading.Lock()
+
+# Sync backend -> (async driver name, module that provides it)
+ASYNC_DRIVERS = {
+    "mysql": ("mysql+aiomysql", "aiomysql"),
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+}
+
+
+def _engine_kwargs(uri: str) -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    # SQLite stand-ins use SingletonThreadPool/NullPool which reject sizing args
+    if make_url(uri).get_backend_name() != "sqlite":
+        kwargs["pool_size"] = settings.DB_POOL_SIZE
+        kwargs["max_overflow"] = settings.DB_MAX_OVERFLOW
+    return kwargs
+
+
+def get_engine(uri: str) -> Engine:
+    """
+    Return the shared engine for a URI, creating it on first use.
+    Engines for rarely used URIs are evicted (LRU) and disposed once the
+    registry grows past DB_ENGINE_CACHE_SIZE.
+    """
+    with _lock:
+        engine = _engines.get(uri)
+        if engine is not None:
+            _engines.move_to_end(uri)
+            return engine
+        engine = create_engine(uri, **_engine_kwargs(uri))
+        _engines[uri] = engine
+        evicted = []
+        while len(_engines) > max(1, settings.DB_ENGINE_CACHE_SIZE):
+            _, old = _engines.popitem(last=False)
+            evicted.append(old)
+    for old in evicted:
+        # close=False only drops the pool: nothing is closed here, so checked-out connections stay
+        # valid; the old pool's connections are closed when they are garbage collected
+        old.dispose(close=False)
+    return engine
+
+
+def get_unpooled_engine(uri: str) -> Engine:
+    """
+    NullPool engine for a URI, for out-of-band statements (KILL QUERY) that
+    must not queue behind a saturated pool: every connect() opens a fresh
+    connection and closing it really closes it.
+    """
+    with _lock:
+        engine = _unpooled_engines.get(uri)
+        if engine is not None:
+            _unpooled_engines.move_to_end(uri)
+            return engine
+        engine = create_engine(uri, poolclass=NullPool)
+        _unpooled_engines[uri] = engine
+        while len(_unpooled_engines) > max(1, settings.DB_ENGINE_CACHE_SIZE):
+            # NullPool holds no connections, so dropping the engine is enough
+            _unpooled_engines.popitem(last=False)
+    return engine
+
+
+def async_uri(uri: str) -> Optional[str]:
+    """Rewrite a sync DB URI to its async driver, or None if no async driver is installed."""
+    url = make_url(uri)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or importlib.util.find_spec(driver[1]) is None:
+        return None
+    return url.set(drivername=driver[0]).render_as_string(hide_password=False)
+
+
+def get_async_engine(uri: str) -> Optional[AsyncEngine]:
+    """
+    Async counterpart of get_engine, keyed by the sync URI. Returns None when
+    the backend has no installed async driver so callers can fall back to
+    the sync engine in a worker thread.
+    """
+    with _lock:
+        engine = _async_engines.get(uri)
+        if engine is not None:
+            _async_engines.move_to_end(uri)
+            return engine
+    target = async_uri(uri)
+    if target is None:
+        return None
+    with _lock:
+        engine = _async_engines.get(uri)
+        if engine is None:
+            engine = create_async_engine(target, **_engine_kwargs(uri))
+            _async_engines[uri] = engine
+        evicted = []
+        while len(_async_engines) > max(1, settings.DB_ENGINE_CACHE_SIZE):
+            _, old = _async_engines.popitem(last=False)
+            evicted.append(old)
+    for old in evicted:
+        # close=False only drops the pool reference, so no event loop is needed
+        old.sync_engine.dispose(close=False)
+    return engine
+
+
+def dispose_all() -> None:
+    """Dispose every registered sync engine (used on application shutdown)."""
+    with _lock:
+        engines = list(_engines.values())
+        _engines.clear()
+        _unpooled_engines.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+async def dispose_all_async() -> None:
+    """Dispose every registered async engine (used on application shutdown)."""
+    with _lock:
+        engines = list(_async_engines.values())
+        _async_engines.clear()
+    for engine in engines:
+        await engine.dispose()
+
+
+def pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of pool usage per registered engine, keyed by URI without password."""
+    with _lock:
+        items = [(uri, e, "sync") for uri, e in _engines.items()]
+        items.extend((uri, e.sync_engine, "async") for uri, e in _async_engines.items())
+    stats: Dict[str, Dict[str, Any]] = {}
+    for uri, engine, kind in items:
+        pool = engine.pool
+        entry: Dict[str, Any] = {"kind": kind, "status": pool.status()}
+        for attr in ("size", "checkedin", "checkedout", "overflow"):
+            fn = getattr(pool, attr, None)
+            if callable(fn):
+                entry[attr] = fn()
+        key = make_url(uri).render_as_string(hide_password=True)
+        stats[key if kind == "sync" else f"{key} (async)"] = entry
+    return stats
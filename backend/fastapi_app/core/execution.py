@@ -1,42 +1,377 @@
 from __future__ import annotations
-from typing import Dict, Any
-from sqlalchemy import create_engine, text
+from typing import Dict, Any, Iterator, List, Mapping, Set, Tuple
+import asyncio
+import time
+from sqlalchemy import text
 from sqlalchemy.engine import Result
-from pymongo import MongoClient
 from .config import settings
+from .engines import get_engine, get_async_engine
+from .result_format import rows_to_columnar
+from . import result_cache, pagination, cost_guard, prepared, routing
+from .metrics import stage
+from .mirror import mirror
+from .sql_ast import enforce_limit, strip_statement, parse_sql, is_read_only, parameterize
+from .safety import validate_query
+from .query_log import query_log
+from .cancellation import (
+    CancelToken,
+    CancelGroup,
+    effective_timeout_ms,
+    add_max_execution_time,
+    kill_function,
+    async_kill_function,
+    deadline,
+    cancellation_error,
+)
 
 
 def _log_to_mongo(doc: Dict[str, Any]):
-    try:
-        if settings.MONGO_URI:
-            client = MongoClient(settings.MONGO_URI)
-            db = client.get_default_database() or client["twdb"]
-            db["query_logs"].insert_one(doc)
-    except Exception:
-        pass
+    # Non-blocking: the background sink batches documents into MongoDB
+    query_log.submit(doc)
+
+
+def _cap_select(query: str) -> str:
+    # enforce limit cap on the outermost SELECT/UNION (AST decision cached per literal-masked fingerprint)
+    return enforce_limit(strip_statement(query), settings.SELECT_LIMIT_CAP)
+
+
+def _bind_parameters(query: str, params: Mapping[str, Any] | None, auto_parameterize: bool) -> Tuple[str, Dict[str, Any]]:
+    # Auto-extracted literals join the caller's values; the template is what gets cached and prepared
+    bound = dict(params or {})
+    if auto_parameterize:
+        query, extracted = parameterize(query)
+        bound.update(extracted)
+    return query, bound
+
+
+def _shape_result(res: Result, result_format: str) -> Dict[str, Any]:
+    if res.returns_rows and result_format in ("columns", "arrow"):
+        fetched = res.fetchall()
+        out = rows_to_columnar(list(res.keys()), fetched)
+        out["row_count"] = len(fetched)
+        out["format"] = "columns"
+        return out
+    if res.returns_rows:
+        rows = [dict(r._mapping) for r in res.fetchall()]
+        return {"rows": rows, "row_count": len(rows)}
+    return {"row_count": res.rowcount}
+
+
+def _execute_shaped(conn, statement: str, params: Dict[str, Any], result_format: str) -> Dict[str, Any]:
+    return _shape_result(prepared.execute(conn, statement, params), result_format)
+
 
+def _note_route(out: Dict[str, Any], route: routing.Route) -> None:
+    if routing.router.replicas:
+        out["route"] = route.name
 
-def execute_query(query: str, db_type: str = "mysql", db_uri: str | None = None) -> Dict[str, Any]:
+
+def _cancelled_before_start(token: CancelToken | CancelGroup) -> Dict[str, Any]:
+    return {"error": f"Query cancelled: {token.reason}", "error_type": "cancelled"}
+
+
+def execute_query(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    result_format: str = "rows",
+    timeout_ms: int | None = None,
+    cancel_token: CancelToken | None = None,
+    params: Dict[str, Any] | None = None,
+    auto_parameterize: bool = False,
+    use_primary: bool = False,
+) -> Dict[str, Any]:
+    """
+    Execute a query against MySQL. result_format "rows" returns a list of
+    row dicts; "columns"/"arrow" return {"columns", "data"} column arrays.
+    The statement is bounded by timeout_ms (capped by EXEC_TIMEOUT_MS) and
+    can be stopped early through cancel_token. params binds :name
+    placeholders; auto_parameterize also lifts literals out of the filters,
+    and parameterized statements run as cached server-side prepares.
+    Reads go to a replica when DB_REPLICA_URIS is set, unless use_primary;
+    aggregates over MIRROR_TABLES may be answered by the analytic mirror.
+    out["engine"] names the engine that produced the result.
+    """
     if db_type != "mysql":
         return {"error": f"Unsupported db_type for execution: {db_type}"}
     uri = db_uri or settings.DB_URI
     if not uri:
         return {"error": "DB_URI not configured"}
-    engine = create_engine(uri)
-    # enforce limit cap for SELECT without limit
-    q = query
-    if q.strip().lower().startswith("select") and " limit " not in q.lower():
-        q = q.rstrip(";") + f" LIMIT {settings.SELECT_LIMIT_CAP}"
+    # Ordered reads get a unique-key tiebreaker so a capped result can continue by keyset
+    query = pagination.with_tiebreaker(uri, query)
+    q, bound = _bind_parameters(_cap_select(query), params, auto_parameterize)
+    with stage("cache"):
+        cached = result_cache.lookup(uri, q, result_format, bound)
+    if cached is not None:
+        return pagination.attach(uri, db_type, query, cached, result_format, params)
+    if not use_primary:
+        mirrored = mirror.answer(uri, q, bound, result_format)
+        if mirrored is not None:
+            _log_to_mongo({"query": q, "db_type": db_type, "success": True, "engine": mirrored["engine"]})
+            return pagination.attach(uri, db_type, query, mirrored, result_format, params)
+    token = cancel_token or CancelToken()
+    timeout = effective_timeout_ms(timeout_ms)
     try:
-        with engine.connect() as conn:
-            res: Result = conn.execute(text(q))
-            if res.returns_rows:
-                rows = [dict(r._mapping) for r in res.fetchall()]
-                out = {"rows": rows, "row_count": len(rows)}
-            else:
-                out = {"row_count": res.rowcount}
+        with routing.connection(uri, q, use_primary) as (route, engine, conn):
+            with stage("cost_guard"):
+                guard = cost_guard.check(conn, uri, q, bound)
+            if guard and guard["blocked"]:
+                _log_to_mongo({"query": q, "db_type": db_type, "success": False, "error": "cost_guard"})
+                return cost_guard.blocked_error(guard)
+            q_exec = add_max_execution_time(q, timeout) if timeout and conn.dialect.name == "mysql" else q
+            if (timeout or cancel_token is not None) and not token.bind(kill_function(engine, conn)):
+                return _cancelled_before_start(token)
+            try:
+                with deadline(token, timeout), stage("db"):
+                    out = _execute_shaped(conn, q_exec, bound, result_format)
+            finally:
+                token.unbind()
+            conn.commit()
+            out["engine"] = conn.dialect.name
+        _note_route(out, route)
+        if guard and guard["warnings"]:
+            out["cost"] = guard
         _log_to_mongo({"query": q, "db_type": db_type, "success": True})
+        out = result_cache.record(uri, q, result_format, out, bound)
+        return pagination.attach(uri, db_type, query, out, result_format, params)
+    except Exception as e:
+        err = cancellation_error(token, e, timeout) or {"error": str(e)}
+        _log_to_mongo({"query": q, "db_type": db_type, "success": False, "error": err["error"]})
+        return err
+
+
+async def _attach_pagination_async(
+    uri: str,
+    db_type: str,
+    query: str,
+    out: Dict[str, Any],
+    result_format: str,
+    params: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    # Key lookup may hit the schema; keep it off the event loop
+    if not pagination.may_continue(out):
         return out
+    return await asyncio.to_thread(pagination.attach, uri, db_type, query, out, result_format, params)
+
+
+async def execute_query_async(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    result_format: str = "rows",
+    timeout_ms: int | None = None,
+    cancel_token: CancelToken | None = None,
+    params: Dict[str, Any] | None = None,
+    auto_parameterize: bool = False,
+    use_primary: bool = False,
+) -> Dict[str, Any]:
+    """
+    Async variant of execute_query. Runs on the async driver engine (aiomysql)
+    so waiting on MySQL holds a pooled connection rather than a worker thread.
+    Falls back to execute_query in a thread when async execution is disabled
+    or no async driver is installed.
+    """
+    if db_type != "mysql":
+        return {"error": f"Unsupported db_type for execution: {db_type}"}
+    uri = db_uri or settings.DB_URI
+    if not uri:
+        return {"error": "DB_URI not configured"}
+    if not settings.DB_ASYNC_EXECUTION or get_async_engine(uri) is None:
+        return await asyncio.to_thread(
+            execute_query, query, db_type, db_uri, result_format, timeout_ms, cancel_token,
+            params, auto_parameterize, use_primary,
+        )
+    if pagination.tiebreaker_candidate(query):
+        # The key lookup may revalidate the schema catalog; keep it off the event loop
+        query = await asyncio.to_thread(pagination.with_tiebreaker, uri, query)
+    q, bound = _bind_parameters(_cap_select(query), params, auto_parameterize)
+    with stage("cache"):
+        cached = result_cache.lookup(uri, q, result_format, bound)
+    if cached is not None:
+        return await _attach_pagination_async(uri, db_type, query, cached, result_format, params)
+    if not use_primary and mirror.enabled_for(uri):
+        mirrored = await asyncio.to_thread(mirror.answer, uri, q, bound, result_format)
+        if mirrored is not None:
+            _log_to_mongo({"query": q, "db_type": db_type, "success": True, "engine": mirrored["engine"]})
+            return await _attach_pagination_async(uri, db_type, query, mirrored, result_format, params)
+    token = cancel_token or CancelToken()
+    timeout = effective_timeout_ms(timeout_ms)
+    try:
+        async with routing.async_connection(uri, q, use_primary) as (route, _, conn):
+            with stage("cost_guard"):
+                guard = await conn.run_sync(cost_guard.check, uri, q, bound)
+            if guard and guard["blocked"]:
+                _log_to_mongo({"query": q, "db_type": db_type, "success": False, "error": "cost_guard"})
+                return cost_guard.blocked_error(guard)
+            q_exec = add_max_execution_time(q, timeout) if timeout and conn.dialect.name == "mysql" else q
+            if timeout or cancel_token is not None:
+                kill = await async_kill_function(get_engine(route.uri), conn)
+                if not token.bind(kill):
+                    return _cancelled_before_start(token)
+            try:
+                with deadline(token, timeout), stage("db"):
+                    out = await conn.run_sync(_execute_shaped, q_exec, bound, result_format)
+            finally:
+                token.unbind()
+            await conn.commit()
+            out["engine"] = conn.dialect.name
+        _note_route(out, route)
+        if guard and guard["warnings"]:
+            out["cost"] = guard
+        _log_to_mongo({"query": q, "db_type": db_type, "success": True})
+        out = result_cache.record(uri, q, result_format, out, bound)
+        return await _attach_pagination_async(uri, db_type, query, out, result_format, params)
+    except Exception as e:
+        err = cancellation_error(token, e, timeout) or {"error": str(e)}
+        _log_to_mongo({"query": q, "db_type": db_type, "success": False, "error": err["error"]})
+        return err
+
+
+# Losing first-success candidates finish unwinding in the background
+_background: Set[asyncio.Future] = set()
+
+
+def _batch_status(out: Dict[str, Any]) -> str:
+    if "error" not in out:
+        return "success"
+    return out.get("error_type", "error")
+
+
+async def execute_batch_async(
+    queries: List[str],
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    mode: str = "all",
+    result_format: str = "rows",
+    timeout_ms: int | None = None,
+    cancel_group: CancelGroup | None = None,
+    max_concurrency: int | None = None,
+) -> Dict[str, Any]:
+    """
+    Run candidate queries concurrently, each on its own pooled connection and
+    deadline, at most max_concurrency at a time. mode "all" waits for every
+    candidate; "first_success" returns as soon as one succeeds and kills the
+    statements still running. Only read-only statements that pass validation
+    are executed.
+    """
+    group = cancel_group or CancelGroup()
+    started = time.perf_counter()
+    results: List[Dict[str, Any] | None] = [None] * len(queries)
+    running = asyncio.Semaphore(max(1, max_concurrency or len(queries)))
+
+    async def run(index: int, query: str):
+        async with running:
+            t0 = time.perf_counter()
+            if group.cancelled:
+                # Superseded while waiting for a turn: don't take a connection at all
+                return index, _cancelled_before_start(group), 0.0
+            out = await execute_query_async(
+                query, db_type, db_uri, result_format=result_format,
+                timeout_ms=timeout_ms, cancel_token=group.new_token(),
+            )
+        return index, out, round((time.perf_counter() - t0) * 1000, 2)
+
+    tasks: Dict[asyncio.Future, int] = {}
+    for i, q in enumerate(queries):
+        tree = parse_sql(strip_statement(q))
+        safety = validate_query(q, db_type)
+        if safety["blocked"] or tree is None or not is_read_only(tree):
+            reasons = safety["reasons"] or ["batch execution only runs read-only statements"]
+            results[i] = {"index": i, "query": q, "status": "blocked", "reasons": reasons}
+            continue
+        tasks[asyncio.ensure_future(run(i, q))] = i
+
+    winner = None
+    pending = set(tasks)
+    while pending and winner is None:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            i, out, elapsed = task.result()
+            results[i] = {"index": i, "query": queries[i], "status": _batch_status(out), "elapsed_ms": elapsed, "result": out}
+            if mode == "first_success" and winner is None and "error" not in out:
+                winner = i
+    if pending:
+        # First success found: kill the rest without waiting for them to unwind
+        kill = asyncio.ensure_future(asyncio.to_thread(group.cancel, f"superseded by candidate {winner}"))
+        for fut in [kill, *pending]:
+            _background.add(fut)
+            fut.add_done_callback(_background.discard)
+        for task in pending:
+            i = tasks[task]
+            results[i] = {"index": i, "query": queries[i], "status": "cancelled"}
+
+    return {
+        "mode": mode,
+        "winner": winner,
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def stream_query(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: str | None = None,
+    chunk_size: int | None = None,
+    timeout_ms: int | None = None,
+    cancel_token: CancelToken | None = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Execute a query on a server-side cursor and yield results incrementally.
+    The first item is {"columns": [...]}, followed by {"rows": [...]} chunks
+    of at most chunk_size rows, so memory stays bounded by one chunk.
+    The whole stream is bounded by timeout_ms (capped by EXEC_TIMEOUT_MS) and
+    can be stopped through cancel_token; a stream stopped that way ends with
+    an {"error", "error_type"} item, as does one blocked by the cost guard
+    (then the only item). Configuration errors raise ValueError before
+    anything is yielded.
+    """
+    if db_type != "mysql":
+        raise ValueError(f"Unsupported db_type for execution: {db_type}")
+    uri = db_uri or settings.DB_URI
+    if not uri:
+        raise ValueError("DB_URI not configured")
+    size = max(1, chunk_size or settings.STREAM_CHUNK_SIZE)
+    q = _cap_select(query)
+    token = cancel_token or CancelToken()
+    timeout = effective_timeout_ms(timeout_ms)
+    row_count = 0
+    try:
+        with routing.connection(uri, q) as (_, engine, conn):
+            with stage("cost_guard"):
+                guard = cost_guard.check(conn, uri, q)
+            if guard and guard["blocked"]:
+                _log_to_mongo({"query": q, "db_type": db_type, "success": False, "streamed": True, "error": "cost_guard"})
+                yield cost_guard.blocked_error(guard)
+                return
+            conn = conn.execution_options(stream_results=True, max_row_buffer=size)
+            q_exec = add_max_execution_time(q, timeout) if timeout and conn.dialect.name == "mysql" else q
+            if (timeout or cancel_token is not None) and not token.bind(kill_function(engine, conn)):
+                yield _cancelled_before_start(token)
+                return
+            try:
+                with deadline(token, timeout):
+                    res: Result = conn.execute(text(q_exec))
+                    if not res.returns_rows:
+                        conn.commit()
+                        # Same cache invalidation as execute_query for the tables the write touched
+                        yield result_cache.record(uri, q, "rows", {"columns": [], "row_count": res.rowcount})
+                        return
+                    columns: List[str] = list(res.keys())
+                    yield {"columns": columns}
+                    for part in res.partitions(size):
+                        row_count += len(part)
+                        yield {"rows": [dict(zip(columns, r)) for r in part]}
+            finally:
+                token.unbind()
+        _log_to_mongo({"query": q, "db_type": db_type, "success": True, "streamed": True, "row_count": row_count})
+    except GeneratorExit:
+        # Client went away; leaving the with-block closes the cursor and connection
+        _log_to_mongo({"query": q, "db_type": db_type, "success": False, "streamed": True, "error": "client disconnected"})
+        raise
     except Exception as e:
-        _log_to_mongo({"query": q, "db_type": db_type, "success": False, "error": str(e)})
-        return {"error": str(e)}
+        err = cancellation_error(token, e, timeout)
+        _log_to_mongo({"query": q, "db_type": db_type, "success": False, "streamed": True, "error": (err or {}).get("error", str(e))})
+        if err is None:
+            raise
+        yield err
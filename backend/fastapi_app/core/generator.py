@@ -1,8 +1,14 @@
 from __future__ import annotations
 import os
 import requests
-from typing import List
+from typing import Dict, Any, List
 from .config import settings
+from .metrics import record_tokens
+
+def _record_usage(provider: str, data: Dict[str, Any]) -> None:
+    # OpenAI-style usage block: {"prompt_tokens": .., "completion_tokens": ..}
+    usage = data.get("usage") or {}
+    record_tokens(provider, usage.get("prompt_tokens"), usage.get("completion_tokens"))
 
 class BaseGenerator:
     def generate(
@@ -49,6 +55,7 @@ class MixtralOpenRouterAdapter(BaseGenerator):
         r = requests.post(self.BASE_URL, headers=headers, json=body, timeout=60)
         r.raise_for_status()
         data = r.json()
+        _record_usage("openrouter", data)
         outs: List[str] = []
         for c in data.get("choices", []):
             content = c.get("message", {}).get("content", "").strip()
@@ -93,6 +100,7 @@ class MistralAdapter(BaseGenerator):
         r = requests.post(self.BASE_URL, headers=headers, json=body, timeout=60)
         r.raise_for_status()
         data = r.json()
+        _record_usage("mistral", data)
         outs: List[str] = []
         for c in data.get("choices", []):
             content = c.get("message", {}).get("content", "").strip()
@@ -125,6 +133,7 @@ class LocalFlanAdapter(BaseGenerator):
             top_p=top_p,
             do_sample=temperature > 0
         )
+        record_tokens("local_flan", int(inputs["attention_mask"].sum()), int((outputs != self.tokenizer.pad_token_id).sum()))
         texts = [self.tokenizer.decode(o, skip_special_tokens=True) for o in outputs]
         return texts
 
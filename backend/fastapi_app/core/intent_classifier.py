@@ -5,6 +5,7 @@ Uses transformer models for classifying user intent from natural language querie
 from __future__ import annotations
 from typing import Dict, List, Optional
 import re
+from .column_stats import link_values
 
 # Intent types
 INTENT_SELECT = "SELECT"
@@ -170,10 +171,11 @@ def classify_intent(text: str, use_transformer: bool = True) -> Dict[str, any]:
 
 
 # Named Entity Recognition (NER) for SQL entities
-def extract_sql_entities(text: str, schema: Optional[Dict] = None) -> Dict[str, List[str]]:
+def extract_sql_entities(text: str, schema: Optional[Dict] = None, stats: Optional[Dict] = None) -> Dict[str, List[str]]:
     """
     Extract SQL-related entities from text (tables, columns, conditions).
-    Uses pattern matching and schema matching.
+    Uses pattern matching and schema matching; with column stats, values
+    mentioned in the text are linked to the columns that hold them.
     """
     entities = {
         "tables": [],
@@ -199,6 +201,12 @@ def extract_sql_entities(text: str, schema: Optional[Dict] = None) -> Dict[str,
                     if col_name.lower() in text_lower:
                         entities["columns"].append(f"{table}.{col_name}")
     
+    # Link mentioned values (e.g. "shipped", "Germany") to columns whose top values contain them
+    for table, col_name, value in link_values(text, stats):
+        entities["values"].append(value)
+        entities["columns"].append(f"{table}.{col_name}")
+        entities["tables"].append(table)
+
     # Extract quoted strings as values
     import re
     quoted_values = re.findall(r"['\"]([^'\"]+)['\"]", text)
@@ -0,0 +1,94 @@
+"""
+Schema Introspection
+Describes the current MySQL database (tables, columns, primary keys,
+indexes, foreign keys) with three bulk information_schema queries for the
+whole schema, grouped per table in Python, instead of two queries per table.
+Used by the schema catalog behind /schema/inspect and /mongodb/inspect.
+"""
+from __future__ import annotations
+from typing import Dict, Any, List
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+_COLUMNS_SQL = text(
+    """
+    SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
+    FROM information_schema.columns
+    WHERE table_schema = :db
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """
+)
+
+_INDEXES_SQL = text(
+    """
+    SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, NON_UNIQUE
+    FROM information_schema.statistics
+    WHERE table_schema = :db
+    ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+    """
+)
+
+_FOREIGN_KEYS_SQL = text(
+    """
+    SELECT
+        TABLE_NAME,
+        COLUMN_NAME,
+        REFERENCED_TABLE_NAME,
+        REFERENCED_COLUMN_NAME,
+        CONSTRAINT_NAME
+    FROM information_schema.KEY_COLUMN_USAGE
+    WHERE table_schema = :db
+        AND REFERENCED_TABLE_NAME IS NOT NULL
+    ORDER BY TABLE_NAME, CONSTRAINT_NAME
+    """
+)
+
+
+def describe(conn: Connection) -> Dict[str, Any]:
+    """Schema of the connection's current database."""
+    dbname = conn.execute(text("SELECT DATABASE()")).scalar()
+    params = {"db": dbname}
+
+    columns: Dict[str, List[Dict[str, Any]]] = {}
+    primary_keys: Dict[str, List[str]] = {}
+    for table, name, data_type, nullable, key, default, extra in conn.execute(_COLUMNS_SQL, params):
+        columns.setdefault(table, []).append({
+            "name": name,
+            "type": data_type,
+            "nullable": nullable,
+            "key": key,
+            "default": default,
+            "extra": extra,
+        })
+        if key == "PRI":
+            primary_keys.setdefault(table, []).append(name)
+    table_names = list(columns)
+
+    index_map: Dict[str, Dict[str, Dict[str, Any]]] = {t: {} for t in table_names}
+    for table, index_name, column, non_unique in conn.execute(_INDEXES_SQL, params):
+        entry = index_map.setdefault(table, {}).setdefault(
+            index_name, {"name": index_name, "columns": [], "unique": non_unique == 0}
+        )
+        entry["columns"].append(column)
+    indexes = {t: list(entries.values()) for t, entries in index_map.items()}
+
+    foreign_keys = [
+        {
+            "from_table": fk[0],
+            "from_column": fk[1],
+            "to_table": fk[2],
+            "to_column": fk[3],
+            "constraint_name": fk[4],
+        }
+        for fk in conn.execute(_FOREIGN_KEYS_SQL, params)
+    ]
+
+    return {
+        "db": dbname,
+        "tables": table_names,
+        "columns": columns,
+        "primary_keys": primary_keys,
+        "indexes": indexes,
+        "foreign_keys": foreign_keys,
+    }
+
@@ -0,0 +1,210 @@
+"""
+Join Graph
+Foreign-key graph of a MySQL schema: adjacency lists per table and
+shortest join paths between every pair of tables, computed once per schema
+(graphs are cached by their FK set, so a catalog version is indexed once
+however many requests use it). join_path() connects a set of tables along
+FK edges for the prompt builder and /schema/join-path; join_conformance()
+tells the ranker which join conditions in a candidate follow FK edges.
+"""
+from __future__ import annotations
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Dict, Any, FrozenSet, Iterable, List, Optional, Set, Tuple
+import threading
+from sqlglot import exp
+from .config import settings
+
+
+@dataclass(frozen=True)
+class Edge:
+    from_table: str
+    from_column: str
+    to_table: str
+    to_column: str
+
+    def other(self, table: str) -> str:
+        return self.to_table if table == self.from_table else self.from_table
+
+    def condition(self) -> str:
+        return f"{self.from_table}.{self.from_column} = {self.to_table}.{self.to_column}"
+
+    def as_dict(self) -> Dict[str, str]:
+        return {
+            "from_table": self.from_table,
+            "from_column": self.from_column,
+            "to_table": self.to_table,
+            "to_column": self.to_column,
+            "condition": self.condition(),
+        }
+
+
+class JoinGraph:
+    def __init__(self, tables: Iterable[str], edges: Iterable[Edge]):
+        self.tables: List[str] = list(dict.fromkeys(tables))
+        self.adjacency: Dict[str, List[Tuple[str, Edge]]] = {t: [] for t in self.tables}
+        self._column_pairs: Set[FrozenSet[Tuple[str, str]]] = set()
+        for edge in edges:
+            self.adjacency.setdefault(edge.from_table, []).append((edge.to_table, edge))
+            if edge.to_table != edge.from_table:
+                self.adjacency.setdefault(edge.to_table, []).append((edge.from_table, edge))
+            self._column_pairs.add(frozenset({
+                (edge.from_table.lower(), edge.from_column.lower()),
+                (edge.to_table.lower(), edge.to_column.lower()),
+            }))
+        # BFS from every table: predecessor edge per reachable table
+        self._parents: Dict[str, Dict[str, Optional[Tuple[str, Edge]]]] = {t: self._bfs(t) for t in self.adjacency}
+
+    def _bfs(self, source: str) -> Dict[str, Optional[Tuple[str, Edge]]]:
+        parents: Dict[str, Optional[Tuple[str, Edge]]] = {source: None}
+        queue = deque([source])
+        while queue:
+            table = queue.popleft()
+            for neighbour, edge in self.adjacency[table]:
+                if neighbour not in parents:
+                    parents[neighbour] = (table, edge)
+                    queue.append(neighbour)
+        return parents
+
+    def path(self, source: str, target: str) -> Optional[List[Edge]]:
+        """FK edges of a shortest join path from source to target, or None if unconnected."""
+        parents = self._parents.get(target)
+        if parents is None or source not in parents:
+            return None
+        # Walk from source towards target along the BFS tree rooted at target
+        edges: List[Edge] = []
+        table = source
+        while table != target:
+            table, edge = parents[table]
+            edges.append(edge)
+        return edges
+
+    def distance(self, source: str, target: str) -> Optional[int]:
+        path = self.path(source, target)
+        return None if path is None else len(path)
+
+    def join_path(self, tables: Iterable[str]) -> Dict[str, Any]:
+        """
+        Tables and FK edges joining the given tables: each remaining table is
+        attached to the tree so far by its shortest path (a greedy Steiner
+        tree). Tables with no FK route to the others are listed as unreachable.
+        """
+        wanted = [t for t in dict.fromkeys(tables) if t in self.adjacency]
+        unknown = [t for t in dict.fromkeys(tables) if t not in self.adjacency]
+        if not wanted:
+            return {"tables": [], "edges": [], "intermediate": [], "unreachable": unknown}
+        tree: List[str] = [wanted[0]]
+        edges: List[Edge] = []
+        pending = wanted[1:]
+        unreachable: List[str] = []
+        while pending:
+            best: Optional[Tuple[int, str, List[Edge]]] = None
+            for table in pending:
+                for member in tree:
+                    path = self.path(table, member)
+                    if path is not None and (best is None or len(path) < best[0]):
+                        best = (len(path), table, path)
+            if best is None:
+                unreachable.extend(pending)
+                break
+            _, table, path = best
+            pending.remove(table)
+            current = table
+            for edge in path:
+                if current not in tree:
+                    tree.append(current)
+                if edge not in edges:
+                    edges.append(edge)
+                current = edge.other(current)
+        return {
+            "tables": tree,
+            "edges": [e.as_dict() for e in edges],
+            "intermediate": [t for t in tree if t not in wanted],
+            "unreachable": unknown + unreachable,
+        }
+
+    def is_fk_pair(self, left: Tuple[str, str], right: Tuple[str, str]) -> bool:
+        return frozenset({(left[0].lower(), left[1].lower()), (right[0].lower(), right[1].lower())}) in self._column_pairs
+
+    def stats(self) -> Dict[str, int]:
+        return {"tables": len(self.adjacency), "edges": len(self._column_pairs)}
+
+
+def _edges(schema: Dict[str, Any]) -> Tuple[Edge, ...]:
+    return tuple(
+        Edge(fk["from_table"], fk["from_column"], fk["to_table"], fk["to_column"])
+        for fk in schema.get("foreign_keys", [])
+    )
+
+
+_graphs: "OrderedDict[Tuple[Any, ...], JoinGraph]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def graph_for(schema: Dict[str, Any]) -> JoinGraph:
+    """Join graph of schema, cached by its table and FK sets."""
+    edges = _edges(schema)
+    key = (tuple(schema.get("tables", [])), edges)
+    with _lock:
+        graph = _graphs.get(key)
+        if graph is not None:
+            _graphs.move_to_end(key)
+            return graph
+    graph = JoinGraph(schema.get("tables", []), edges)
+    with _lock:
+        _graphs[key] = graph
+        while len(_graphs) > settings.SCHEMA_CATALOG_MAX_VERSIONS:
+            _graphs.popitem(last=False)
+    return graph
+
+
+def _column_pairs(condition: Optional[exp.Expression], aliases: Dict[str, str]) -> Optional[List[Tuple[Tuple[str, str], Tuple[str, str]]]]:
+    """(table, column) pairs equated in condition; None when a column is unqualified and cannot be placed."""
+    pairs = []
+    if condition is None:
+        return pairs
+    for eq in condition.find_all(exp.EQ):
+        left, right = eq.this, eq.expression
+        if not (isinstance(left, exp.Column) and isinstance(right, exp.Column)):
+            continue
+        if not (left.table and right.table):
+            return None
+        pairs.append((
+            (aliases.get(left.table.lower(), left.table), left.name),
+            (aliases.get(right.table.lower(), right.table), right.name),
+        ))
+    return pairs
+
+
+def join_conformance(tree: exp.Expression, graph: JoinGraph) -> Dict[str, Any]:
+    """
+    Check each JOIN of a parsed query against the FK graph. A join follows
+    the graph when its ON clause equates the columns of an FK edge (or, for
+    comma joins, when the WHERE clause does). Joins with no column equality
+    or only non-FK ones are off-graph; USING joins and conditions with
+    unqualified columns cannot be resolved without column lists and are
+    given the benefit of the doubt.
+    """
+    aliases: Dict[str, str] = {}
+    for table in tree.find_all(exp.Table):
+        aliases[table.alias_or_name.lower()] = table.name
+    joins = list(tree.find_all(exp.Join))
+    off_graph: List[str] = []
+    implicit: List[exp.Join] = []
+    for join in joins:
+        if join.args.get("using"):
+            continue
+        if join.args.get("on") is None:
+            implicit.append(join)
+            continue
+        pairs = _column_pairs(join.args["on"], aliases)
+        if pairs is not None and not any(graph.is_fk_pair(a, b) for a, b in pairs):
+            off_graph.append(join.sql(dialect="mysql"))
+    if implicit:
+        # FROM a, b WHERE a.x = b.y: each FK equality in WHERE accounts for one comma join
+        where = tree.args.get("where")
+        pairs = _column_pairs(where.this if where is not None else None, aliases)
+        if pairs is not None:
+            linked = sum(1 for a, b in pairs if graph.is_fk_pair(a, b))
+            off_graph.extend(j.sql(dialect="mysql") for j in implicit[linked:])
+    return {"joins": len(joins), "off_graph": off_graph}
@@ -0,0 +1,108 @@
+"""
+JSON Responses
+orjson-backed encoding for result rows and MongoDB documents. Decimal,
+datetime, bytes, ObjectId and the other BSON value types are handled at any
+nesting depth without a jsonable_encoder pass over the whole result; values
+keep the shapes FastAPI produced before (Decimal as a number, bytes as text).
+Falls back to the standard json module when orjson is not installed or a
+value is outside its range (integers wider than 64 bits).
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict
+import base64
+import datetime
+import decimal
+import enum
+import json
+import uuid
+from bson import Binary, Code, DBRef, Decimal128, MaxKey, MinKey, ObjectId, Regex, Timestamp
+from starlette.responses import JSONResponse
+from .metrics import stage
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+
+def _decimal(value: decimal.Decimal) -> Any:
+    # Same rule as FastAPI's encoder: integral values stay ints, the rest become floats
+    if not value.is_finite():
+        return None
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+
+def _bytes(value: Any) -> str:
+    raw = bytes(value)
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return base64.b64encode(raw).decode("ascii")
+
+
+def _isoformat(value: Any) -> str:
+    return value.isoformat()
+
+
+_ENCODERS: Dict[type, Callable[[Any], Any]] = {
+    decimal.Decimal: _decimal,
+    ObjectId: str,
+    Decimal128: lambda v: _decimal(v.to_decimal()),
+    bytes: _bytes,
+    bytearray: _bytes,
+    memoryview: _bytes,
+    Binary: _bytes,
+    datetime.timedelta: lambda v: v.total_seconds(),
+    Timestamp: lambda v: {"t": v.time, "i": v.inc},
+    Regex: lambda v: v.pattern,
+    Code: str,
+    DBRef: lambda v: v.as_doc().to_dict(),
+    MinKey: lambda v: {"$minKey": 1},
+    MaxKey: lambda v: {"$maxKey": 1},
+    set: list,
+    frozenset: list,
+    # Only reached on the stdlib fallback; orjson serializes these natively
+    datetime.datetime: _isoformat,
+    datetime.date: _isoformat,
+    datetime.time: _isoformat,
+    uuid.UUID: str,
+}
+
+
+def _default(value: Any) -> Any:
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    for kind, encoder in _ENCODERS.items():
+        if isinstance(value, kind):
+            return encoder(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        return model_dump()
+    return str(value)
+
+
+_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson is not None else 0
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, default=_default, option=_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class ResultJSONResponse(JSONResponse):
+    """
+    JSONResponse using dumps(). Return it from the endpoint directly: a plain
+    dict return value still goes through FastAPI's jsonable_encoder first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        with stage("encode"):
+            return dumps(content)
@@ -0,0 +1,267 @@
+"""
+Request Metrics
+Per-request stage timers (llm, parse, embed, connect, db, mongo, ...) kept in
+a context variable so they follow the request into threadpool workers and
+child tasks. TimingMiddleware starts the timers for each HTTP request, emits
+them as a Server-Timing header and feeds the latency histograms; render()
+formats those histograms together with pool, cache, admission and LLM token
+counters in the Prometheus text format for GET /metrics.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import bisect
+import threading
+import time
+from .config import settings
+
+# Upper bounds in seconds; a request to an LLM provider can take tens of seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _RequestTimings:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def add(self, name: str, ms: float) -> None:
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.lock:
+            out = {name: round(ms, 2) for name, ms in self.stages.items()}
+        out["total"] = round((time.perf_counter() - self.started) * 1000, 2)
+        return out
+
+
+_current: ContextVar[Optional[_RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], seconds: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One slot per bucket plus +Inf, then sum and count
+                series = self._series[labels] = [0.0] * (len(BUCKETS) + 3)
+            series[bisect.bisect_left(BUCKETS, seconds)] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            base = _labels(zip(self.label_names, labels))
+            cumulative = 0.0
+            for bound, count in zip(BUCKETS + ("+Inf",), series):
+                cumulative += count
+                le = bound if isinstance(bound, str) else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(zip(self.label_names, labels), le=le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{base} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{base} {int(series[-1])}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(zip(self.label_names, k))} {_number(v)}" for k, v in items)
+        return lines
+
+
+request_latency = Histogram(
+    "twdb_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+)
+stage_latency = Histogram(
+    "twdb_stage_duration_seconds", "Time spent per request stage (stages may nest).", ("route", "stage")
+)
+llm_tokens = Counter("twdb_llm_tokens_total", "Tokens reported by LLM providers.", ("provider", "kind"))
+llm_requests = Counter("twdb_llm_requests_total", "Completion requests sent to LLM providers.", ("provider",))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs, **extra: str) -> str:
+    items = [f'{k}="{_escape(v)}"' for k, v in pairs]
+    items.extend(f'{k}="{_escape(v)}"' for k, v in extra.items())
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def _number(value: Any) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+        return str(int(value))
+    return repr(float(value))
+
+
+def record(name: str, ms: float) -> None:
+    """Add ms to stage name of the current request (or straight to the histogram outside one)."""
+    current = _current.get()
+    if current is not None:
+        current.add(name, ms)
+    else:
+        stage_latency.observe(("background", name), ms / 1000)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage name; repeated stages accumulate."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000)
+
+
+def timings() -> Dict[str, float]:
+    """Stage timings (ms) of the current request so far, plus the elapsed total."""
+    current = _current.get()
+    return current.snapshot() if current is not None else {}
+
+
+def record_tokens(provider: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    llm_requests.inc((provider,))
+    if prompt_tokens:
+        llm_tokens.inc((provider, "prompt"), prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc((provider, "completion"), completion_tokens)
+
+
+def server_timing(stages: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={ms}" for name, ms in stages.items())
+
+
+class TimingMiddleware:
+    """ASGI middleware: per-request timers, Server-Timing header and latency histograms."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        current = _RequestTimings()
+        token = _current.set(current)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = message.get("headers", [])
+                # Responses that set their own (Arrow results) keep it
+                if settings.SERVER_TIMING_ENABLED and not any(k.lower() == b"server-timing" for k, _ in headers):
+                    value = server_timing(current.snapshot()).encode("latin-1")
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", value)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # Matched route template (not the raw path) keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            request_latency.observe((scope["method"], route, str(status[0])), time.perf_counter() - current.started)
+            with current.lock:
+                stages = list(current.stages.items())
+            for name, ms in stages:
+                stage_latency.observe((route, name), ms / 1000)
+
+
+def _gauges(name: str, help_text: str, samples: List[Tuple[Dict[str, Any], Any]], kind: str = "gauge") -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels.items())} {_number(value)}" for labels, value in samples if value is not None)
+    return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    from .engines import pool_stats
+    from .result_cache import result_cache
+    from .sql_ast import parse_sql
+    from .query_log import query_log
+    from .admission import sql_admission, mongo_admission
+    from .routing import router
+    from .mirror import mirror
+
+    lines: List[str] = []
+    lines += request_latency.render()
+    lines += stage_latency.render()
+    lines += llm_requests.render()
+    lines += llm_tokens.render()
+
+    pools = pool_stats()
+    pool_samples = [
+        ({"engine": engine, "state": state}, entry.get(state))
+        for engine, entry in pools.items()
+        for state in ("size", "checkedout", "checkedin", "overflow")
+    ]
+    lines += _gauges("twdb_db_pool_connections", "Connection pool usage per engine.", pool_samples)
+
+    cache = result_cache.stats()
+    parse = parse_sql.cache_info()
+    lines += _gauges("twdb_cache_hits_total", "Cache hits.", [({"cache": "result"}, cache["hits"]), ({"cache": "parse"}, parse.hits)], "counter")
+    lines += _gauges("twdb_cache_misses_total", "Cache misses.", [({"cache": "result"}, cache["misses"]), ({"cache": "parse"}, parse.misses)], "counter")
+    parse_lookups = parse.hits + parse.misses
+    lines += _gauges("twdb_cache_hit_ratio", "Cache hit ratio since start.", [
+        ({"cache": "result"}, cache["hit_rate"]),
+        ({"cache": "parse"}, round(parse.hits / parse_lookups, 4) if parse_lookups else 0.0),
+    ])
+    lines += _gauges("twdb_cache_entries", "Entries held per cache.", [({"cache": "result"}, cache["entries"]), ({"cache": "parse"}, parse.currsize)])
+    lines += _gauges("twdb_result_cache_bytes", "Estimated size of cached results.", [({}, cache["bytes"])])
+
+    admission = {"sql": sql_admission.stats(), "mongodb": mongo_admission.stats()}
+    lines += _gauges("twdb_admission_in_use", "Execution slots in use.", [({"backend": b}, s["in_use"]) for b, s in admission.items()])
+    lines += _gauges("twdb_admission_queue_depth", "Requests waiting for a slot.", [({"backend": b}, s["queue_depth"]) for b, s in admission.items()])
+    lines += _gauges("twdb_admission_rejected_total", "Requests rejected by admission control.", [
+        ({"backend": b, "reason": reason}, s[key])
+        for b, s in admission.items()
+        for reason, key in (("queue_full", "rejected_queue_full"), ("queue_timeout", "rejected_timeout"))
+    ], "counter")
+
+    log = query_log.stats()
+    lines += _gauges("twdb_query_log_queue_depth", "Query log documents waiting to be written.", [({}, log["queue_depth"])])
+    lines += _gauges("twdb_query_log_dropped_total", "Query log documents dropped.", [({}, log["dropped"])], "counter")
+
+    if router.replicas:
+        replicas = router.stats()["replicas"]
+        lines += _gauges("twdb_replica_healthy", "Replica health as seen by the monitor.", [({"replica": r["name"]}, r["healthy"]) for r in replicas])
+        lines += _gauges("twdb_replica_lag_seconds", "Replication lag per replica.", [({"replica": r["name"]}, r["lag_seconds"]) for r in replicas])
+        lines += _gauges("twdb_replica_in_flight", "Statements running per replica.", [({"replica": r["name"]}, r["in_flight"]) for r in replicas])
+    if mirror.tables:
+        mirror_stats = mirror.stats()
+        lines += _gauges("twdb_mirror_snapshot_age_seconds", "Age of each analytic mirror snapshot.", [({"table": t["name"]}, t["age_s"]) for t in mirror_stats["tables"]])
+        lines += _gauges("twdb_mirror_queries_total", "Aggregate queries by outcome on the analytic mirror.", [
+            ({"outcome": "routed"}, mirror_stats["routed"]),
+            ({"outcome": "fallback"}, mirror_stats["fallbacks"]),
+            ({"outcome": "stale"}, mirror_stats["skipped_stale"]),
+        ], "counter")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,385 @@
+"""
+Analytic Mirror
+Keeps periodic snapshots of the MIRROR_TABLES of DB_URI in an embedded
+engine (DuckDB when installed, otherwise SQLite) and answers read-only
+aggregate queries (GROUP BY / aggregate functions) from it. Queries are
+transpiled from MySQL with sqlglot and only routed when every table they
+read is mirrored and its snapshot is younger than MIRROR_MAX_STALENESS;
+anything else, including transpile or execution errors on the mirror, runs
+on MySQL as before. Results carry the engine that produced them.
+
+MySQL's default collations compare strings case-insensitively, so text
+columns are created with a case-insensitive collation in the mirror
+(NOCASE in SQLite, which folds ASCII letters only; NOACCENT.NOCASE in
+DuckDB) unless the source column is binary or case-sensitive. DuckDB
+ignores collations inside DISTINCT aggregates, so those stay on MySQL.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, Iterator, List, Mapping, Optional, Tuple
+import datetime
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from sqlalchemy import MetaData, Table, select, types as sqltypes
+from sqlglot import exp
+from .config import settings
+from .engines import get_engine
+from .metrics import stage
+from .result_format import rows_to_columnar
+from .routing import requires_primary
+from .sql_ast import parse_sql, is_read_only
+
+try:
+    import duckdb
+except Exception:
+    duckdb = None
+
+try:
+    import pyarrow as pa
+except Exception:
+    pa = None
+
+# Rows per multi-row INSERT when copying a snapshot batch into the mirror,
+# bounded by the number of bind variables a statement may carry
+INSERT_CHUNK = 500
+MAX_BIND_VARIABLES = 30000
+
+
+@dataclass
+class MirrorTable:
+    name: str
+    rows: int = 0
+    loaded_at: float = 0.0  # monotonic time the snapshot read started
+    loaded_wall: Optional[float] = None
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    refreshes: int = 0
+
+
+def is_aggregate(tree: exp.Expression) -> bool:
+    return tree.find(exp.Group) is not None or tree.find(exp.AggFunc) is not None
+
+
+def has_stable_names(tree: exp.Expression) -> bool:
+    # Engines name unaliased expressions differently (COUNT(*) vs count_star()); only route named outputs
+    return all(isinstance(e, (exp.Alias, exp.Column, exp.Star)) for e in getattr(tree, "selects", []))
+
+
+def has_distinct_aggregate(tree: exp.Expression) -> bool:
+    return any(agg.find(exp.Distinct) is not None for agg in tree.find_all(exp.AggFunc))
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def _sqlite_datetime(value: Any) -> Any:
+    # SQLite date functions expect "YYYY-MM-DD HH:MM:SS" text
+    return value.isoformat(" ") if isinstance(value, datetime.datetime) else value.isoformat()
+
+
+def _case_insensitive(sa_type: Any) -> bool:
+    """Whether MySQL compares values of a reflected string column case-insensitively."""
+    if getattr(sa_type, "binary", False):
+        return False
+    collation = (getattr(sa_type, "collation", None) or "").lower()
+    # No explicit collation means the table/schema default, which is _ci for MySQL's stock charsets
+    return not (collation == "binary" or collation.endswith("_bin") or collation.endswith("_cs"))
+
+
+def _collation(kind: str) -> str:
+    return " COLLATE NOACCENT.NOCASE" if kind == "duckdb" else " COLLATE NOCASE"
+
+
+def _column_spec(sa_type: Any, kind: str) -> Tuple[str, Optional[Callable[[Any], Any]]]:
+    """Mirror column type and value converter (None: store as fetched) for a reflected MySQL column."""
+    if isinstance(sa_type, sqltypes.Boolean):
+        return "BOOLEAN", None
+    if isinstance(sa_type, sqltypes.Integer):
+        return ("UBIGINT" if kind == "duckdb" and getattr(sa_type, "unsigned", False) else "BIGINT"), None
+    if isinstance(sa_type, sqltypes.Float):
+        return "DOUBLE", None
+    if isinstance(sa_type, sqltypes.Numeric):
+        precision, scale = sa_type.precision, sa_type.scale
+        if kind == "duckdb" and precision and precision <= 38:
+            return f"DECIMAL({precision},{scale or 0})", None
+        return "DOUBLE", float
+    if isinstance(sa_type, sqltypes.DateTime):
+        return "TIMESTAMP", None if kind == "duckdb" else _sqlite_datetime
+    if isinstance(sa_type, sqltypes.Date):
+        return "DATE", None if kind == "duckdb" else _sqlite_datetime
+    if isinstance(sa_type, (sqltypes.LargeBinary, sqltypes.BINARY, sqltypes.VARBINARY)):
+        return "BLOB", bytes
+    if isinstance(sa_type, sqltypes.String) and _case_insensitive(sa_type):
+        return "VARCHAR" + _collation(kind), _text
+    # Case-sensitive strings, TIME (timedelta), JSON, YEAR
+    return "VARCHAR", _text
+
+
+def _bind_literals(tree: exp.Expression, params: Mapping[str, Any]) -> exp.Expression:
+    """Inline :name values so the statement runs without dialect-specific placeholders."""
+    def bind(node: exp.Expression) -> exp.Expression:
+        if isinstance(node, exp.Placeholder) and node.name in params:
+            return exp.convert(params[node.name])
+        return node
+
+    bound = tree.transform(bind) if params else tree
+    if bound.find(exp.Placeholder) is not None:
+        raise ValueError("unbound placeholder")
+    return bound
+
+
+class AnalyticMirror:
+    def __init__(self, source_uri: Optional[str], tables: List[str], engine: str, path: Optional[str]):
+        self.source_uri = source_uri
+        self.tables = {t.lower(): MirrorTable(name=t) for t in tables}
+        self.kind = "duckdb" if engine == "duckdb" and duckdb is not None else "sqlite"
+        if self.kind == "sqlite":
+            # One file per worker process; removed again on shutdown
+            self._owns_path = path is None
+            self.path = path or os.path.join(tempfile.gettempdir(), f"twdb_mirror_{os.getpid()}.sqlite")
+        else:
+            self._owns_path = False
+            self.path = path or ":memory:"
+        self._db = None
+        self._lock = threading.Lock()
+        self._refresher: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.routed = 0
+        self.fallbacks = 0
+        self.stale = 0
+        self.last_error: Optional[str] = None
+
+    def enabled_for(self, uri: str) -> bool:
+        return bool(self.tables) and uri == self.source_uri
+
+    def _database(self):
+        with self._lock:
+            if self._db is None:
+                if self.kind == "duckdb":
+                    self._db = duckdb.connect(self.path)
+                else:
+                    self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+                    self._db.execute("PRAGMA journal_mode=WAL")
+            return self._db
+
+    @contextmanager
+    def _session(self) -> Iterator[Any]:
+        # DuckDB cursors are independent connections to the shared database
+        if self.kind == "duckdb":
+            conn = self._database().cursor()
+        else:
+            self._database()
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _ensure_refresher(self) -> None:
+        if self._stop.is_set() or (self._refresher is not None and self._refresher.is_alive()):
+            return
+        with self._lock:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(target=self._run, name="analytic-mirror", daemon=True)
+                self._refresher.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for state in list(self.tables.values()):
+                if self._stop.is_set():
+                    return
+                self.refresh(state)
+            self._stop.wait(settings.MIRROR_REFRESH_INTERVAL)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=5)
+        with self._lock:
+            db, self._db = self._db, None
+        if db is not None:
+            db.close()
+        if self._owns_path:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
+
+    def refresh(self, state: MirrorTable) -> None:
+        """Snapshot one table into a staging table and swap it in."""
+        started, wall = time.monotonic(), time.time()
+        try:
+            rows = self._load(state.name)
+            error = None
+        except Exception as e:
+            rows, error = None, str(e)
+        with self._lock:
+            state.error = error
+            if error is None:
+                state.rows = rows
+                state.loaded_at = started
+                state.loaded_wall = wall
+                state.duration_ms = round((time.monotonic() - started) * 1000, 1)
+                state.refreshes += 1
+
+    def _load(self, name: str) -> int:
+        engine = get_engine(self.source_uri)
+        source = Table(name, MetaData(), autoload_with=engine)
+        columns = list(source.columns)
+        specs = [_column_spec(c.type, self.kind) for c in columns]
+        converters = [convert for _, convert in specs]
+        staging, target = _quote(name + "__loading"), _quote(name)
+        definition = ", ".join(f"{_quote(c.name)} {kind}" for c, (kind, _) in zip(columns, specs))
+        row_marks = "(" + ", ".join("?" for _ in columns) + ")"
+        batch = max(1, settings.MIRROR_BATCH_ROWS)
+        per_insert = max(1, min(INSERT_CHUNK, MAX_BIND_VARIABLES // len(columns)))
+        count = 0
+        with self._session() as db, engine.connect() as src:
+            db.execute(f"DROP TABLE IF EXISTS {staging}")
+            db.execute(f"CREATE TABLE {staging} ({definition})")
+            result = src.execution_options(stream_results=True, max_row_buffer=batch).execute(select(source))
+            db.execute("BEGIN")
+            try:
+                for part in result.partitions(batch):
+                    rows = [tuple(v if f is None or v is None else f(v) for f, v in zip(converters, r)) for r in part]
+                    if not (self.kind == "duckdb" and self._insert_arrow(db, staging, len(columns), rows)):
+                        # Multi-row VALUES: far fewer round trips than executemany
+                        for i in range(0, len(rows), per_insert):
+                            chunk = rows[i:i + per_insert]
+                            db.execute(
+                                f"INSERT INTO {staging} VALUES " + ", ".join([row_marks] * len(chunk)),
+                                [v for row in chunk for v in row],
+                            )
+                    count += len(rows)
+                db.execute(f"DROP TABLE IF EXISTS {target}")
+                db.execute(f"ALTER TABLE {staging} RENAME TO {target}")
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return count
+
+    @staticmethod
+    def _insert_arrow(db: Any, staging: str, width: int, rows: List[Tuple[Any, ...]]) -> bool:
+        """Bulk-insert a batch into DuckDB through a registered Arrow table (an order of magnitude faster)."""
+        if pa is None:
+            return False
+        try:
+            batch = pa.Table.from_arrays(
+                [pa.array(list(values)) for values in zip(*rows)] if rows else [pa.array([])] * width,
+                names=[f"c{i}" for i in range(width)],
+            )
+        except Exception:
+            # Values pyarrow cannot infer a single type for; use plain INSERTs
+            return False
+        db.register("mirror_batch", batch)
+        try:
+            db.execute(f"INSERT INTO {staging} SELECT * FROM mirror_batch")
+        finally:
+            db.unregister("mirror_batch")
+        return True
+
+    def _staleness(self, tree: exp.Expression) -> Optional[float]:
+        """Age in seconds of the oldest snapshot the statement needs, or None if it can't be served."""
+        tables = list(tree.find_all(exp.Table))
+        ctes = {c.alias_or_name.lower() for c in tree.find_all(exp.CTE)}
+        now = time.monotonic()
+        oldest = 0.0
+        with self._lock:
+            for t in tables:
+                name = t.name.lower()
+                if name in ctes:
+                    continue
+                state = self.tables.get(name)
+                if not name or t.args.get("db") or state is None:
+                    return None
+                if not state.loaded_at or now - state.loaded_at > settings.MIRROR_MAX_STALENESS:
+                    self.stale += 1
+                    return None
+                oldest = max(oldest, now - state.loaded_at)
+        return oldest if tables else None
+
+    def answer(
+        self,
+        uri: str,
+        query: str,
+        params: Mapping[str, Any] | None,
+        result_format: str,
+    ) -> Optional[Dict[str, Any]]:
+        """Result of query from the mirror, or None when it should run on MySQL."""
+        if not self.enabled_for(uri):
+            return None
+        self._ensure_refresher()
+        tree = parse_sql(query)
+        if tree is None or not is_read_only(tree) or not is_aggregate(tree) or not has_stable_names(tree):
+            return None
+        if requires_primary(query):
+            return None
+        if self.kind == "duckdb" and has_distinct_aggregate(tree):
+            # COUNT(DISTINCT s) in DuckDB compares raw strings, not NOCASE ones
+            return None
+        staleness = self._staleness(tree)
+        if staleness is None:
+            return None
+        try:
+            sql = _bind_literals(tree, params or {}).sql(dialect=self.kind)
+            with stage("mirror"), self._session() as db:
+                cur = db.execute(sql)
+                columns = [d[0] for d in cur.description]
+                fetched = cur.fetchall()
+        except Exception as e:
+            with self._lock:
+                self.fallbacks += 1
+                self.last_error = str(e)
+            return None
+        with self._lock:
+            self.routed += 1
+        if result_format in ("columns", "arrow"):
+            out = rows_to_columnar(columns, fetched)
+            out["row_count"] = len(fetched)
+            out["format"] = "columns"
+        else:
+            out = {"rows": [dict(zip(columns, r)) for r in fetched], "row_count": len(fetched)}
+        out["engine"] = self.kind
+        out["staleness_s"] = round(staleness, 1)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "engine": self.kind,
+                "path": self.path,
+                "refresh_interval_s": settings.MIRROR_REFRESH_INTERVAL,
+                "max_staleness_s": settings.MIRROR_MAX_STALENESS,
+                "routed": self.routed,
+                "fallbacks": self.fallbacks,
+                "skipped_stale": self.stale,
+                "last_error": self.last_error,
+                "tables": [
+                    {
+                        "name": t.name,
+                        "rows": t.rows,
+                        "as_of": datetime.datetime.fromtimestamp(t.loaded_wall).isoformat() if t.loaded_wall else None,
+                        "age_s": round(now - t.loaded_at, 1) if t.loaded_at else None,
+                        "fresh": bool(t.loaded_at) and now - t.loaded_at <= settings.MIRROR_MAX_STALENESS,
+                        "load_ms": t.duration_ms,
+                        "refreshes": t.refreshes,
+                        "error": t.error,
+                    }
+                    for t in self.tables.values()
+                ],
+            }
+
+
+mirror = AnalyticMirror(settings.DB_URI, settings.MIRROR_TABLES, settings.MIRROR_ENGINE, settings.MIRROR_PATH)
@@ -0,0 +1,30 @@
+"""
+MongoDB Client Registry
+One pooled MongoClient per URI, shared across the process.
+"""
+from __future__ import annotations
+from typing import Dict
+import threading
+from pymongo import MongoClient
+
+_clients: Dict[str, MongoClient] = {}
+_lock = threading.Lock()
+
+
+def get_mongo_client(uri: str, **kwargs) -> MongoClient:
+    """Return the shared client for uri; kwargs only apply when it is first created."""
+    with _lock:
+        client = _clients.get(uri)
+        if client is None:
+            kwargs.setdefault("serverSelectionTimeoutMS", 5000)
+            client = MongoClient(uri, **kwargs)
+            _clients[uri] = client
+        return client
+
+
+def close_all() -> None:
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
@@ -0,0 +1,126 @@
+"""
+MongoDB Cluster Inspection
+Enumerates databases and collections for /mongodb/inspect on the shared
+client. Databases are listed with nameOnly/authorizedDatabases (no size
+scan, no listDatabases privilege needed), then collection listing and
+schema sampling fan out over a bounded thread pool. Each database gets its
+own client-side operation timeout and the call as a whole a deadline;
+whatever misses them is reported under "errors" and the rest is returned
+as a partial result instead of failing the request.
+"""
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed, wait
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import contextvars
+import threading
+import time
+import pymongo
+from pymongo import MongoClient
+from .config import settings
+from .metrics import stage
+from .mongo_schema import mongo_schemas
+
+SYSTEM_DATABASES = ("admin", "local", "config")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=max(1, settings.MONGO_INSPECT_WORKERS), thread_name_prefix="mongo-inspect")
+        return _pool
+
+
+def _submit(fn: Callable[..., Any], *args: Any) -> Future:
+    # Copy the request context so stage timers in the workers land on the calling request
+    return _executor().submit(contextvars.copy_context().run, fn, *args)
+
+
+def _list_collections(client: MongoClient, db_name: str) -> List[str]:
+    with pymongo.timeout(settings.MONGO_INSPECT_DB_TIMEOUT_MS / 1000):
+        return client[db_name].list_collection_names(authorizedCollections=True)
+
+
+def _infer(client: MongoClient, uri: str, db_name: str, name: str, refresh: bool) -> Dict[str, Any]:
+    return mongo_schemas.collection(client, uri, db_name, name, refresh)
+
+
+def _outcome(label: str, future: Future, errors: Dict[str, str]) -> Tuple[bool, Any]:
+    if not future.done():
+        future.cancel()
+        errors[label] = "timed out"
+        return False, None
+    if future.exception() is not None:
+        errors[label] = str(future.exception())
+        return False, None
+    return True, future.result()
+
+
+def _infer_all(futures: Dict[Tuple[str, str], Future], deadline: float, errors: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    wait(list(futures.values()), timeout=max(0.0, deadline - time.monotonic()))
+    schemas: Dict[str, Dict[str, Any]] = {}
+    for (db_name, name), future in futures.items():
+        ok, inferred = _outcome(f"{db_name}.{name}", future, errors)
+        if ok:
+            schemas.setdefault(db_name, {})[name] = inferred
+    return schemas
+
+
+def infer_collections(client: MongoClient, uri: str, targets: List[Tuple[str, str]], refresh: bool = False,
+                      errors: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Sampled schemas for (db, collection) targets in parallel, as {db: {collection: inference}}."""
+    deadline = time.monotonic() + settings.MONGO_INSPECT_TIMEOUT_MS / 1000
+    futures = {(db_name, name): _submit(_infer, client, uri, db_name, name, refresh) for db_name, name in targets}
+    return _infer_all(futures, deadline, errors if errors is not None else {})
+
+
+def inspect_cluster(client: MongoClient, uri: str, infer_fields: bool = True, refresh: bool = False) -> Dict[str, Any]:
+    """Databases, collections and (optionally) sampled schemas visible to the client's user."""
+    deadline = time.monotonic() + settings.MONGO_INSPECT_TIMEOUT_MS / 1000
+    errors: Dict[str, str] = {}
+    collections: Dict[str, List[str]] = {}
+    inferring: Dict[Tuple[str, str], Future] = {}
+    with stage("mongo_inspect"):
+        with pymongo.timeout(settings.MONGO_INSPECT_DB_TIMEOUT_MS / 1000):
+            db_names = [d["name"] for d in client.list_databases(nameOnly=True, authorizedDatabases=True)]
+        listing = {
+            _submit(_list_collections, client, db_name): db_name
+            for db_name in db_names
+            if db_name not in SYSTEM_DATABASES
+        }
+        # Start sampling a database's collections as soon as its listing arrives,
+        # so a slow database does not hold up the others
+        try:
+            for future in as_completed(listing, timeout=max(0.0, deadline - time.monotonic())):
+                db_name = listing[future]
+                ok, names = _outcome(db_name, future, errors)
+                if not ok:
+                    continue
+                collections[db_name] = sorted(names)
+                if infer_fields:
+                    for name in collections[db_name]:
+                        inferring[(db_name, name)] = _submit(_infer, client, uri, db_name, name, refresh)
+        except FuturesTimeout:
+            for future, db_name in listing.items():
+                if not future.done():
+                    _outcome(db_name, future, errors)
+        # Listing order, not completion order; failed databases are only named in errors
+        collections = {db_name: collections[db_name] for db_name in listing.values() if db_name in collections}
+        result: Dict[str, Any] = {"databases": db_names, "collections": collections}
+        if infer_fields:
+            result["schemas"] = _infer_all(inferring, deadline, errors)
+    result["partial"] = bool(errors)
+    if errors:
+        result["errors"] = errors
+    return result
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,229 @@
+"""
+MongoDB Schema Inference
+Infers a collection's shape from a bounded $sample of its documents: field
+paths (nested "a.b" and array element "tags[]" paths), BSON type
+distribution and presence frequency per path, plus the collection's
+indexes. Sampling is capped by MONGO_SCHEMA_SAMPLE_SIZE documents and
+MONGO_SCHEMA_TIME_BUDGET_MS (server maxTimeMS and client wall clock), so
+cost does not grow with collection size; results are cached per collection
+for MONGO_SCHEMA_REFRESH_INTERVAL seconds.
+"""
+from __future__ import annotations
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set, Tuple
+import datetime
+import re
+import threading
+import time
+from bson import Binary, Code, Decimal128, Int64, MaxKey, MinKey, ObjectId, Regex, Timestamp
+from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.errors import ExecutionTimeout, PyMongoError
+from .config import settings
+from .metrics import stage
+
+# Array elements inspected per array; enough to see element shape without walking huge arrays
+ARRAY_SAMPLE = 20
+
+_TYPE_NAMES: Tuple[Tuple[type, str], ...] = (
+    (bool, "bool"),
+    (Int64, "long"),
+    (int, "int"),
+    (float, "double"),
+    (str, "string"),
+    (dict, "object"),
+    (list, "array"),
+    (datetime.datetime, "date"),
+    (ObjectId, "objectId"),
+    (Decimal128, "decimal"),
+    (Binary, "binData"),
+    (bytes, "binData"),
+    (Regex, "regex"),
+    (re.Pattern, "regex"),
+    (Timestamp, "timestamp"),
+    (Code, "javascript"),
+    (MinKey, "minKey"),
+    (MaxKey, "maxKey"),
+)
+
+
+def bson_type(value: Any) -> str:
+    if value is None:
+        return "null"
+    for kind, name in _TYPE_NAMES:
+        if isinstance(value, kind):
+            if name == "int" and not -2**31 <= value < 2**31:
+                return "long"
+            return name
+    return type(value).__name__
+
+
+class _PathStats:
+    __slots__ = ("types", "docs")
+
+    def __init__(self) -> None:
+        self.types: Counter = Counter()
+        self.docs = 0
+
+
+class _Sampler:
+    def __init__(self, max_depth: int, max_fields: int):
+        self.max_depth = max_depth
+        self.max_fields = max_fields
+        self.paths: Dict[str, _PathStats] = {}
+        self.truncated = False
+        self.documents = 0
+
+    def _record(self, path: str, value: Any, depth: int, seen: Set[str]) -> None:
+        stats = self.paths.get(path)
+        if stats is None:
+            if len(self.paths) >= self.max_fields:
+                self.truncated = True
+                return
+            stats = self.paths[path] = _PathStats()
+        stats.types[bson_type(value)] += 1
+        seen.add(path)
+        if depth >= self.max_depth:
+            return
+        if isinstance(value, dict):
+            for key, child in value.items():
+                self._record(f"{path}.{key}", child, depth + 1, seen)
+        elif isinstance(value, list):
+            for item in value[:ARRAY_SAMPLE]:
+                self._record(f"{path}[]", item, depth + 1, seen)
+
+    def add(self, doc: Dict[str, Any]) -> None:
+        seen: Set[str] = set()
+        for key, value in doc.items():
+            self._record(key, value, 1, seen)
+        for path in seen:
+            self.paths[path].docs += 1
+        self.documents += 1
+
+    def fields(self, indexed: Set[str]) -> List[Dict[str, Any]]:
+        n = max(1, self.documents)
+        out = []
+        for path, stats in self.paths.items():
+            occurrences = sum(stats.types.values())
+            out.append({
+                "path": path,
+                "types": {t: round(c / occurrences, 4) for t, c in stats.types.most_common()},
+                "frequency": round(stats.docs / n, 4),
+                "indexed": path.replace("[]", "") in indexed,
+            })
+        return out
+
+
+def _indexes(collection: Collection) -> List[Dict[str, Any]]:
+    out = []
+    for name, info in collection.index_information().items():
+        out.append({
+            "name": name,
+            "keys": [[field, direction] for field, direction in info.get("key", [])],
+            "unique": bool(info.get("unique", False)),
+            "sparse": bool(info.get("sparse", False)),
+        })
+    return out
+
+
+def infer_collection(collection: Collection) -> Dict[str, Any]:
+    """Sample collection and describe its fields and indexes (uncached)."""
+    started = time.monotonic()
+    budget_ms = settings.MONGO_SCHEMA_TIME_BUDGET_MS
+    size = max(1, settings.MONGO_SCHEMA_SAMPLE_SIZE)
+    sampler = _Sampler(settings.MONGO_SCHEMA_MAX_DEPTH, settings.MONGO_SCHEMA_MAX_FIELDS)
+    partial = False
+    indexes: List[Dict[str, Any]] = []
+    out: Dict[str, Any] = {"collection": collection.name}
+    try:
+        with stage("mongo_sample"):
+            indexes = _indexes(collection)
+            out["estimated_count"] = collection.estimated_document_count(maxTimeMS=budget_ms)
+            # $sample with a size well under 5% of the collection uses a random cursor, not a full scan
+            cursor = collection.aggregate([{"$sample": {"size": size}}], maxTimeMS=budget_ms, batchSize=min(size, 500))
+            try:
+                for doc in cursor:
+                    sampler.add(doc)
+                    if (time.monotonic() - started) * 1000 > budget_ms:
+                        partial = True
+                        break
+            except ExecutionTimeout:
+                partial = True
+            finally:
+                cursor.close()
+    except PyMongoError as e:
+        out["error"] = str(e)
+    indexed = {key for ix in indexes for key, _ in ix["keys"]}
+    out.update({
+        "sampled": sampler.documents,
+        "partial": partial,
+        "truncated_fields": sampler.truncated,
+        "fields": sampler.fields(indexed),
+        "indexes": indexes,
+        "sampled_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    })
+    return out
+
+
+class MongoSchemaCache:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self._entries: Dict[Tuple[str, str, str], Tuple[float, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+    def _key_lock(self, key: Tuple[str, str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _cached(self, key: Tuple[str, str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry[0] < self.refresh_interval:
+            return entry[1]
+        return None
+
+    def collection(self, client: MongoClient, uri: str, db_name: str, name: str, refresh: bool = False) -> Dict[str, Any]:
+        """Inferred schema of db_name.name, sampled at most once per refresh interval."""
+        key = (uri, db_name, name)
+        cached = None if refresh else self._cached(key)
+        if cached is not None:
+            return cached
+        # Concurrent requests for the same collection wait for one sample instead of each taking one
+        with self._key_lock(key):
+            cached = None if refresh else self._cached(key)
+            if cached is not None:
+                return cached
+            result = infer_collection(client[db_name][name])
+            if "error" not in result:
+                with self._lock:
+                    self._entries[key] = (time.monotonic(), result)
+            return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+mongo_schemas = MongoSchemaCache(settings.MONGO_SCHEMA_REFRESH_INTERVAL)
+
+
+def field_paths(schema: Optional[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """{collection: fields} from an inspect response's "schemas" block ({db: {collection: inference}})."""
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for collections in ((schema or {}).get("schemas") or {}).values():
+        for name, inferred in collections.items():
+            out.setdefault(name, []).extend(inferred.get("fields", []))
+    return out
+
+
+def field_summary(inferred: Dict[str, Any], limit: int = 20) -> str:
+    """Most frequent fields of an inferred collection as "path:type" items for prompts."""
+    fields = sorted(inferred.get("fields", []), key=lambda f: -f.get("frequency", 0))[:limit]
+    parts = []
+    for f in fields:
+        kind = next(iter(f["types"]), "?")
+        optional = "?" if f.get("frequency", 1) < 1 else ""
+        parts.append(f"{f['path']}{optional}:{kind}")
+    return ", ".join(parts)
@@ -5,6 +5,7 @@ Extract collections, fields, and operations from natural language
 
 import re
 from typing import Dict, List, Any, Optional
+from .mongo_schema import field_paths
 
 # MongoDB operation keywords
 MONGODB_OPERATIONS = {
@@ -117,6 +118,21 @@ def extract_mongodb_entities(text: str, schema: Optional[Dict[str, Any]] = None)
                 else:
                     entities["fields"].append(match)
     
+    # Match inferred field paths (from /mongodb/inspect "schemas") by their leaf name,
+    # preferring fields of the collections mentioned and those present in most documents
+    inferred = field_paths(schema)
+    if inferred:
+        mentioned = [c for c in entities["collections"] if c in inferred] or list(inferred)
+        candidates = sorted(
+            (f for name in mentioned for f in inferred[name]),
+            key=lambda f: -f.get("frequency", 0),
+        )
+        for field in candidates:
+            path = field["path"]
+            leaf = path.replace("[]", "").rsplit(".", 1)[-1].lower()
+            if leaf != "_id" and re.search(rf'\b{re.escape(leaf)}s?\b', text_lower) and path not in entities["fields"]:
+                entities["fields"].append(path)
+
     # Extract conditions
     condition_keywords = [
         "greater than", "less than", "equal to", "not equal",
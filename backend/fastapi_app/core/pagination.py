@@ -0,0 +1,343 @@
+"""
+Result Pagination
+Continuation cursors for SELECTs cut off by SELECT_LIMIT_CAP, always by
+keyset: the next page re-runs the statement with a predicate that starts
+right after the last delivered row in ORDER BY order (WHERE key > last
+ORDER BY ... LIMIT n), so pages never repeat or drop rows and no page
+re-reads the rows before it. That needs a total order: a single-table
+SELECT whose ORDER BY reaches a primary key or unique NOT NULL column.
+Ordered queries that stop short of one get the table's key appended as a
+tiebreaker before the first page runs (with_tiebreaker), so the first page
+and its continuations agree on the order of ties. Keys come from the schema
+catalog. Everything else (joins, grouping, computed or unordered results)
+gets no cursor. Cursor ids are opaque; all state stays on the server.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Dict, Any, List, Mapping, Optional, Sequence, Tuple
+import threading
+import time
+import uuid
+from sqlglot import exp
+from .config import settings
+from .schema_catalog import catalog
+from .sql_ast import parse_sql, strip_statement, outer_limit, extend_order_by
+
+KEYSET = "keyset"
+
+
+@dataclass
+class OrderColumn:
+    column: exp.Column
+    output: str  # result column that carries its value
+    descending: bool
+    nullable: bool = True
+
+
+@dataclass
+class KeysetCursor:
+    uri: str
+    db_type: str
+    result_format: str
+    tree: exp.Select
+    order: List[OrderColumn]
+    last_values: Tuple[Any, ...]
+    remaining: Optional[int]
+    expires: float
+    params: Optional[Dict[str, Any]] = None
+    mode: str = KEYSET
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_cursors: Dict[str, KeysetCursor] = {}
+_lock = threading.Lock()
+
+
+def _sweep() -> None:
+    now = time.monotonic()
+    with _lock:
+        for cid in [cid for cid, c in _cursors.items() if c.expires < now]:
+            del _cursors[cid]
+
+
+def _register(cursor: KeysetCursor) -> str:
+    _sweep()
+    cursor_id = uuid.uuid4().hex
+    with _lock:
+        _cursors[cursor_id] = cursor
+    return cursor_id
+
+
+def close_cursor(cursor_id: str) -> bool:
+    with _lock:
+        return _cursors.pop(cursor_id, None) is not None
+
+
+def close_all() -> None:
+    with _lock:
+        _cursors.clear()
+
+
+def _unique_keys(uri: str, table: exp.Table) -> Tuple[str, ...]:
+    """Lower-cased single-column keys on NOT NULL columns of table, primary key first."""
+    try:
+        schema = catalog.get(uri).schema
+    except Exception:
+        return ()
+    if table.db and table.db.lower() != str(schema.get("db") or "").lower():
+        return ()
+    name = next((t for t in schema.get("columns", {}) if t.lower() == table.name.lower()), None)
+    if name is None:
+        return ()
+    not_null = {c["name"].lower() for c in schema["columns"][name] if c.get("nullable") == "NO"}
+    keys: List[str] = []
+    pk = schema.get("primary_keys", {}).get(name) or []
+    if len(pk) == 1:
+        keys.append(pk[0].lower())
+    for idx in schema.get("indexes", {}).get(name, []):
+        cols = idx.get("columns") or []
+        if idx.get("unique") and len(cols) == 1 and cols[0] and cols[0].lower() in not_null and cols[0].lower() not in keys:
+            keys.append(cols[0].lower())
+    return tuple(keys)
+
+
+def _single_table(tree: Optional[exp.Expression]) -> Optional[exp.Table]:
+    """The only table of a plain ordered SELECT, or None when keyset paging cannot apply."""
+    if not isinstance(tree, exp.Select) or tree.args.get("with") or tree.args.get("order") is None:
+        return None
+    if tree.args.get("joins") or tree.args.get("group") or tree.args.get("distinct") or tree.args.get("having"):
+        return None
+    if any(p.find(exp.AggFunc) for p in tree.expressions):
+        return None
+    source = tree.args.get("from")
+    table = source.this if source is not None else None
+    return table if isinstance(table, exp.Table) else None
+
+
+def _output_name(tree: exp.Select, name: str) -> Optional[str]:
+    """Result column that carries table column name, if the projection returns it."""
+    star = False
+    output = None
+    for proj in tree.expressions:
+        if isinstance(proj, exp.Star) or (isinstance(proj, exp.Column) and isinstance(proj.this, exp.Star)):
+            star = True
+        elif isinstance(proj, exp.Column) and proj.name.lower() == name.lower():
+            output = output or proj.name
+        elif isinstance(proj, exp.Alias):
+            inner = proj.this
+            if isinstance(inner, exp.Column) and inner.name.lower() == name.lower():
+                output = output or proj.alias
+            elif proj.alias.lower() == name.lower():
+                # An alias shadowing the column name: ORDER BY would mean the expression
+                return None
+    return output or (name if star else None)
+
+
+def _order_columns(tree: exp.Select, table: exp.Table) -> Optional[List[OrderColumn]]:
+    columns = []
+    for ordered in tree.args["order"].expressions:
+        col = ordered.this
+        if not isinstance(col, exp.Column) or isinstance(col.this, exp.Star):
+            return None
+        if col.table and col.table not in (table.name, table.alias_or_name):
+            return None
+        output = _output_name(tree, col.name)
+        if output is None:
+            return None
+        columns.append(OrderColumn(col, output, bool(ordered.args.get("desc"))))
+    return columns
+
+
+def _keyset_order(uri: str, tree: exp.Expression) -> Optional[List[OrderColumn]]:
+    """ORDER BY columns up to the first unique key (which makes the order total), else None."""
+    table = _single_table(tree)
+    if table is None:
+        return None
+    order = _order_columns(tree, table)
+    if not order:
+        return None
+    keys = _unique_keys(uri, table)
+    for i, col in enumerate(order):
+        if col.column.name.lower() in keys:
+            col.nullable = False
+            return order[:i + 1]
+    return None
+
+
+def _pageable(tree: Optional[exp.Expression]) -> bool:
+    # A literal LIMIT within the cap never leaves rows behind, so it never needs a cursor
+    if _single_table(tree) is None:
+        return False
+    user_limit = outer_limit(tree)
+    return user_limit is None or user_limit > settings.SELECT_LIMIT_CAP
+
+
+def tiebreaker_candidate(query: str) -> bool:
+    """Cheap AST pre-check: whether with_tiebreaker may need the schema catalog."""
+    return settings.PAGINATION_ENABLED and _pageable(parse_sql(strip_statement(query)))
+
+
+def with_tiebreaker(uri: str, query: str) -> str:
+    """
+    query with the table's key appended to its ORDER BY when the order it
+    asks for does not already reach a unique key. The added key only fixes
+    the order among ties, so the result is one the original query could
+    have returned, and keyset continuation becomes possible. Returned
+    unchanged when no key is available or keyset paging cannot apply.
+    """
+    if not tiebreaker_candidate(query):
+        return query
+    statement = strip_statement(query)
+    tree = parse_sql(statement)
+    table = _single_table(tree)
+    order = _order_columns(tree, table)
+    keys = _unique_keys(uri, table)
+    if not order or not keys or any(c.column.name.lower() in keys for c in order):
+        return query
+    key = next((k for k in keys if _output_name(tree, k) is not None), None)
+    if key is None:
+        return query
+    return extend_order_by(statement, exp.column(key, table=table.alias_or_name).sql(dialect="mysql"))
+
+
+def _literal(value: Any) -> exp.Expression:
+    if isinstance(value, bool) or value is None:
+        return exp.convert(value)
+    if isinstance(value, (int, float)):
+        return exp.Literal.number(value)
+    if isinstance(value, (datetime, date, dt_time)):
+        return exp.Literal.string(value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat())
+    if isinstance(value, Decimal):
+        return exp.Literal.number(str(value))
+    if isinstance(value, bytes):
+        return exp.Literal.string(value.decode("utf-8", errors="replace"))
+    return exp.Literal.string(str(value))
+
+
+def _after(col: OrderColumn, value: Any) -> Optional[exp.Expression]:
+    """Rows strictly after value on one column, with MySQL's NULLs-first ascending order."""
+    if value is None:
+        # NULL is the smallest value: everything non-NULL follows it ascending, nothing descending
+        return None if col.descending else exp.not_(col.column.copy().is_(exp.null()))
+    op = exp.LT if col.descending else exp.GT
+    after = op(this=col.column.copy(), expression=_literal(value))
+    if col.descending and col.nullable:
+        return exp.or_(after, col.column.copy().is_(exp.null()))
+    return after
+
+
+def _after_row(order: Sequence[OrderColumn], values: Sequence[Any]) -> exp.Expression:
+    """(c1, c2, ..., key) > (v1, v2, ..., vk) in ORDER BY order, expanded per column direction."""
+    disjuncts = []
+    ties: List[exp.Expression] = []
+    for col, value in zip(order, values):
+        after = _after(col, value)
+        if after is not None:
+            disjuncts.append(exp.and_(*ties, after) if ties else after)
+        if value is None:
+            ties.append(col.column.copy().is_(exp.null()))
+        else:
+            ties.append(exp.EQ(this=col.column.copy(), expression=_literal(value)))
+    return exp.or_(*disjuncts) if len(disjuncts) > 1 else disjuncts[0]
+
+
+def _last_values(out: Dict[str, Any], order: Sequence[OrderColumn]) -> Tuple[Any, ...]:
+    if "rows" in out:
+        last = {str(k).lower(): v for k, v in out["rows"][-1].items()}
+        return tuple(last[c.output.lower()] for c in order)
+    columns = [str(c).lower() for c in out["columns"]]
+    return tuple(out["data"][columns.index(c.output.lower())][-1] for c in order)
+
+
+def may_continue(out: Dict[str, Any]) -> bool:
+    """Cheap pre-check: only results that filled the cap can have more rows."""
+    return (
+        settings.PAGINATION_ENABLED
+        and "error" not in out
+        and ("rows" in out or "data" in out)
+        and out.get("row_count", 0) >= settings.SELECT_LIMIT_CAP
+    )
+
+
+def attach(
+    uri: str,
+    db_type: str,
+    query: str,
+    out: Dict[str, Any],
+    result_format: str,
+    params: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Add next_cursor/pagination to out when the row cap cut the result short.
+    query is the statement as executed before the LIMIT rewrite (including
+    any tiebreaker from with_tiebreaker) and params the values for its :name
+    placeholders; later pages reuse them.
+    """
+    if not may_continue(out):
+        return out
+    tree = parse_sql(strip_statement(query))
+    if not _pageable(tree):
+        return out
+    if tree.args.get("limit") is not None and outer_limit(tree) is None:
+        return out
+    order = _keyset_order(uri, tree)
+    if order is None:
+        return out
+    try:
+        last = _last_values(out, order)
+    except (KeyError, ValueError, IndexError):
+        return out
+    if last[-1] is None:
+        return out
+    user_limit = outer_limit(tree)
+    cursor = KeysetCursor(
+        uri=uri, db_type=db_type, result_format=result_format, tree=tree.copy(), order=order,
+        last_values=last, remaining=None if user_limit is None else user_limit - out["row_count"],
+        expires=time.monotonic() + settings.PAGINATION_CURSOR_TTL,
+        params=dict(params) if params else None,
+    )
+    out["next_cursor"] = _register(cursor)
+    out["pagination"] = cursor.mode
+    return out
+
+
+def _keyset_page_query(cursor: KeysetCursor, n: int) -> str:
+    page = cursor.tree.copy().where(_after_row(cursor.order, cursor.last_values), append=True)
+    page.set("offset", None)
+    page.set("limit", None)
+    return page.limit(n).sql(dialect="mysql")
+
+
+def fetch_next(cursor_id: str) -> Dict[str, Any]:
+    """Return the next page for a cursor, with next_cursor set while more rows remain."""
+    from .execution import execute_query
+
+    _sweep()
+    with _lock:
+        cursor = _cursors.get(cursor_id)
+    if cursor is None:
+        return {"error": "Cursor not found or expired", "error_type": "cursor_expired"}
+    page_size = settings.SELECT_LIMIT_CAP
+    with cursor.lock:
+        n = page_size if cursor.remaining is None else min(page_size, cursor.remaining)
+        out = execute_query(
+            _keyset_page_query(cursor, n), cursor.db_type, cursor.uri,
+            result_format=cursor.result_format, params=cursor.params,
+        )
+        if "error" in out:
+            return out
+        more = out.get("row_count", 0) == n
+        if more:
+            cursor.last_values = _last_values(out, cursor.order)
+            if cursor.remaining is not None:
+                cursor.remaining -= n
+                more = cursor.remaining > 0
+        if more:
+            cursor.expires = time.monotonic() + settings.PAGINATION_CURSOR_TTL
+            out["next_cursor"] = cursor_id
+            out["pagination"] = cursor.mode
+    if not more:
+        close_cursor(cursor_id)
+    return out
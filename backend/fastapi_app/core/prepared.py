@@ -0,0 +1,85 @@
+"""
+Prepared Statements
+Executes parameterized statements. By default they bind through SQLAlchemy
+text(): one round trip, with the driver interpolating the values. With
+PREPARED_STATEMENTS=true each pooled MySQL connection keeps its own LRU of
+server-side prepared statements (PREPARE ... FROM / EXECUTE ... USING), so a
+template is parsed and planned once per connection. The drivers in use only
+speak the text protocol, so every execution then costs two round trips (SET
+the user variables, EXECUTE); that only pays off when parsing and planning
+outweigh a round trip. scripts/bench_prepared.py measures both paths.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Mapping, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Result
+from .config import settings
+from .sql_ast import positional, fingerprint_key
+
+# MySQL: Unknown prepared statement handler (deallocated or lost with the session)
+UNKNOWN_STATEMENT_ERROR = 1243
+
+_INFO_KEY = "prepared_statements"
+
+
+def _statements(conn: Connection) -> "OrderedDict[str, str]":
+    # conn.info lives with the DBAPI connection, so the cache is dropped
+    # together with the server session that owns the statements
+    return conn.info.setdefault(_INFO_KEY, OrderedDict())
+
+
+def _prepare(conn: Connection, sql: str) -> str:
+    statements = _statements(conn)
+    name = statements.get(sql)
+    if name is not None:
+        statements.move_to_end(sql)
+        return name
+    name = "twdb_" + fingerprint_key(sql)[:24]
+    conn.exec_driver_sql(f"PREPARE {name} FROM %s", (sql,))
+    statements[sql] = name
+    while len(statements) > max(1, settings.PREPARED_STATEMENT_CACHE_SIZE):
+        _, old = statements.popitem(last=False)
+        try:
+            conn.exec_driver_sql(f"DEALLOCATE PREPARE {old}")
+        except Exception:
+            pass
+    return name
+
+
+def _values(names: tuple, params: Mapping[str, Any]) -> list:
+    missing = [n for n in names if n not in params]
+    if missing:
+        raise ValueError(f"A value is required for bind parameter '{missing[0]}'")
+    return [params[n] for n in names]
+
+
+def _is_unknown_statement(exc: BaseException) -> bool:
+    args = getattr(getattr(exc, "orig", None), "args", None) or ()
+    return bool(args) and args[0] == UNKNOWN_STATEMENT_ERROR
+
+
+def execute(conn: Connection, statement: str, params: Optional[Mapping[str, Any]] = None) -> Result:
+    """Run statement with :name bind parameters on conn (a reused server-side prepare on MySQL when enabled)."""
+    if not params:
+        return conn.execute(text(statement))
+    if not settings.PREPARED_STATEMENTS or conn.dialect.name != "mysql":
+        return conn.execute(text(statement), dict(params))
+    sql, names = positional(statement)
+    values = _values(names, params)
+    if not names:
+        return conn.execute(text(statement))
+    variables = [f"@twdb_p{i}" for i in range(len(names))]
+    # EXECUTE ... USING only takes user variables: the extra round trip of this path
+    conn.exec_driver_sql("SET " + ", ".join(f"{v} = %s" for v in variables), tuple(values))
+    using = " USING " + ", ".join(variables)
+    name = _prepare(conn, sql)
+    try:
+        return conn.exec_driver_sql(f"EXECUTE {name}{using}")
+    except Exception as e:
+        if not _is_unknown_statement(e):
+            raise
+        # The server dropped the statement; prepare it again once
+        _statements(conn).pop(sql, None)
+        return conn.exec_driver_sql(f"EXECUTE {_prepare(conn, sql)}{using}")
+
@@ -0,0 +1,136 @@
+"""
+Query Log Sink
+Bounded in-process queue of query log documents, drained by a background
+worker that writes them to MongoDB with insert_many on one pooled client.
+Request paths only enqueue, so logging never adds a Mongo round trip.
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Dict, Any, List
+import queue
+import threading
+import time
+from .config import settings
+from .mongo_clients import get_mongo_client
+
+_STOP = object()
+
+
+class QueryLogSink:
+    def __init__(self, max_queue: int, batch_size: int, flush_interval: float, block_ms: int = 0):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.block_ms = block_ms
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_queue))
+        self._worker: threading.Thread | None = None
+        self._lock = threading.Lock()
+        # Counters are bumped from request threads and the worker; _lock guards them
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.failed = 0
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="query-log-sink", daemon=True)
+                self._worker.start()
+
+    def submit(self, doc: Dict[str, Any]) -> bool:
+        """Enqueue a log document. Returns False when it was dropped because the queue is full."""
+        if not settings.MONGO_URI:
+            return False
+        self._ensure_worker()
+        doc.setdefault("created_at", datetime.utcnow())
+        try:
+            self._queue.put_nowait(doc)
+        except queue.Full:
+            if self.block_ms <= 0:
+                with self._lock:
+                    self.dropped += 1
+                return False
+            # Backpressure: wait briefly for the worker before giving up
+            with self._lock:
+                self.blocked += 1
+            try:
+                self._queue.put(doc, timeout=self.block_ms / 1000)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            client = get_mongo_client(settings.MONGO_URI)
+            db = client.get_default_database(default=settings.QUERY_LOG_DB)
+            db[settings.QUERY_LOG_COLLECTION].insert_many(batch, ordered=False)
+        except Exception:
+            with self._lock:
+                self.failed += len(batch)
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            stop = item is _STOP
+            batch: List[Dict[str, Any]] = [] if stop else [item]
+            # Collect up to one batch, waiting at most flush_interval after the first document
+            deadline = time.monotonic() + self.flush_interval
+            while not stop and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Write everything queued so far and stop the worker (used on shutdown)."""
+        worker = self._worker
+        if worker is None or not worker.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        worker.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "dropped": self.dropped,
+                "blocked": self.blocked,
+                "failed": self.failed,
+            }
+
+
+query_log = QueryLogSink(
+    max_queue=settings.QUERY_LOG_QUEUE_SIZE,
+    batch_size=settings.QUERY_LOG_BATCH_SIZE,
+    flush_interval=settings.QUERY_LOG_FLUSH_INTERVAL,
+    block_ms=settings.QUERY_LOG_BLOCK_MS,
+)
@@ -1,6 +1,11 @@
 from __future__ import annotations
 from typing import List, Dict, Any
 from sqlglot import parse_one, exp
+from .sql_ast import parse_sql, strip_statement
+from .metrics import stage
+from .join_graph import graph_for, join_conformance
+from .column_stats import value_check
+from .config import settings
 
 try:
     from sentence_transformers import SentenceTransformer, util
@@ -9,15 +14,31 @@ except Exception:
     _embed = None
 
 
-def rank_candidates(text: str, candidates: List[str], schema: Dict[str, Any], db_type: str) -> List[Dict[str, Any]]:
+def embedding_model():
+    """Shared sentence-transformers model, or None when it is not installed."""
+    return _embed
+
+
+def rank_candidates(text: str, candidates: List[str], schema: Dict[str, Any], db_type: str,
+                    stats: Dict[str, Any] | None = None) -> List[Dict[str, Any]]:
     ranked = []
+    graph = graph_for(schema) if schema.get("foreign_keys") else None
     for q in candidates:
-        syntax_ok = False
-        try:
-            parse_one(q, read=db_type)
-            syntax_ok = True
-        except Exception:
-            syntax_ok = False
+        # Memoized parse shared with the validator and executor
+        tree = parse_sql(strip_statement(q), db_type)
+        syntax_ok = tree is not None
+        # Joins that do not follow a foreign key are usually wrong (cartesian or mismatched keys)
+        join_penalty = 0.0
+        off_graph: List[str] = []
+        if graph is not None and tree is not None:
+            conformance = join_conformance(tree, graph)
+            off_graph = conformance["off_graph"]
+            if conformance["joins"]:
+                join_penalty = settings.RANK_OFF_GRAPH_JOIN_PENALTY * len(off_graph) / conformance["joins"]
+        # Filters on values a fully known column never takes return nothing; values only
+        # missing from a partial sample are reported without a penalty
+        values = value_check(tree, stats) if tree is not None else {"known": [], "unknown": [], "unseen": []}
+        value_penalty = settings.RANK_UNKNOWN_VALUE_PENALTY * len(values["unknown"])
         # simple schema match: count occurrences of table names
         schema_score = 0.0
         tables = schema.get("tables", [])
@@ -27,11 +48,17 @@ def rank_candidates(text: str, candidates: List[str], schema: Dict[str, Any], db
         sim_score = 0.0
         if _embed:
             try:
-                sim = util.cos_sim(_embed.encode([text], convert_to_tensor=True), _embed.encode([q], convert_to_tensor=True))
+                with stage("embed"):
+                    sim = util.cos_sim(_embed.encode([text], convert_to_tensor=True), _embed.encode([q], convert_to_tensor=True))
                 sim_score = float(sim[0][0])
             except Exception:
                 sim_score = 0.0
-        score = (1.0 if syntax_ok else 0.0) + schema_score + sim_score
-        ranked.append({"query": q, "score": score, "syntax_ok": syntax_ok, "schema_score": schema_score, "sim": sim_score})
+        score = (1.0 if syntax_ok else 0.0) + schema_score + sim_score - join_penalty - value_penalty
+        ranked.append({
+            "query": q, "score": score, "syntax_ok": syntax_ok, "schema_score": schema_score, "sim": sim_score,
+            "join_penalty": round(join_penalty, 4), "off_graph_joins": off_graph,
+            "value_penalty": round(value_penalty, 4), "unknown_values": values["unknown"],
+            "unsampled_values": values["unseen"],
+        })
     ranked.sort(key=lambda x: x["score"], reverse=True)
     return ranked
@@ -0,0 +1,163 @@
+"""
+Query Result Cache
+In-process cache of SELECT results keyed by (DB URI, normalized statement
+fingerprint, verbatim SELECT list, bound parameters, result format), with
+TTL, a byte budget with LRU eviction, and table-level invalidation when a
+write statement runs through the service.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, FrozenSet, Mapping, Optional
+import json
+import threading
+import time
+from .config import settings
+from .sql_ast import parse_sql, fingerprint, fingerprint_key, projection_text, referenced_tables, is_read_only, is_write, is_deterministic
+
+
+@dataclass
+class CacheEntry:
+    uri: str
+    tables: FrozenSet[str]
+    value: Dict[str, Any]
+    size: int
+    created: float
+
+
+def _estimate_size(value: Any) -> int:
+    """Cheap recursive size estimate in bytes; avoids serializing the result."""
+    if isinstance(value, dict):
+        return 64 + sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(_estimate_size(v) for v in value)
+    if isinstance(value, (str, bytes)):
+        return 49 + len(value)
+    return 32
+
+
+class ResultCache:
+    def __init__(self, ttl_seconds: float, max_bytes: int):
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry.created > self.ttl:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, uri: str, tables: FrozenSet[str], value: Dict[str, Any]) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = CacheEntry(uri, tables, value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, uri: str, tables: FrozenSet[str]) -> int:
+        """Drop entries for uri that reference any of tables (all entries for uri if tables is empty)."""
+        with self._lock:
+            keys = [
+                k for k, e in self._entries.items()
+                if e.uri == uri and (not tables or e.tables & tables)
+            ]
+            for k in keys:
+                self._drop(k)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+result_cache = ResultCache(settings.RESULT_CACHE_TTL, settings.RESULT_CACHE_MAX_BYTES)
+
+
+def cache_key(uri: str, query: str, result_format: str, params: Optional[Mapping[str, Any]] = None) -> str:
+    bound = json.dumps(params, sort_keys=True, default=str) if params else ""
+    # The fingerprint rewrites projections (COUNT(*) / count(*), IFNULL / COALESCE), but the
+    # result's column labels come from their source text
+    return fingerprint_key(uri, fingerprint(query), projection_text(query), bound, result_format)
+
+
+def lookup(uri: str, query: str, result_format: str, params: Optional[Mapping[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """Return a copy of the cached result with cache metadata, or None on a miss."""
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    tree = parse_sql(query)
+    if tree is None or not is_read_only(tree):
+        return None
+    entry = result_cache.get(cache_key(uri, query, result_format, params))
+    if entry is None:
+        return None
+    out = dict(entry.value)
+    out["cache"] = {"hit": True, "age_ms": round((time.monotonic() - entry.created) * 1000, 1)}
+    return out
+
+
+def record(
+    uri: str,
+    query: str,
+    result_format: str,
+    out: Dict[str, Any],
+    params: Optional[Mapping[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Update the cache after a successful execution: store deterministic
+    read results, invalidate tables touched by writes. Returns out with
+    cache metadata attached.
+    """
+    if not settings.RESULT_CACHE_ENABLED:
+        return out
+    tree = parse_sql(query)
+    if tree is None or is_write(tree):
+        # Unparseable statements may write anywhere; drop everything for the URI
+        tables = referenced_tables(tree) if tree is not None else frozenset()
+        out["cache"] = {"hit": False, "invalidated": result_cache.invalidate(uri, tables)}
+        return out
+    if not is_read_only(tree):
+        return out
+    if is_deterministic(tree):
+        result_cache.put(cache_key(uri, query, result_format, params), uri, referenced_tables(tree), dict(out))
+    out["cache"] = {"hit": False, "age_ms": 0}
+    return out
@@ -0,0 +1,81 @@
+"""
+Result Formats
+Columnar encodings for query results: a column header plus per-column value
+arrays, and an optional Arrow IPC stream when pyarrow is installed.
+"""
+from __future__ import annotations
+from typing import Dict, List, Any, Mapping, Optional, Sequence, Iterable
+from starlette.responses import JSONResponse, Response
+from .metrics import stage, timings, server_timing
+
+try:
+    import pyarrow as pa
+except Exception:
+    pa = None
+
+RESULT_FORMATS = ("rows", "columns", "arrow")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+def rows_to_columnar(columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> Dict[str, Any]:
+    """Transpose row tuples into {"columns": [...], "data": [[col0 values], ...]}."""
+    data = [list(col) for col in zip(*rows)]
+    if not data:
+        data = [[] for _ in columns]
+    return {"columns": list(columns), "data": data}
+
+
+def documents_to_columnar(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Columnar form of MongoDB documents. Columns are the union of top-level
+    keys in first-seen order; documents missing a key get None.
+    """
+    columns: List[str] = []
+    seen = set()
+    for doc in docs:
+        for key in doc:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    data = [[doc.get(c) for doc in docs] for c in columns]
+    return {"columns": columns, "data": data}
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def _arrow_array(values: List[Any]):
+    try:
+        return pa.array(values)
+    except Exception:
+        # Mixed or unsupported types (e.g. ObjectId) fall back to strings
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+
+def columnar_to_arrow_ipc(columnar: Dict[str, Any]) -> bytes:
+    """Encode a columnar result as an Arrow IPC stream."""
+    if pa is None:
+        raise RuntimeError("pyarrow is not installed; Arrow encoding is unavailable")
+    arrays = [_arrow_array(values) for values in columnar["data"]]
+    table = pa.Table.from_arrays(arrays, names=[str(c) for c in columnar["columns"]])
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_response(columnar: Dict[str, Any], headers: Optional[Mapping[str, str]] = None) -> Response:
+    """
+    Arrow IPC response for a columnar result, shared by the SQL and MongoDB
+    endpoints. The stage timings a JSON body would carry go in Server-Timing.
+    Without pyarrow every backend answers 400 with an unsupported_format error.
+    """
+    try:
+        with stage("encode"):
+            payload = columnar_to_arrow_ipc(columnar)
+    except RuntimeError as e:
+        return JSONResponse(status_code=400, content={"error": str(e), "error_type": "unsupported_format", "timings": timings()})
+    headers = dict(headers or {})
+    headers["Server-Timing"] = server_timing(timings())
+    return Response(content=payload, media_type=ARROW_MEDIA_TYPE, headers=headers)
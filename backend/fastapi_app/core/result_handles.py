@@ -0,0 +1,491 @@
+"""
+Result Handles
+Server-held materialized results. A read query is run once on a streaming
+cursor and its rows are kept as row groups: in memory while the rows held by
+all handles fit in RESULT_HANDLE_SPILL_BYTES, otherwise the largest handles
+are moved to a columnar temp file that is memory-mapped for reads. Clients fetch arbitrary row ranges (optionally
+sorted by a column) from the handle instead of re-running the query;
+handles expire after RESULT_HANDLE_TTL seconds of inactivity.
+"""
+from __future__ import annotations
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import json
+import mmap
+import os
+import tempfile
+import threading
+import time
+import uuid
+from sqlalchemy.engine import Result
+from .config import settings
+from .json_response import dumps
+from .sql_ast import enforce_limit, strip_statement, parse_sql, is_read_only
+from . import cost_guard, prepared, routing
+from .metrics import stage
+from .cancellation import CancelToken, effective_timeout_ms, add_max_execution_time, kill_function, deadline, cancellation_error
+
+INT64_MIN, INT64_MAX = -(2 ** 63), 2 ** 63 - 1
+NULL, VALUE = b"\x01", b"\x00"
+
+
+def _kind(values: Sequence[Any]) -> str:
+    """Storage kind for a column chunk: int64, float64, utf-8 text or JSON-encoded objects."""
+    kinds = set()
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            return "o"
+        if isinstance(v, int):
+            if not INT64_MIN <= v <= INT64_MAX:
+                return "o"
+            kinds.add("i")
+        elif isinstance(v, float):
+            kinds.add("f")
+        elif isinstance(v, str):
+            kinds.add("s")
+        else:
+            return "o"
+        if len(kinds) > 1:
+            return "o"
+    return kinds.pop() if kinds else "i"
+
+
+def _estimate_bytes(values: Sequence[Any]) -> int:
+    total = 0
+    for v in values:
+        if isinstance(v, (str, bytes)):
+            total += 49 + len(v)
+        elif v is None or isinstance(v, (int, float)):
+            total += 24
+        else:
+            total += 64
+    return total
+
+
+@dataclass
+class Segment:
+    """One column of a spilled row group: where its bytes live in the file."""
+    kind: str
+    mask: int
+    data: int
+    offsets: int = -1
+
+
+@dataclass
+class RowGroup:
+    start: int
+    count: int
+    columns: Optional[List[List[Any]]] = None  # in memory
+    segments: Optional[List[Segment]] = None   # spilled
+
+    def read(self, handle: "ResultHandle", col: int, lo: int, hi: int) -> List[Any]:
+        """Values of column col for rows [lo, hi) relative to this group."""
+        if self.columns is not None:
+            return self.columns[col][lo:hi]
+        seg = self.segments[col]
+        mm = handle.mapped()
+        mask = mm[seg.mask + lo: seg.mask + hi]
+        if seg.kind in ("i", "f"):
+            values = array("q" if seg.kind == "i" else "d")
+            values.frombytes(mm[seg.data + lo * 8: seg.data + hi * 8])
+            return [None if mask[i] else values[i] for i in range(hi - lo)]
+        bounds = array("q")
+        bounds.frombytes(mm[seg.offsets + lo * 8: seg.offsets + (hi + 1) * 8])
+        out: List[Any] = []
+        for i in range(hi - lo):
+            if mask[i]:
+                out.append(None)
+                continue
+            raw = mm[seg.data + bounds[i]: seg.data + bounds[i + 1]]
+            # Objects come back in the shape the JSON response would give them;
+            # the stdlib decoder keeps integers wider than 64 bits exact
+            out.append(raw.decode("utf-8") if seg.kind == "s" else json.loads(raw))
+        return out
+
+
+def _encode(values: List[Any], kind: str) -> Tuple[bytes, bytes, Optional[bytes]]:
+    """(null mask, data, offsets) for one column chunk."""
+    mask = b"".join(NULL if v is None else VALUE for v in values)
+    if kind in ("i", "f"):
+        filler = 0 if kind == "i" else 0.0
+        return mask, array("q" if kind == "i" else "d", [filler if v is None else v for v in values]).tobytes(), None
+    blobs = [b"" if v is None else (v.encode("utf-8") if kind == "s" else dumps(v)) for v in values]
+    bounds = array("q", [0])
+    for b in blobs:
+        bounds.append(bounds[-1] + len(b))
+    return mask, b"".join(blobs), bounds.tobytes()
+
+
+@dataclass
+class ResultHandle:
+    columns: List[str]
+    expires: float
+    groups: List[RowGroup] = field(default_factory=list)
+    row_count: int = 0
+    memory_bytes: int = 0
+    path: Optional[str] = None
+    file_bytes: int = 0
+    truncated: bool = False
+    sealed: bool = False
+    closed: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    _file: Any = None
+    _mmap: Optional[mmap.mmap] = None
+    _orders: Dict[Tuple[int, bool], array] = field(default_factory=dict)
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def append(self, rows: Sequence[Sequence[Any]]) -> None:
+        if not rows:
+            return
+        columns = [list(col) for col in zip(*rows)]
+        group = RowGroup(start=self.row_count, count=len(rows), columns=columns)
+        self.groups.append(group)
+        self.row_count += len(rows)
+        if self.spilled:
+            self._spill(group)
+            return
+        added = sum(_estimate_bytes(c) for c in columns)
+        self.memory_bytes += added
+        _charge(self, added)
+        for victim in _over_budget(self):
+            if victim is self:
+                self.spill()
+                continue
+            # A sealed handle may be mid-fetch in another request
+            with victim.lock:
+                if not victim.closed:
+                    victim.spill()
+
+    def spill(self) -> None:
+        """Move every in-memory row group to the spill file."""
+        for g in self.groups:
+            if g.columns is not None:
+                self._spill(g)
+        released, self.memory_bytes = self.memory_bytes, 0
+        _charge(self, -released)
+        if self.sealed:
+            self._map()
+
+    def _spill(self, group: RowGroup) -> None:
+        if self._file is None:
+            fd, self.path = tempfile.mkstemp(prefix="twdb-result-", suffix=".col", dir=settings.RESULT_HANDLE_DIR)
+            self._file = os.fdopen(fd, "w+b")
+        segments = []
+        for values in group.columns:
+            kind = _kind(values)
+            mask, data, offsets = _encode(values, kind)
+            seg = Segment(kind=kind, mask=self.file_bytes, data=0)
+            self._file.write(mask)
+            self.file_bytes += len(mask)
+            if offsets is not None:
+                seg.offsets = self.file_bytes
+                self._file.write(offsets)
+                self.file_bytes += len(offsets)
+            seg.data = self.file_bytes
+            self._file.write(data)
+            self.file_bytes += len(data)
+            segments.append(seg)
+        group.segments = segments
+        group.columns = None
+
+    def finish(self) -> None:
+        """Seal the handle: flush the spill file and map it read-only."""
+        self.sealed = True
+        self._map()
+
+    def _map(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            if self.file_bytes:
+                if self._mmap is not None:
+                    self._mmap.close()
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def mapped(self) -> mmap.mmap:
+        if self._mmap is None:
+            raise RuntimeError("result handle is not sealed")
+        return self._mmap
+
+    def _read_range(self, lo: int, hi: int) -> List[List[Any]]:
+        """Column lists for rows [lo, hi) in storage order."""
+        out: List[List[Any]] = [[] for _ in self.columns]
+        starts = [g.start for g in self.groups]
+        i = max(0, bisect_right(starts, lo) - 1)
+        while i < len(self.groups) and self.groups[i].start < hi:
+            g = self.groups[i]
+            a, b = max(lo, g.start) - g.start, min(hi, g.start + g.count) - g.start
+            for c in range(len(self.columns)):
+                out[c].extend(g.read(self, c, a, b))
+            i += 1
+        return out
+
+    def _order(self, col: int, descending: bool) -> array:
+        key = (col, descending)
+        order = self._orders.get(key)
+        if order is None:
+            values = self._read_range(0, self.row_count)[col]
+
+            # NULL sorts lowest, as in MySQL
+            def sort_key(i: int):
+                v = values[i]
+                return (v is not None, v)
+            try:
+                idx = sorted(range(self.row_count), key=sort_key, reverse=descending)
+            except TypeError:
+                # Mixed types in one column: fall back to comparing text
+                idx = sorted(range(self.row_count), key=lambda i: (values[i] is not None, str(values[i])), reverse=descending)
+            order = array("q", idx)
+            self._orders[key] = order
+        return order
+
+    def fetch(self, offset: int, limit: int, sort_column: Optional[int] = None, descending: bool = False) -> List[List[Any]]:
+        """Column lists for a window of rows, optionally in sorted order."""
+        offset = max(0, offset)
+        hi = min(self.row_count, offset + max(0, limit))
+        if offset >= hi:
+            return [[] for _ in self.columns]
+        if sort_column is None:
+            return self._read_range(offset, hi)
+        out: List[List[Any]] = [[] for _ in self.columns]
+        starts = [g.start for g in self.groups]
+        for row in self._order(sort_column, descending)[offset:hi]:
+            g = self.groups[bisect_right(starts, row) - 1]
+            r = row - g.start
+            for c in range(len(self.columns)):
+                out[c].extend(g.read(self, c, r, r + 1))
+        return out
+
+    def close(self) -> None:
+        try:
+            if self._mmap is not None:
+                self._mmap.close()
+            if self._file is not None:
+                self._file.close()
+            if self.path:
+                os.unlink(self.path)
+        except OSError:
+            pass
+        self._mmap = None
+        self._file = None
+        self.groups = []
+        released, self.memory_bytes = self.memory_bytes, 0
+        _charge(self, -released)
+        self._orders.clear()
+        self.closed = True
+
+
+# Rows held in memory across all handles, including ones still being filled
+_resident: Dict[int, ResultHandle] = {}
+_resident_bytes = 0
+_resident_lock = threading.Lock()
+
+
+def _charge(handle: ResultHandle, delta: int) -> None:
+    global _resident_bytes
+    with _resident_lock:
+        _resident_bytes += delta
+        if handle.memory_bytes > 0:
+            _resident[id(handle)] = handle
+        else:
+            _resident.pop(id(handle), None)
+
+
+def resident_bytes() -> int:
+    with _resident_lock:
+        return _resident_bytes
+
+
+def _over_budget(current: ResultHandle) -> List[ResultHandle]:
+    """Largest handles to spill until the resident rows fit RESULT_HANDLE_SPILL_BYTES."""
+    with _resident_lock:
+        excess = _resident_bytes - settings.RESULT_HANDLE_SPILL_BYTES
+        victims: List[ResultHandle] = []
+        for h in sorted(_resident.values(), key=lambda h: h.memory_bytes, reverse=True):
+            if excess <= 0:
+                break
+            # Handles another request is still filling spill themselves on their next append
+            if h is not current and not h.sealed:
+                continue
+            victims.append(h)
+            excess -= h.memory_bytes
+        return victims
+
+
+def _close(handle: ResultHandle) -> None:
+    # Wait for any in-flight fetch on the handle before unmapping it
+    with handle.lock:
+        handle.close()
+
+
+_handles: Dict[str, ResultHandle] = {}
+_lock = threading.Lock()
+
+
+def _sweep() -> None:
+    now = time.monotonic()
+    with _lock:
+        expired = [hid for hid, h in _handles.items() if h.expires < now]
+        handles = [_handles.pop(hid) for hid in expired]
+    for h in handles:
+        _close(h)
+
+
+def _register(handle: ResultHandle) -> str:
+    _sweep()
+    with _lock:
+        evicted = []
+        while len(_handles) >= max(1, settings.RESULT_HANDLE_MAX_HANDLES):
+            oldest = min(_handles, key=lambda hid: _handles[hid].expires)
+            evicted.append(_handles.pop(oldest))
+        handle_id = uuid.uuid4().hex
+        _handles[handle_id] = handle
+    for h in evicted:
+        _close(h)
+    return handle_id
+
+
+def close_handle(handle_id: str) -> bool:
+    with _lock:
+        handle = _handles.pop(handle_id, None)
+    if handle is None:
+        return False
+    _close(handle)
+    return True
+
+
+def close_all() -> None:
+    with _lock:
+        handles = list(_handles.values())
+        _handles.clear()
+    for h in handles:
+        _close(h)
+
+
+def _page(handle_id: str, handle: ResultHandle, offset: int, columns_data: List[List[Any]], result_format: str) -> Dict[str, Any]:
+    n = len(columns_data[0]) if columns_data else 0
+    if result_format == "rows":
+        out: Dict[str, Any] = {"rows": [dict(zip(handle.columns, r)) for r in zip(*columns_data)]}
+    else:
+        out = {"columns": list(handle.columns), "data": columns_data, "format": "columns"}
+    out.update({
+        "row_count": n,
+        "handle": handle_id,
+        "offset": offset,
+        "total_rows": handle.row_count,
+        "spilled": handle.spilled,
+        "truncated": handle.truncated,
+    })
+    return out
+
+
+def fetch(
+    handle_id: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    descending: bool = False,
+    result_format: str = "rows",
+) -> Dict[str, Any]:
+    """Read a row window from a handle and extend its TTL."""
+    _sweep()
+    with _lock:
+        handle = _handles.get(handle_id)
+    if handle is None:
+        return {"error": "Result handle not found or expired", "error_type": "handle_expired"}
+    limit = settings.SELECT_LIMIT_CAP if limit is None else min(limit, settings.SELECT_LIMIT_CAP)
+    sort_column = None
+    if sort is not None:
+        if sort not in handle.columns:
+            return {"error": f"Unknown sort column: {sort}", "error_type": "bad_request"}
+        sort_column = handle.columns.index(sort)
+    with handle.lock:
+        if handle.closed:
+            return {"error": "Result handle not found or expired", "error_type": "handle_expired"}
+        handle.expires = time.monotonic() + settings.RESULT_HANDLE_TTL
+        data = handle.fetch(offset, limit, sort_column, descending)
+    return _page(handle_id, handle, offset, data, result_format)
+
+
+def materialize(
+    query: str,
+    db_type: str = "mysql",
+    db_uri: Optional[str] = None,
+    result_format: str = "rows",
+    timeout_ms: Optional[int] = None,
+    cancel_token: Optional[CancelToken] = None,
+    params: Optional[Dict[str, Any]] = None,
+    page_size: Optional[int] = None,
+    use_primary: bool = False,
+) -> Dict[str, Any]:
+    """
+    Run a read query into a new result handle (up to RESULT_HANDLE_MAX_ROWS
+    rows) and return its first page. Non-read statements are rejected so the
+    caller can run them normally.
+    """
+    from .execution import _log_to_mongo
+
+    if db_type != "mysql":
+        return {"error": f"Unsupported db_type for execution: {db_type}"}
+    uri = db_uri or settings.DB_URI
+    if not uri:
+        return {"error": "DB_URI not configured"}
+    statement = strip_statement(query)
+    tree = parse_sql(statement)
+    if tree is None or not is_read_only(tree):
+        return {"error": "Only read-only statements can be materialized", "error_type": "bad_request"}
+    cap = settings.RESULT_HANDLE_MAX_ROWS
+    # Ask for one extra row so a result cut off by the cap can be flagged
+    q = enforce_limit(statement, cap + 1)
+    token = cancel_token or CancelToken()
+    timeout = effective_timeout_ms(timeout_ms)
+    handle: Optional[ResultHandle] = None
+    guard = None
+    try:
+        with routing.connection(uri, q, use_primary) as (_, engine, conn):
+            with stage("cost_guard"):
+                guard = cost_guard.check(conn, uri, q, params)
+            if guard and guard["blocked"]:
+                _log_to_mongo({"query": q, "db_type": db_type, "success": False, "materialized": True, "error": "cost_guard"})
+                return cost_guard.blocked_error(guard)
+            size = max(1, settings.RESULT_HANDLE_ROW_GROUP)
+            conn = conn.execution_options(stream_results=True, max_row_buffer=size)
+            q_exec = add_max_execution_time(q, timeout) if timeout and conn.dialect.name == "mysql" else q
+            if (timeout or cancel_token is not None) and not token.bind(kill_function(engine, conn)):
+                return {"error": f"Query cancelled: {token.reason}", "error_type": "cancelled"}
+            try:
+                with deadline(token, timeout):
+                    res: Result = prepared.execute(conn, q_exec, params)
+                    handle = ResultHandle(columns=list(res.keys()), expires=0.0)
+                    for part in res.partitions(size):
+                        room = cap - handle.row_count
+                        if len(part) > room:
+                            handle.append(part[:room])
+                            handle.truncated = True
+                            break
+                        handle.append(part)
+            finally:
+                token.unbind()
+        handle.finish()
+    except Exception as e:
+        if handle is not None:
+            handle.close()
+        err = cancellation_error(token, e, timeout) or {"error": str(e)}
+        _log_to_mongo({"query": q, "db_type": db_type, "success": False, "materialized": True, "error": err["error"]})
+        return err
+    handle.expires = time.monotonic() + settings.RESULT_HANDLE_TTL
+    handle_id = _register(handle)
+    _log_to_mongo({"query": q, "db_type": db_type, "success": True, "materialized": True, "row_count": handle.row_count})
+    first = min(page_size or settings.SELECT_LIMIT_CAP, settings.SELECT_LIMIT_CAP)
+    with handle.lock:
+        data = handle.fetch(0, first)
+    out = _page(handle_id, handle, 0, data, result_format)
+    if guard and guard["warnings"]:
+        out["cost"] = guard
+    return out
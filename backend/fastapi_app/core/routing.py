@@ -0,0 +1,261 @@
+"""
+Read/Write Routing
+Sends read-only statements against the primary DB_URI to the replicas in
+DB_REPLICA_URIS (round-robin or least in-flight statements) and everything
+else to the primary: writes, DDL, locking reads (FOR UPDATE / LOCK IN SHARE
+MODE), SELECT ... INTO and requests that ask for the primary. A background
+monitor probes replica health and replication lag; replicas that are down,
+lagging past DB_REPLICA_MAX_LAG_SECONDS or failing to connect are skipped
+until a later probe succeeds, and their reads fall back to the primary.
+"""
+from __future__ import annotations
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+import itertools
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlglot import exp
+from .config import settings
+from .engines import get_engine, get_async_engine
+from .sql_ast import parse_sql, strip_statement, is_read_only
+from .metrics import stage
+
+PRIMARY = "primary"
+
+
+@dataclass
+class Route:
+    name: str
+    uri: str
+
+    @property
+    def is_replica(self) -> bool:
+        return self.name != PRIMARY
+
+
+@dataclass
+class ReplicaState:
+    name: str
+    uri: str
+    healthy: bool = True
+    lag_seconds: Optional[float] = None
+    checked_at: float = 0.0
+    error: Optional[str] = None
+    in_flight: int = 0
+    routed: int = 0
+    failures: int = 0
+
+
+def requires_primary(query: str) -> bool:
+    """True for statements that must see (or change) the primary's current state."""
+    tree = parse_sql(strip_statement(query))
+    if tree is None or not is_read_only(tree):
+        return True
+    return tree.find(exp.Lock) is not None or any(s.args.get("into") for s in tree.find_all(exp.Select))
+
+
+def _probe_lag(conn: Connection) -> Optional[float]:
+    """
+    Seconds behind the primary, or None when the lag cannot be read (e.g. no
+    REPLICATION CLIENT privilege). Raises when replication is stopped.
+    """
+    if settings.DB_REPLICA_LAG_QUERY:
+        value = conn.execute(text(settings.DB_REPLICA_LAG_QUERY)).scalar()
+        if value is None:
+            raise RuntimeError("replication stopped")
+        return float(value)
+    if conn.dialect.name != "mysql":
+        conn.execute(text("SELECT 1"))
+        return 0.0
+    for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"), ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+        try:
+            row = conn.execute(text(statement)).mappings().first()
+        except Exception:
+            continue
+        if row is None:
+            # Not configured as a replica (e.g. a read-only stand-in): no lag to report
+            return 0.0
+        value = row.get(column)
+        if value is None:
+            raise RuntimeError("replication stopped")
+        return float(value)
+    return None
+
+
+class ReplicaRouter:
+    def __init__(self, primary_uri: Optional[str], replica_uris: List[str]):
+        self.primary_uri = primary_uri
+        self.replicas = [ReplicaState(name=f"replica-{i}", uri=u) for i, u in enumerate(replica_uris)]
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._monitor: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.primary_routed = 0
+        self.fallbacks = 0
+
+    def _ensure_monitor(self) -> None:
+        if self._stop.is_set() or (self._monitor is not None and self._monitor.is_alive()):
+            return
+        with self._lock:
+            if self._monitor is None or not self._monitor.is_alive():
+                self._monitor = threading.Thread(target=self._run, name="replica-monitor", daemon=True)
+                self._monitor.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            for replica in self.replicas:
+                self.probe(replica)
+            self._stop.wait(settings.DB_REPLICA_CHECK_INTERVAL)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def probe(self, replica: ReplicaState) -> None:
+        try:
+            with get_engine(replica.uri).connect() as conn:
+                lag = _probe_lag(conn)
+            healthy, error = True, None
+        except Exception as e:
+            lag, healthy, error = None, False, str(e)
+        with self._lock:
+            replica.lag_seconds = lag
+            replica.healthy = healthy
+            replica.error = error
+            replica.checked_at = time.monotonic()
+
+    def _eligible(self, replica: ReplicaState) -> bool:
+        if not replica.healthy:
+            return False
+        max_lag = settings.DB_REPLICA_MAX_LAG_SECONDS
+        if not max_lag:
+            return True
+        # Lag unknown (not probed yet or unreadable): stay on the primary rather than risk stale reads
+        return replica.lag_seconds is not None and replica.lag_seconds <= max_lag
+
+    def route(self, uri: str, query: str, use_primary: bool = False) -> Route:
+        """Pick where to run query. Only statements against the primary DB_URI are routed."""
+        if not self.replicas or uri != self.primary_uri or use_primary or requires_primary(query):
+            with self._lock:
+                self.primary_routed += 1
+            return Route(PRIMARY, uri)
+        self._ensure_monitor()
+        with self._lock:
+            candidates = [r for r in self.replicas if self._eligible(r)]
+            if not candidates:
+                self.primary_routed += 1
+                self.fallbacks += 1
+                return Route(PRIMARY, uri)
+            start = next(self._rotation) % len(candidates)
+            ordered = candidates[start:] + candidates[:start]
+            if settings.DB_REPLICA_STRATEGY == "least_connections":
+                chosen = min(ordered, key=lambda r: r.in_flight)
+            else:
+                chosen = ordered[0]
+            chosen.in_flight += 1
+            chosen.routed += 1
+            return Route(chosen.name, chosen.uri)
+
+    def _replica(self, route: Route) -> Optional[ReplicaState]:
+        return next((r for r in self.replicas if r.name == route.name), None)
+
+    def release(self, route: Route) -> None:
+        replica = self._replica(route)
+        if replica is not None:
+            with self._lock:
+                replica.in_flight = max(0, replica.in_flight - 1)
+
+    def mark_unhealthy(self, route: Route, error: BaseException) -> None:
+        """Take a replica out of rotation until the monitor sees it healthy again."""
+        replica = self._replica(route)
+        if replica is None:
+            return
+        with self._lock:
+            replica.healthy = False
+            replica.error = str(error)
+            replica.failures += 1
+            self.fallbacks += 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "strategy": settings.DB_REPLICA_STRATEGY,
+                "max_lag_seconds": settings.DB_REPLICA_MAX_LAG_SECONDS,
+                "primary_routed": self.primary_routed,
+                "fallbacks": self.fallbacks,
+                "replicas": [
+                    {
+                        "name": r.name,
+                        "healthy": r.healthy,
+                        "eligible": self._eligible(r),
+                        "lag_seconds": r.lag_seconds,
+                        "checked_ago_s": round(now - r.checked_at, 1) if r.checked_at else None,
+                        "error": r.error,
+                        "in_flight": r.in_flight,
+                        "routed": r.routed,
+                        "failures": r.failures,
+                    }
+                    for r in self.replicas
+                ],
+            }
+
+
+router = ReplicaRouter(settings.DB_URI, settings.DB_REPLICA_URIS)
+
+
+@contextmanager
+def connection(uri: str, query: str, use_primary: bool = False) -> Iterator[Tuple[Route, Engine, Connection]]:
+    """
+    Open a connection for query on the routed target. A replica that cannot
+    be reached is marked unhealthy and the statement goes to the primary.
+    """
+    route = router.route(uri, query, use_primary)
+    engine = get_engine(route.uri)
+    try:
+        with stage("connect"):
+            conn = engine.connect()
+    except Exception as e:
+        router.release(route)
+        if not route.is_replica:
+            raise
+        router.mark_unhealthy(route, e)
+        route = Route(PRIMARY, uri)
+        engine = get_engine(uri)
+        with stage("connect"):
+            conn = engine.connect()
+    try:
+        with conn:
+            yield route, engine, conn
+    finally:
+        router.release(route)
+
+
+@asynccontextmanager
+async def async_connection(uri: str, query: str, use_primary: bool = False) -> AsyncIterator[Tuple[Route, Any, Any]]:
+    """Async counterpart of connection(); yields (route, AsyncEngine, AsyncConnection)."""
+    route = router.route(uri, query, use_primary)
+    engine = get_async_engine(route.uri)
+    try:
+        if engine is None:
+            raise RuntimeError("no async driver for replica")
+        with stage("connect"):
+            conn = await engine.connect()
+    except Exception as e:
+        router.release(route)
+        if not route.is_replica:
+            raise
+        router.mark_unhealthy(route, e)
+        route = Route(PRIMARY, uri)
+        engine = get_async_engine(uri)
+        with stage("connect"):
+            conn = await engine.connect()
+    try:
+        yield route, engine, conn
+    finally:
+        try:
+            await conn.close()
+        finally:
+            router.release(route)
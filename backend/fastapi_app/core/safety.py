@@ -1,8 +1,10 @@
 from __future__ import annotations
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import re
 from sqlglot import parse_one, exp
 from .config import settings
+from .sql_ast import parse_sql, strip_statement, exceeds_limit, referenced_tables, DDL_TYPES
+from .column_stats import value_check
 
 BLOCKED = {"DROP", "TRUNCATE", "ALTER"}
 
@@ -75,7 +77,7 @@ def detect_sql_injection(query: str) -> Dict[str, Any]:
     }
 
 
-def validate_query(query: str, db_type: str = "mysql") -> Dict[str, Any]:
+def validate_query(query: str, db_type: str = "mysql", stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     safety = {"valid_syntax": False, "blocked": False, "reasons": []}
     
     # 1. SQL Injection Detection (Advanced)
@@ -99,10 +101,13 @@ def validate_query(query: str, db_type: str = "mysql") -> Dict[str, Any]:
             return safety
     
     try:
-        tree = parse_one(query, read=db_type)
+        # Shared memoized parse: the executor reuses this tree for its LIMIT rewrite
+        tree = parse_sql(strip_statement(query), db_type)
+        if tree is None:
+            parse_one(query, read=db_type)  # re-raise to report the parser's message
         safety["valid_syntax"] = True
         # Block DDL
-        if isinstance(tree, (exp.Drop, exp.Truncate, exp.Alter)):
+        if isinstance(tree, DDL_TYPES):
             safety["blocked"] = True
             safety["reasons"].append("DDL is blocked")
         # Block DELETE/UPDATE without WHERE
@@ -112,11 +117,23 @@ def validate_query(query: str, db_type: str = "mysql") -> Dict[str, Any]:
         if isinstance(tree, exp.Update) and not tree.args.get("where"):
             safety["blocked"] = True
             safety["reasons"].append("UPDATE without WHERE is blocked")
-        # Enforce LIMIT on SELECT
-        if isinstance(tree, exp.Select):
-            limit = tree.args.get("limit")
-            if not limit:
+        # Enforce LIMIT on SELECT/UNION (outermost query block)
+        if exceeds_limit(tree, settings.SELECT_LIMIT_CAP):
+            if tree.args.get("limit") is None:
                 safety["reasons"].append("SELECT missing LIMIT; will cap at runtime")
+            else:
+                safety["reasons"].append(f"SELECT LIMIT above {settings.SELECT_LIMIT_CAP}; will cap at runtime")
+        # Column stats (when collected for this schema): table sizes and filters that cannot match
+        if stats and tree is not None:
+            by_name = {name.lower(): (name, entry) for name, entry in stats.get("tables", {}).items()}
+            sizes = {by_name[t][0]: by_name[t][1].get("rows") for t in referenced_tables(tree) if t in by_name}
+            if sizes:
+                safety["estimated_rows"] = sizes
+            values = value_check(tree, stats)
+            for predicate in values["unknown"]:
+                safety["reasons"].append(f"VALUE_NOT_FOUND: {predicate} matches no value of the column")
+            for predicate in values["unseen"]:
+                safety["reasons"].append(f"VALUE_NOT_SAMPLED: {predicate} is not among the sampled values")
     except Exception as e:
         safety["reasons"].append(f"parse_error: {e}")
     # Simple injection heuristics
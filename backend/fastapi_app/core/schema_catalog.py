@@ -0,0 +1,179 @@
+"""
+Schema Catalog
+Server-side cache of introspected MySQL schemas, one current entry per DB
+URI. Each entry has a version id fingerprinted from information_schema
+(table create times plus checksums of columns, indexes and foreign keys),
+so revalidation is a single aggregate query and a full introspection only
+runs when the schema actually changed. Clients reference a schema by
+version id (and use it as an ETag) instead of uploading the schema blob.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Tuple
+import hashlib
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from .config import settings
+from .engines import get_engine
+from .introspection import describe
+from .metrics import stage
+
+# One row per object kind: (kind, count, checksum, last data change)
+_FINGERPRINT_SQL = text(
+    """
+    SELECT 'tables', COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, TABLE_TYPE, CREATE_TIME))), 0), MAX(UPDATE_TIME)
+    FROM information_schema.tables WHERE table_schema = DATABASE()
+    UNION ALL
+    SELECT 'columns', COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, ORDINAL_POSITION,
+        COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA))), 0), NULL
+    FROM information_schema.columns WHERE table_schema = DATABASE()
+    UNION ALL
+    SELECT 'indexes', COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX, COLUMN_NAME, NON_UNIQUE))), 0), NULL
+    FROM information_schema.statistics WHERE table_schema = DATABASE()
+    UNION ALL
+    SELECT 'foreign_keys', COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', CONSTRAINT_NAME, TABLE_NAME, COLUMN_NAME,
+        REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME))), 0), NULL
+    FROM information_schema.KEY_COLUMN_USAGE WHERE table_schema = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+    """
+)
+
+
+class SchemaVersionNotFound(KeyError):
+    def __init__(self, version: str):
+        super().__init__(version)
+        self.version = version
+
+    def detail(self) -> Dict[str, Any]:
+        return {
+            "error": f"Unknown or expired schema version: {self.version}; reload /schema/inspect",
+            "error_type": "schema_version_not_found",
+            "schema_version": self.version,
+        }
+
+
+@dataclass
+class CatalogEntry:
+    uri: str
+    version: str
+    schema: Dict[str, Any]
+    fingerprint: Tuple[Any, ...]
+    data_updated_at: Optional[str]
+    checked_at: float
+
+    def document(self) -> Dict[str, Any]:
+        """Schema as returned to clients, tagged with its version."""
+        return {**self.schema, "schema_version": self.version}
+
+
+def fingerprint(conn: Connection) -> Tuple[Tuple[Any, ...], Optional[str]]:
+    """
+    Structural fingerprint of the current database and the latest data
+    change time. UPDATE_TIME moves on every write, so it is reported but
+    kept out of the schema version.
+    """
+    rows = conn.execute(_FINGERPRINT_SQL).fetchall()
+    structure = tuple((kind, int(count), int(checksum)) for kind, count, checksum, _ in rows)
+    updated = max((str(r[3]) for r in rows if r[3] is not None), default=None)
+    return structure, updated
+
+
+class SchemaCatalog:
+    def __init__(self, ttl_seconds: float, max_versions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_versions = max(1, max_versions)
+        self._current: Dict[str, CatalogEntry] = {}
+        self._versions: "OrderedDict[str, CatalogEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._uri_locks: Dict[str, threading.Lock] = {}
+        self.revalidations = 0
+        self.reloads = 0
+
+    def _uri_lock(self, uri: str) -> threading.Lock:
+        with self._lock:
+            return self._uri_locks.setdefault(uri, threading.Lock())
+
+    def _fresh(self, entry: Optional[CatalogEntry]) -> bool:
+        return entry is not None and time.monotonic() - entry.checked_at < self.ttl_seconds
+
+    def get(self, uri: str, refresh: bool = False) -> CatalogEntry:
+        """
+        Current catalog entry for uri. Within the TTL the cached entry is
+        returned as is; after it (or with refresh) the fingerprint is
+        re-checked and the schema only re-introspected when it changed.
+        """
+        entry = self._current.get(uri)
+        if not refresh and self._fresh(entry):
+            return entry
+        # One revalidation per URI at a time; concurrent callers reuse its result
+        with self._uri_lock(uri):
+            entry = self._current.get(uri)
+            if not refresh and self._fresh(entry):
+                return entry
+            with stage("catalog"), get_engine(uri).connect() as conn:
+                structure, updated = fingerprint(conn)
+                self.revalidations += 1
+                if entry is not None and entry.fingerprint == structure:
+                    entry.checked_at = time.monotonic()
+                    entry.data_updated_at = updated
+                    return entry
+                schema = describe(conn)
+            version = hashlib.sha1(f"{uri}\x00{structure!r}".encode("utf-8")).hexdigest()[:16]
+            entry = CatalogEntry(uri, version, schema, structure, updated, time.monotonic())
+            with self._lock:
+                self.reloads += 1
+                self._current[uri] = entry
+                self._versions[version] = entry
+                self._versions.move_to_end(version)
+                while len(self._versions) > self.max_versions:
+                    self._versions.popitem(last=False)
+            return entry
+
+    def resolve(self, version: str) -> CatalogEntry:
+        """Entry for a version id handed out earlier; raises SchemaVersionNotFound once evicted."""
+        with self._lock:
+            entry = self._versions.get(version)
+        if entry is None:
+            raise SchemaVersionNotFound(version)
+        return entry
+
+    def invalidate(self, uri: Optional[str] = None) -> None:
+        """Force the next get() to revalidate (all URIs when uri is None)."""
+        with self._lock:
+            for key, entry in self._current.items():
+                if uri is None or key == uri:
+                    entry.checked_at = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "uris": len(self._current),
+                "versions": len(self._versions),
+                "revalidations": self.revalidations,
+                "reloads": self.reloads,
+            }
+
+
+catalog = SchemaCatalog(settings.SCHEMA_CATALOG_TTL, settings.SCHEMA_CATALOG_MAX_VERSIONS)
+
+
+def schema_context(db_schema: Optional[Dict[str, Any]], schema_version: Optional[str]) -> Dict[str, Any]:
+    """Schema for a request: the uploaded blob if any, else the catalog entry it references."""
+    if db_schema:
+        return db_schema
+    if schema_version:
+        return catalog.resolve(schema_version).schema
+    return {}
+
+
+def etag(version: str) -> str:
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], version: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag(version) for t in tags)
@@ -0,0 +1,224 @@
+"""
+Schema Selector
+Picks the part of a MySQL schema worth putting into an LLM prompt. Tables
+and columns are scored against the question by identifier token overlap
+plus, when sentence-transformers is available, cosine similarity with
+cached embeddings of their names. The best tables are taken in score order
+up to SCHEMA_PROMPT_TOP_K and a token budget, then the tables on the FK
+join path between them (from the join graph) are added and the path itself
+is spelled out so the model can write the joins.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Set, Tuple
+import re
+import threading
+from .config import settings
+from .metrics import stage
+from .ranking import embedding_model
+from .join_graph import graph_for
+
+# Tokens are estimated at ~4 characters each; exact counts would need the provider's tokenizer
+CHARS_PER_TOKEN = 4
+# Similarity below this is noise for short identifier strings
+MIN_SIMILARITY = 0.3
+
+_STOPWORDS = {
+    "a", "all", "an", "and", "are", "as", "at", "by", "do", "each", "for", "from", "get", "give", "has",
+    "have", "how", "i", "in", "is", "it", "list", "many", "me", "much", "of", "on", "or", "per", "show",
+    "that", "the", "their", "there", "to", "was", "were", "what", "which", "who", "with", "find",
+}
+
+
+def _stem(token: str) -> str:
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokens(text: str) -> Set[str]:
+    """Lowercased, singularised word tokens; identifiers split on _ and camelCase."""
+    text = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", text)
+    return {_stem(t) for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in _STOPWORDS}
+
+
+def _column_name(column: Any) -> str:
+    return column.get("name") if isinstance(column, dict) else str(column)
+
+
+class _EmbeddingCache:
+    """Normalised embeddings of table/column name phrases, shared across requests and schemas."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._vectors: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def vectors(self, model, phrases: List[str]) -> Dict[str, Any]:
+        with self._lock:
+            found = {p: self._vectors[p] for p in phrases if p in self._vectors}
+            for p in found:
+                self._vectors.move_to_end(p)
+        missing = [p for p in dict.fromkeys(phrases) if p not in found]
+        if missing:
+            encoded = model.encode(missing, normalize_embeddings=True, convert_to_numpy=True)
+            with self._lock:
+                for phrase, vector in zip(missing, encoded):
+                    self._vectors[phrase] = vector
+                    found[phrase] = vector
+                while len(self._vectors) > self.max_entries:
+                    self._vectors.popitem(last=False)
+        return found
+
+
+name_embeddings = _EmbeddingCache(settings.SCHEMA_EMBED_CACHE_SIZE)
+
+
+def _phrase(identifier: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", identifier).lower()))
+
+
+@dataclass
+class SchemaSelection:
+    tables: List[str]
+    columns: Dict[str, List[str]]
+    foreign_keys: List[Dict[str, Any]]
+    join_path: List[Dict[str, Any]] = field(default_factory=list)
+    scores: Dict[str, float] = field(default_factory=dict)
+    bridges: List[str] = field(default_factory=list)
+    pruned: bool = False
+
+    def render(self) -> str:
+        lines = [f"Table {t}({', '.join(self.columns[t])})" for t in self.tables]
+        on_path = {(e["from_table"], e["from_column"], e["to_table"], e["to_column"]) for e in self.join_path}
+        for fk in self.foreign_keys:
+            if (fk["from_table"], fk["from_column"], fk["to_table"], fk["to_column"]) not in on_path:
+                lines.append(f"FK {fk['from_table']}.{fk['from_column']} -> {fk['to_table']}.{fk['to_column']}")
+        if self.join_path:
+            lines.append("Join path: " + " AND ".join(e["condition"] for e in self.join_path))
+        return "\n".join(lines)
+
+
+def _similarities(question: str, phrases: List[str]) -> Dict[str, float]:
+    model = embedding_model()
+    if model is None or not phrases:
+        return {}
+    try:
+        with stage("embed"):
+            vectors = name_embeddings.vectors(model, phrases)
+            query = model.encode([question], normalize_embeddings=True, convert_to_numpy=True)[0]
+        return {p: float(v @ query) for p, v in vectors.items()}
+    except Exception:
+        return {}
+
+
+def _score(question: str, schema: Dict[str, Any]) -> Tuple[Dict[str, float], Dict[str, Dict[str, float]]]:
+    words = tokens(question)
+    columns = schema.get("columns", {})
+    names = [_phrase(t) for t in schema.get("tables", [])]
+    names += [_phrase(_column_name(c)) for cols in columns.values() for c in cols]
+    similarity = _similarities(question, names)
+
+    def lexical(identifier: str) -> float:
+        parts = tokens(identifier)
+        return len(parts & words) / len(parts) if parts else 0.0
+
+    def semantic(identifier: str) -> float:
+        sim = similarity.get(_phrase(identifier), 0.0)
+        return sim if sim >= MIN_SIMILARITY else 0.0
+
+    table_scores: Dict[str, float] = {}
+    column_scores: Dict[str, Dict[str, float]] = {}
+    for table in schema.get("tables", []):
+        per_column = {}
+        for column in columns.get(table, []):
+            name = _column_name(column)
+            per_column[name] = lexical(name) + semantic(name)
+        column_scores[table] = per_column
+        best_column = max(per_column.values(), default=0.0)
+        # A table named in the question outweighs one that merely has a matching column
+        table_scores[table] = 2 * (lexical(table) + semantic(table)) + best_column
+    return table_scores, column_scores
+
+
+def _key_columns(schema: Dict[str, Any], table: str) -> Set[str]:
+    keys = set(schema.get("primary_keys", {}).get(table, []))
+    for fk in schema.get("foreign_keys", []):
+        if fk["from_table"] == table:
+            keys.add(fk["from_column"])
+        if fk["to_table"] == table:
+            keys.add(fk["to_column"])
+    return keys
+
+
+def _table_columns(schema: Dict[str, Any], table: str, column_scores: Dict[str, float]) -> List[str]:
+    """Keys and question-relevant columns first, then the rest in table order, capped per table."""
+    names = [_column_name(c) for c in schema.get("columns", {}).get(table, [])]
+    keys = _key_columns(schema, table)
+    limit = settings.SCHEMA_PROMPT_MAX_COLUMNS
+    if len(names) <= limit:
+        return names
+    keep = {n for n in names if n in keys}
+    keep |= {n for n in sorted(names, key=lambda n: -column_scores.get(n, 0.0)) if column_scores.get(n, 0.0) > 0}
+    for n in names:
+        if len(keep) >= limit:
+            break
+        keep.add(n)
+    return [n for n in names if n in keep]
+
+
+def _cost(table: str, cols: List[str]) -> int:
+    return (len(table) + sum(len(c) + 2 for c in cols) + 8) // CHARS_PER_TOKEN + 1
+
+
+def select_schema(question: str, schema: Dict[str, Any], token_budget: Optional[int] = None,
+                  top_k: Optional[int] = None) -> SchemaSelection:
+    """Most relevant tables and columns for question within the prompt token budget."""
+    budget = token_budget or settings.SCHEMA_PROMPT_TOKEN_BUDGET
+    top_k = top_k or settings.SCHEMA_PROMPT_TOP_K
+    tables = schema.get("tables", [])
+    table_scores, column_scores = _score(question, schema)
+    # Stable sort keeps catalog order among equally (un)matched tables
+    ranked = sorted(tables, key=lambda t: -table_scores[t])
+    if any(table_scores[t] > 0 for t in tables):
+        ranked = [t for t in ranked if table_scores[t] > 0]
+
+    chosen: List[str] = []
+    columns: Dict[str, List[str]] = {}
+    used = 0
+    for table in ranked:
+        if len(chosen) >= top_k:
+            break
+        cols = _table_columns(schema, table, column_scores[table])
+        cost = _cost(table, cols)
+        if chosen and used + cost > budget:
+            continue
+        chosen.append(table)
+        columns[table] = cols
+        used += cost
+
+    # Tables on the shortest FK paths between the chosen ones, so the model can write the joins
+    join = graph_for(schema).join_path(chosen)
+    bridges: List[str] = []
+    for table in join["intermediate"]:
+        cols = _table_columns(schema, table, column_scores.get(table, {}))
+        cost = _cost(table, cols)
+        if used + cost > budget:
+            continue
+        bridges.append(table)
+        columns[table] = cols
+        used += cost
+    selected = set(chosen) | set(bridges)
+
+    return SchemaSelection(
+        tables=chosen + bridges,
+        columns=columns,
+        foreign_keys=[fk for fk in schema.get("foreign_keys", []) if fk["from_table"] in selected and fk["to_table"] in selected],
+        join_path=[e for e in join["edges"] if e["from_table"] in selected and e["to_table"] in selected],
+        scores={t: round(table_scores[t], 3) for t in chosen},
+        bridges=bridges,
+        pruned=len(selected) < len(tables),
+    )
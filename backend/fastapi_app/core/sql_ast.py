@@ -0,0 +1,441 @@
+"""
+SQL AST helpers
+Cached sqlglot parsing plus the facts the execution layer needs from a
+statement: a normalized fingerprint, referenced tables, read/write kind,
+the row-cap (LIMIT) rewrite, and literal extraction into bind parameters.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+import hashlib
+import re
+import threading
+from sqlglot import parse_one, exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.tokens import TokenType
+from .metrics import stage
+
+
+def _exp_types(*names: str) -> tuple:
+    # Expression class names differ across sqlglot releases (Truncate/TruncateTable, Alter/AlterTable)
+    return tuple(getattr(exp, n) for n in names if hasattr(exp, n))
+
+
+READ_TYPES = _exp_types("Select", "Union", "Intersect", "Except")
+DDL_TYPES = _exp_types("Drop", "Truncate", "TruncateTable", "Alter", "AlterTable")
+# Command covers statements sqlglot does not model (CALL, SET, ...); treat them as writes
+WRITE_TYPES = _exp_types("Insert", "Update", "Delete", "Merge", "Command", "Create") + DDL_TYPES
+
+# Functions whose result changes between executions; such queries are never cached
+VOLATILE_FUNCTIONS = {
+    "now", "sysdate", "curdate", "curtime", "current_date", "current_time",
+    "current_timestamp", "localtime", "localtimestamp", "unix_timestamp",
+    "utc_date", "utc_time", "utc_timestamp", "rand", "uuid", "uuid_short",
+    "connection_id", "last_insert_id", "found_rows", "row_count", "sleep",
+}
+
+# Literals are only lifted out of filter/join conditions; these contexts need constants
+_PARAM_SCOPES = _exp_types("Where", "Having", "Join")
+_CONSTANT_CONTEXTS = _exp_types("DataType", "DataTypeParam", "Limit", "Offset", "Interval", "JSONExtract", "JSONExtractScalar", "JSONPath")
+AUTO_PARAM_PREFIX = "_p"
+
+
+def strip_statement(query: str) -> str:
+    """Canonical text used as the parse-cache key by both validator and executor."""
+    return query.strip().rstrip(";").strip()
+
+
+@lru_cache(maxsize=1024)
+def parse_sql(query: str, dialect: str = "mysql") -> Optional[exp.Expression]:
+    """
+    Parse a statement once and memoize the tree. Returns None when sqlglot
+    cannot parse it. The returned tree is shared: copy() before mutating.
+    """
+    try:
+        # Only cache misses reach this point, so "parse" is real sqlglot time
+        with stage("parse"):
+            return parse_one(query, read=dialect)
+    except Exception:
+        return None
+
+
+def fingerprint(query: str, dialect: str = "mysql") -> str:
+    """
+    Normalized statement text (keyword case, whitespace and quoting are
+    canonicalized by sqlglot). Falls back to whitespace-collapsed text when
+    the statement does not parse.
+    """
+    tree = parse_sql(query, dialect)
+    if tree is None:
+        return re.sub(r"\s+", " ", query.strip().rstrip(";"))
+    return tree.sql(dialect=dialect)
+
+
+def fingerprint_key(*parts: str) -> str:
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def referenced_tables(tree: exp.Expression) -> FrozenSet[str]:
+    """Lower-cased names of real tables in a statement (CTE names excluded)."""
+    ctes = {c.alias_or_name.lower() for c in tree.find_all(exp.CTE)}
+    return frozenset(t.name.lower() for t in tree.find_all(exp.Table) if t.name and t.name.lower() not in ctes)
+
+
+def is_read_only(tree: exp.Expression) -> bool:
+    return isinstance(tree, READ_TYPES) and not any(isinstance(n, WRITE_TYPES) for n in tree.walk())
+
+
+def is_write(tree: exp.Expression) -> bool:
+    return isinstance(tree, WRITE_TYPES)
+
+
+def is_deterministic(tree: exp.Expression) -> bool:
+    for fn in tree.find_all(exp.Func):
+        name = fn.name if isinstance(fn, exp.Anonymous) else fn.sql_name()
+        if name and name.lower() in VOLATILE_FUNCTIONS:
+            return False
+    return True
+
+
+def outermost_select(tree: exp.Expression) -> Optional[Tuple[exp.Select, int]]:
+    """(query block that names the result columns and takes statement-level hints, parentheses around it): a set operation's leftmost branch."""
+    node, depth = tree, 0
+    while node is not None and not isinstance(node, exp.Select):
+        if isinstance(node, (exp.Subquery, exp.Paren)):
+            depth += 1
+        node = node.this if isinstance(node.this, exp.Expression) else None
+    return (node, depth) if node is not None else None
+
+
+def after_with(tokens: list) -> int:
+    """Index of the first token after a leading WITH clause (CTE bodies are parenthesised)."""
+    depth = 0
+    for i, token in enumerate(tokens):
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+        elif token.token_type == TokenType.R_PAREN:
+            depth -= 1
+            nxt = tokens[i + 1].token_type if i + 1 < len(tokens) else None
+            # c(x, y) AS (...) closes twice per CTE; a comma starts the next one
+            if depth == 0 and nxt not in (TokenType.COMMA, TokenType.ALIAS):
+                return i + 1
+    return len(tokens)
+
+
+# Tokens that end a SELECT list at its own nesting level
+_PROJECTION_END = {
+    TokenType.FROM, TokenType.INTO, TokenType.WHERE, TokenType.GROUP_BY, TokenType.HAVING, TokenType.ORDER_BY,
+    TokenType.LIMIT, TokenType.UNION, TokenType.EXCEPT, TokenType.INTERSECT, TokenType.WINDOW, TokenType.FOR,
+    TokenType.LOCK, TokenType.SEMICOLON,
+}
+
+
+@lru_cache(maxsize=1024)
+def projection_text(query: str, dialect: str = "mysql") -> str:
+    """
+    Verbatim SELECT list of the block that names a read statement's result
+    columns. The database labels unaliased expressions with their source
+    text, so statements with the same fingerprint can still differ in
+    column names (count(*) vs COUNT(*)). Unparseable statements return
+    their whole text.
+    """
+    tree = parse_sql(query, dialect)
+    if tree is None:
+        return query.strip()
+    located = outermost_select(tree) if isinstance(tree, READ_TYPES) else None
+    if located is None:
+        return ""
+    try:
+        tokens = Dialect.get_or_raise(dialect).tokenize(query)
+    except Exception:
+        return query.strip()
+    start, depth = (after_with(tokens) if tree.args.get("with") else 0), located[1]
+    level = 0
+    begin = None
+    for i, token in enumerate(tokens):
+        if begin is None:
+            if i >= start and level == depth and token.token_type == TokenType.SELECT:
+                begin = token.end + 1
+        elif level < depth or (level == depth and token.token_type in _PROJECTION_END):
+            return query[begin:token.start].strip()
+        if token.token_type == TokenType.L_PAREN:
+            level += 1
+        elif token.token_type == TokenType.R_PAREN:
+            level -= 1
+    return query[begin:].strip() if begin is not None else query.strip()
+
+
+def _limit_value(limit: exp.Expression) -> Optional[int]:
+    value = limit.args.get("expression")
+    if isinstance(value, exp.Literal) and not value.is_string:
+        try:
+            return int(value.this)
+        except ValueError:
+            return None
+    return None
+
+
+def _outer_tokens(tokens: list) -> list:
+    """Tokens of the outermost query block (parenthesised subqueries skipped), with source offsets."""
+    depth = 0
+    out = []
+    for token in tokens:
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+        elif token.token_type == TokenType.R_PAREN:
+            depth -= 1
+        elif depth == 0:
+            out.append(token)
+    return out
+
+
+_LITERALS = (TokenType.NUMBER, TokenType.STRING)
+
+
+def _split_trailing(statement: str, tokens: list) -> Tuple[str, str, list]:
+    """
+    (code, trailing comments, tokens) of a statement: code ends at the last
+    token, so text spliced onto it cannot land inside a trailing -- or #
+    comment. Trailing semicolons are dropped; the comments are kept.
+    """
+    while tokens and tokens[-1].token_type == TokenType.SEMICOLON:
+        last = tokens.pop()
+        statement = statement[:last.start] + statement[last.end + 1:]
+    if not tokens:
+        return statement, "", tokens
+    end = tokens[-1].end + 1
+    trailing = statement[end:].strip()
+    return statement[:end], f" {trailing}" if trailing else "", tokens
+
+
+def _shape_key(tokens: list, cap: int, dialect: str) -> str:
+    """
+    Fingerprint of a statement's token stream with literals masked, except
+    the numbers of the outer LIMIT clause (they decide whether the cap
+    applies). Statements differing only in filter constants share a key.
+    """
+    depth = 0
+    in_limit = False
+    parts = [dialect, str(cap)]
+    for token in tokens:
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+        elif token.token_type == TokenType.R_PAREN:
+            depth -= 1
+        elif depth == 0 and token.token_type == TokenType.LIMIT:
+            in_limit = True
+        masked = token.token_type in _LITERALS and not (in_limit and depth == 0)
+        parts.append(f"{token.token_type.name}:{'?' if masked else token.text.lower()}")
+    return fingerprint_key(*parts)
+
+
+# Rewrite kinds, decided once per statement shape
+_KEEP, _APPEND, _BEFORE_LOCK, _CLAMP, _WRAP = "keep", "append", "before_lock", "clamp", "wrap"
+
+_cap_plans: "OrderedDict[str, str]" = OrderedDict()
+_cap_plans_lock = threading.Lock()
+CAP_PLAN_CACHE_SIZE = 1024
+
+
+def _limit_count_token(outer: list) -> Optional[Any]:
+    positions = [i for i, t in enumerate(outer) if t.token_type == TokenType.LIMIT]
+    if not positions:
+        return None
+    i = positions[-1]
+    # LIMIT count | LIMIT offset, count | LIMIT count OFFSET offset
+    if i + 3 < len(outer) and outer[i + 2].token_type == TokenType.COMMA:
+        count = outer[i + 3]
+    elif i + 1 < len(outer):
+        count = outer[i + 1]
+    else:
+        return None
+    return count if count.token_type == TokenType.NUMBER else None
+
+
+def _cap_plan(statement: str, outer: list, cap: int, dialect: str) -> str:
+    tree = parse_sql(statement, dialect)
+    if tree is None:
+        # MySQL-only syntax sqlglot cannot parse (SQL_CALC_FOUND_ROWS, STRAIGHT_JOIN, ...): decide from
+        # the outer tokens. Wrapping as a derived table would fail on duplicate output names (a.id, b.id).
+        if not outer or outer[0].token_type != TokenType.SELECT:
+            return _KEEP
+        if not any(t.token_type == TokenType.LIMIT for t in outer):
+            return _BEFORE_LOCK if any(t.token_type in (TokenType.LOCK, TokenType.FOR) for t in outer) else _APPEND
+        count = _limit_count_token(outer)
+        if count is None or not count.text.isdigit():
+            return _WRAP
+        return _KEEP if int(count.text) <= cap else _CLAMP
+    if not isinstance(tree, READ_TYPES):
+        return _KEEP
+    limit = tree.args.get("limit")
+    if limit is None:
+        # LIMIT goes before a trailing locking clause (FOR UPDATE / FOR SHARE / LOCK IN SHARE MODE)
+        if any(t.token_type in (TokenType.LOCK, TokenType.FOR) for t in outer):
+            return _BEFORE_LOCK
+        return _APPEND
+    current = _limit_value(limit)
+    if current is not None and current <= cap:
+        return _KEEP
+    if current is not None and _limit_count_token(outer) is not None:
+        return _CLAMP
+    # Placeholder or expression: the bound is unknown until execution, so cap the outer result
+    return _WRAP
+
+
+def _apply_cap_plan(plan: str, statement: str, outer: list, cap: int) -> str:
+    if plan == _APPEND:
+        return f"{statement} LIMIT {cap}"
+    if plan == _BEFORE_LOCK:
+        lock = next(t for t in outer if t.token_type in (TokenType.LOCK, TokenType.FOR))
+        return f"{statement[:lock.start].rstrip()} LIMIT {cap} {statement[lock.start:]}"
+    if plan == _CLAMP:
+        count = _limit_count_token(outer)
+        return f"{statement[:count.start]}{cap}{statement[count.end + 1:]}"
+    if plan == _WRAP:
+        return f"SELECT * FROM ({statement}) AS _capped LIMIT {cap}"
+    return statement
+
+
+def enforce_limit(query: str, cap: int, dialect: str = "mysql") -> str:
+    """
+    Bound the rows a read statement can return. Only the outermost query
+    block is considered (LIMITs in subqueries/CTEs don't bound the result):
+    a missing LIMIT is added, one above cap is clamped, and set operations
+    get the LIMIT on the whole UNION. Statements already within the cap are
+    returned unchanged, and only the LIMIT clause of the original text is
+    touched, and the LIMIT goes before any trailing comment. SELECTs
+    sqlglot cannot parse are judged from their outer tokens alone.
+
+    What to do is decided from the AST once per statement shape (literals
+    masked), so variants differing only in constants reuse the decision
+    and skip parsing; only tokenizing runs per call.
+    """
+    statement = query.rstrip().rstrip(";").rstrip()
+    try:
+        tokens = Dialect.get_or_raise(dialect).tokenize(statement)
+    except Exception:
+        return query
+    statement, trailing, tokens = _split_trailing(statement, tokens)
+    if not tokens:
+        return query
+    outer = _outer_tokens(tokens)
+    key = _shape_key(tokens, cap, dialect)
+    with _cap_plans_lock:
+        plan = _cap_plans.get(key)
+        if plan is not None:
+            _cap_plans.move_to_end(key)
+    if plan is None:
+        plan = _cap_plan(statement, outer, cap, dialect)
+        with _cap_plans_lock:
+            _cap_plans[key] = plan
+            while len(_cap_plans) > CAP_PLAN_CACHE_SIZE:
+                _cap_plans.popitem(last=False)
+    if plan == _KEEP:
+        return query
+    return _apply_cap_plan(plan, statement, outer, cap) + trailing
+
+
+def extend_order_by(query: str, expression: str, dialect: str = "mysql") -> str:
+    """
+    Append expression to the outermost ORDER BY, keeping the rest of the
+    text verbatim (it goes before an outer LIMIT or locking clause).
+    Statements without an outer ORDER BY are returned unchanged.
+    """
+    statement = query.rstrip().rstrip(";").rstrip()
+    statement, trailing, tokens = _split_trailing(statement, Dialect.get_or_raise(dialect).tokenize(statement))
+    outer = _outer_tokens(tokens)
+    order = next((i for i, t in enumerate(outer) if t.token_type == TokenType.ORDER_BY), None)
+    if order is None:
+        return query
+    tail = next((t for t in outer[order + 1:] if t.token_type in (TokenType.LIMIT, TokenType.FOR, TokenType.LOCK)), None)
+    if tail is None:
+        return f"{statement}, {expression}{trailing}"
+    return f"{statement[:tail.start].rstrip()}, {expression} {statement[tail.start:]}{trailing}"
+
+
+def exceeds_limit(tree: exp.Expression, cap: int) -> bool:
+    """True when a read statement has no LIMIT or one above cap at the outermost level."""
+    if not isinstance(tree, READ_TYPES):
+        return False
+    limit = tree.args.get("limit")
+    if limit is None:
+        return True
+    value = _limit_value(limit)
+    return value is None or value > cap
+
+
+def outer_limit(tree: exp.Expression) -> Optional[int]:
+    """Literal LIMIT of the outermost query block, or None if absent or not a literal."""
+    limit = tree.args.get("limit")
+    return _limit_value(limit) if limit is not None else None
+
+
+def _literal_value(lit: exp.Literal) -> Any:
+    """Python value for a literal, or None when it cannot be bound without changing its meaning."""
+    if lit.is_string:
+        return lit.this
+    text = lit.this
+    try:
+        if re.fullmatch(r"[0-9]+", text):
+            return int(text)
+        value = float(text)
+    except ValueError:
+        return None
+    # Only bind decimals that survive the round trip through a double
+    return value if Decimal(text) == Decimal(repr(value)) else None
+
+
+@lru_cache(maxsize=1024)
+def _parameterized(query: str, dialect: str) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
+    tree = parse_sql(query, dialect)
+    if tree is None:
+        return query, ()
+    tree = tree.copy()
+    taken = {p.name for p in tree.find_all(exp.Placeholder)}
+    params = []
+    for lit in list(tree.find_all(exp.Literal, bfs=False)):
+        if not lit.find_ancestor(*_PARAM_SCOPES) or lit.find_ancestor(*_CONSTANT_CONTEXTS):
+            continue
+        value = _literal_value(lit)
+        if value is None:
+            continue
+        name = f"{AUTO_PARAM_PREFIX}{len(params)}"
+        while name in taken:
+            name += "_"
+        params.append((name, value))
+        lit.replace(exp.Placeholder(this=name))
+    if not params:
+        return query, ()
+    return tree.sql(dialect=dialect), tuple(params)
+
+
+def parameterize(query: str, dialect: str = "mysql") -> Tuple[str, Dict[str, Any]]:
+    """
+    Lift literals in WHERE/HAVING/JOIN conditions into named placeholders
+    (:_p0, :_p1, ...). Returns the statement template and the extracted
+    values, so queries differing only in constants share one template.
+    LIMIT/OFFSET, type parameters, intervals and JSON paths keep their
+    literals. Unparseable statements are returned unchanged.
+    """
+    template, params = _parameterized(query, dialect)
+    return template, dict(params)
+
+
+@lru_cache(maxsize=1024)
+def positional(template: str, dialect: str = "mysql") -> Tuple[str, Tuple[str, ...]]:
+    """
+    Rewrite :name placeholders to ? for server-side PREPARE. Returns the
+    statement and the parameter name for each ? in order (a name used twice
+    appears twice).
+    """
+    tree = parse_sql(template, dialect)
+    if tree is None:
+        raise ValueError("Cannot prepare a statement that does not parse")
+    tree = tree.copy()
+    names = []
+    for node in list(tree.find_all(exp.Placeholder, bfs=False)):
+        names.append(node.name)
+        node.replace(exp.Placeholder())
+    return tree.sql(dialect=dialect), tuple(names)
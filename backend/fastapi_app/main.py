@@ -1,9 +1,22 @@
 import os
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .routers import nlu, schema, generate, validate, rank, execute, mongodb, history, api_routes
 from .routers import sql_generate, mongo_generate
 from .routers import chatbot
+from .core.engines import dispose_all, dispose_all_async
+from .core.query_log import query_log
+from .core.mongo_clients import close_all as close_mongo_clients
+from .core.pagination import close_all as close_cursors
+from .core.result_handles import close_all as close_result_handles
+from .core.routing import router as replica_router
+from .core.mirror import mirror
+from .core.mongo_inspect import shutdown as stop_mongo_inspect
+from .core.column_stats import column_stats
+from .core.admission import AdmissionRejected
+from .core.schema_catalog import SchemaVersionNotFound
+from .core import metrics
 
 app = FastAPI(title="Talk-with-Database API", version="0.1.0")
 
@@ -17,6 +30,17 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Outermost, so Server-Timing and request latency cover every other middleware
+app.add_middleware(metrics.TimingMiddleware)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(status_code=429, content=exc.detail(), headers={"Retry-After": str(exc.retry_after)})
+
+@app.exception_handler(SchemaVersionNotFound)
+async def schema_version_not_found(request: Request, exc: SchemaVersionNotFound):
+    return JSONResponse(status_code=409, content=exc.detail())
+
 # Include all routers
 app.include_router(nlu.router, prefix="/nlu", tags=["nlu"])
 app.include_router(schema.router, prefix="/schema", tags=["schema"])
@@ -31,6 +55,24 @@ app.include_router(sql_generate.router, prefix="/generate", tags=["generate-mult
 app.include_router(mongo_generate.router, prefix="/generate", tags=["generate-multiple"])  # /generate/mongodb/generate-multiple
 app.include_router(chatbot.router, prefix="/ai", tags=["chatbot"])
 
+@app.on_event("shutdown")
+async def shutdown():
+    query_log.flush()
+    close_cursors()
+    close_result_handles()
+    replica_router.stop()
+    mirror.stop()
+    column_stats.stop()
+    stop_mongo_inspect()
+    close_mongo_clients()
+    dispose_all()
+    await dispose_all_async()
+
 @app.get("/")
 def root():
     return {"message": "FastAPI service is running"}
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Latency histograms, pool/cache/admission state and LLM token counts (Prometheus text format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
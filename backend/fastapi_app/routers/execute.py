@@ -1,17 +1,278 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
-from typing import Dict, Any
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Dict, Any, List, Literal
+from contextlib import AsyncExitStack
+import asyncio
 import os
-from ..core.execution import execute_query
+import threading
+from ..core.execution import execute_query_async, execute_batch_async, stream_query
+from ..core.cancellation import CancelToken, CancelGroup
+from ..core import pagination, routing, result_handles
+from ..core.mirror import mirror
+from ..core.result_format import arrow_response
+from ..core.query_log import query_log
+from ..core.admission import admitted, sql_admission, mongo_admission
+from ..core.metrics import timings
+from ..core.config import settings
+from ..core.json_response import ResultJSONResponse, dumps
 
 router = APIRouter()
 
+DISCONNECT_POLL_SECONDS = 0.5
+
 class ExecuteRequest(BaseModel):
     query: str
     db_type: str = "mysql"
     db_uri: str | None = None
+    result_format: Literal["rows", "columns", "arrow"] = "rows"
+    timeout_ms: int | None = None
+    params: Dict[str, Any] | None = None  # values for :name placeholders in query
+    auto_parameterize: bool = False
+    use_primary: bool = False  # skip read replicas (read-your-writes)
+    materialize: bool = False  # keep the full result server-side and return its first page
+    page_size: int | None = None
+
+class BatchExecuteRequest(BaseModel):
+    # At most as many as the generator produces; each runs on its own connection
+    candidates: List[str] = Field(max_length=max(1, settings.N_CANDIDATES))
+    db_type: str = "mysql"
+    db_uri: str | None = None
+    mode: Literal["all", "first_success"] = "first_success"
+    result_format: Literal["rows", "columns"] = "rows"
+    timeout_ms: int | None = None
+
+class NextPageRequest(BaseModel):
+    cursor: str
+
+class StreamExecuteRequest(BaseModel):
+    query: str
+    db_type: str = "mysql"
+    db_uri: str | None = None
+    format: Literal["ndjson", "json"] = "ndjson"
+    chunk_size: int | None = None
+    timeout_ms: int | None = None
 
 @router.post("/")
-def exec_query(req: ExecuteRequest):
-    result = execute_query(req.query, req.db_type, req.db_uri)
-    return result
+async def exec_query(req: ExecuteRequest, request: Request):
+    token = CancelToken()
+    async with admitted(sql_admission, request):
+        if req.materialize:
+            work = run_in_threadpool(
+                result_handles.materialize, req.query, req.db_type, req.db_uri,
+                result_format="rows" if req.result_format == "rows" else "columns",
+                timeout_ms=req.timeout_ms, cancel_token=token, params=req.params,
+                page_size=req.page_size, use_primary=req.use_primary,
+            )
+        else:
+            work = execute_query_async(
+                req.query, req.db_type, req.db_uri,
+                result_format=req.result_format, timeout_ms=req.timeout_ms, cancel_token=token,
+                params=req.params, auto_parameterize=req.auto_parameterize, use_primary=req.use_primary,
+            )
+        result = await _cancel_on_disconnect(request, token, work)
+    if req.result_format == "arrow" and "data" in result:
+        return _arrow_response(result)
+    result["timings"] = timings()
+    return ResultJSONResponse(result)
+
+@router.post("/batch")
+async def exec_batch(req: BatchExecuteRequest, request: Request):
+    """
+    Execute validated candidates concurrently. first_success returns the first
+    candidate that succeeds (in completion order) and cancels the others.
+    Admitted at batch priority with one slot per candidate (up to the tenant
+    limit); no more candidates run at once than slots were granted.
+    """
+    group = CancelGroup()
+    async with admitted(sql_admission, request, default_priority="batch", weight=len(req.candidates)) as ticket:
+        result = await _cancel_on_disconnect(
+            request,
+            group,
+            execute_batch_async(
+                req.candidates, req.db_type, req.db_uri, mode=req.mode,
+                result_format=req.result_format, timeout_ms=req.timeout_ms, cancel_group=group,
+                max_concurrency=ticket.weight if ticket is not None else None,
+            ),
+        )
+    result["timings"] = timings()
+    return ResultJSONResponse(result)
+
+async def _cancel_on_disconnect(request: Request, token: CancelToken | CancelGroup, coro):
+    """Await coro, killing its statement(s) via token if the HTTP client disconnects first."""
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if not done and await request.is_disconnected():
+            await asyncio.to_thread(token.cancel, "client disconnected")
+            break
+    return await task
+
+def _arrow_response(result: Dict[str, Any]):
+    headers = {"X-Row-Count": str(result.get("row_count", 0))}
+    cache = result.get("cache")
+    if cache:
+        headers["X-Cache"] = "HIT" if cache.get("hit") else "MISS"
+        if cache.get("hit"):
+            headers["Age"] = str(int(cache.get("age_ms", 0) // 1000))
+    return arrow_response(result, headers)
+
+@router.post("/next")
+async def next_page(req: NextPageRequest, request: Request):
+    """Fetch the next page for a next_cursor returned by /execute."""
+    async with admitted(sql_admission, request):
+        result = await run_in_threadpool(pagination.fetch_next, req.cursor)
+    result["timings"] = timings()
+    return ResultJSONResponse(result)
+
+@router.delete("/cursor/{cursor_id}")
+def close_cursor(cursor_id: str):
+    """Release a pagination cursor before its TTL."""
+    return {"closed": pagination.close_cursor(cursor_id)}
+
+@router.get("/results/{handle}")
+def fetch_results(
+    handle: str,
+    offset: int = 0,
+    limit: int | None = None,
+    sort: str | None = None,
+    desc: bool = False,
+    result_format: Literal["rows", "columns", "arrow"] = "rows",
+):
+    """
+    Random-access window of a materialized result (see materialize on /execute).
+    sort re-orders by a result column without re-running the query.
+    """
+    result = result_handles.fetch(
+        handle, offset, limit, sort, desc,
+        result_format="rows" if result_format == "rows" else "columns",
+    )
+    if result_format == "arrow" and "data" in result:
+        return _arrow_response(result)
+    return ResultJSONResponse(result)
+
+@router.delete("/results/{handle}")
+def close_results(handle: str):
+    """Drop a materialized result (and its spill file) before its TTL."""
+    return {"closed": result_handles.close_handle(handle)}
+
+@router.get("/log-stats")
+def log_stats():
+    """Counters for the background query log sink (queue depth, drops, failures)."""
+    return query_log.stats()
+
+@router.get("/admission")
+def admission_stats():
+    """Admission controller state per backend: slots in use, queue depth, rejections."""
+    return {"sql": sql_admission.stats(), "mongodb": mongo_admission.stats()}
+
+@router.get("/replicas")
+def replica_status():
+    """Read-replica routing state: health, replication lag, in-flight statements."""
+    return routing.router.stats()
+
+@router.get("/mirror")
+def mirror_status():
+    """Analytic mirror state: engine, snapshot age and row count per table, routing counters."""
+    return mirror.stats()
+
+def _dumps(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+class _SerializedChunks:
+    """
+    stream_query chunks whose close() waits for a next() still running in a
+    worker thread (closing a generator mid-next raises and leaks its cursor).
+    """
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._lock:
+            if self._closed:
+                raise StopIteration
+            return next(self._chunks)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._chunks.close()
+
+@router.post("/stream")
+async def exec_query_stream(req: StreamExecuteRequest, request: Request):
+    """
+    Execute a query and stream rows as they are read from a server-side cursor.
+    ndjson: one JSON object per row per line.
+    json: a single {"columns", "rows", "row_count"} document sent in chunks.
+    The admission slot is held until the stream finishes; the statement is
+    killed at its deadline or when the client disconnects. The slot and the
+    cursor are released when the body ends and again, idempotently, by the
+    response's background task, which also runs when the client leaves
+    before the body starts.
+    """
+    slot = AsyncExitStack()
+    await slot.enter_async_context(admitted(sql_admission, request))
+    token = CancelToken()
+    chunks = _SerializedChunks(
+        stream_query(req.query, req.db_type, req.db_uri, req.chunk_size, timeout_ms=req.timeout_ms, cancel_token=token)
+    )
+    try:
+        # Run until the first item so setup/query errors return a normal JSON error
+        head = await run_in_threadpool(next, chunks)
+    except StopIteration:
+        head = {"columns": []}
+    except Exception as e:
+        await slot.aclose()
+        return {"error": str(e)}
+
+    async def release():
+        # Kills the statement if it is still running (a no-op once the stream ended), so a
+        # next() in flight returns; closing then releases the server-side cursor and connection
+        await run_in_threadpool(token.cancel, "stream closed")
+        await run_in_threadpool(chunks.close)
+        await slot.aclose()
+
+    if "error" in head:
+        await release()
+        return head
+
+    async def body():
+        row_count = 0
+        first = True
+        if req.format == "json":
+            yield '{"columns": ' + _dumps(head.get("columns", [])) + ', "rows": ['
+        try:
+            async for chunk in iterate_in_threadpool(chunks):
+                if await request.is_disconnected():
+                    await run_in_threadpool(token.cancel, "client disconnected")
+                    break
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                rows = chunk.get("rows", [])
+                row_count += len(rows)
+                if req.format == "ndjson":
+                    yield "".join(_dumps(r) + "\n" for r in rows)
+                elif rows:
+                    yield ("" if first else ", ") + ", ".join(_dumps(r) for r in rows)
+                    first = False
+        except Exception as e:
+            if req.format == "ndjson":
+                yield _dumps({"error": str(e)}) + "\n"
+            else:
+                yield '], "row_count": ' + str(row_count) + ', "error": ' + _dumps(str(e)) + "}"
+            return
+        finally:
+            await release()
+        if req.format == "json":
+            yield '], "row_count": ' + str(head.get("row_count", row_count)) + "}"
+
+    media_type = "application/x-ndjson" if req.format == "ndjson" else "application/json"
+    return StreamingResponse(body(), media_type=media_type, background=BackgroundTask(release))
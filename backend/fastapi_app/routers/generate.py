@@ -4,12 +4,16 @@ from typing import List, Dict, Any
 import os
 import re
 from ..core.generator import get_generator
+from ..core.metrics import stage, timings
+from ..core.schema_catalog import schema_context
+from ..core.schema_selector import SchemaSelection, select_schema
 
 router = APIRouter()
 
 class GenerateRequest(BaseModel):
     text: str
     db_schema: Dict[str, Any] | None = None
+    schema_version: str | None = None  # catalog version from /schema/inspect, instead of db_schema
     db_type: str = "mysql"
     n_candidates: int | None = None
     temperature: float | None = None
@@ -20,6 +24,8 @@ class GenerateResponse(BaseModel):
     candidates: List[str]
     provider: str
     generation_params: Dict[str, Any]
+    schema_tables: List[str] | None = None  # tables the prompt's schema section was pruned to
+    timings: Dict[str, float] | None = None
 
 @router.post("/")
 def generate(req: GenerateRequest):
@@ -47,17 +53,20 @@ def generate(req: GenerateRequest):
     max_tokens = req.max_tokens or safe_int(os.getenv("GENERATOR_MAX_TOKENS", "200"), 200)
     
     gen = get_generator(provider)
-    schema_ctx = req.db_schema or {}
-    prompt = build_prompt(req.text, schema_ctx, req.db_type)
+    schema_ctx = schema_context(req.db_schema, req.schema_version)
+    with stage("prompt"):
+        selection = select_schema(req.text, schema_ctx) if req.db_type == "mysql" else None
+        prompt = build_prompt(req.text, schema_ctx, req.db_type, selection)
     
     # Pass generation parameters
-    candidates = gen.generate(
-        prompt,
-        n=n,
-        temperature=temperature,
-        top_p=top_p,
-        max_tokens=max_tokens
-    )
+    with stage("llm"):
+        candidates = gen.generate(
+            prompt,
+            n=n,
+            temperature=temperature,
+            top_p=top_p,
+            max_tokens=max_tokens
+        )
     
     generation_params = {
         "n_candidates": n,
@@ -69,18 +78,18 @@ def generate(req: GenerateRequest):
     return GenerateResponse(
         candidates=candidates,
         provider=provider,
-        generation_params=generation_params
+        generation_params=generation_params,
+        schema_tables=selection.tables if selection else None,
+        timings=timings()
     )
 
 
-def build_prompt(user_text: str, schema: Dict[str, Any], db_type: str) -> str:
+def build_prompt(user_text: str, schema: Dict[str, Any], db_type: str, selection: SchemaSelection | None = None) -> str:
     schema_desc = []
     if db_type == "mysql":
-        tables = schema.get("tables", [])
-        columns = schema.get("columns", {})
-        for t in tables[:10]:
-            cols = ", ".join([c.get("name") if isinstance(c, dict) else str(c) for c in columns.get(t, [])])
-            schema_desc.append(f"Table {t}({cols})")
+        # Only the tables relevant to the request (plus join bridges), within the token budget
+        selection = selection or select_schema(user_text, schema)
+        schema_desc.append(selection.render())
     elif db_type == "mongodb":
         collections = schema.get("collections", [])
         for c in collections[:10]:
@@ -4,6 +4,7 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime
 import json
 import os
+from ..core.json_response import ResultJSONResponse
 
 router = APIRouter()
 
@@ -61,12 +62,12 @@ def get_history(limit: int = 50, offset: int = 0):
         total = len(history)
         paginated = history[offset:offset + limit]
         
-        return {
+        return ResultJSONResponse({
             "total": total,
             "limit": limit,
             "offset": offset,
             "items": paginated
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Dict, Any, List, Optional, Literal
 import os
-from sqlalchemy import create_engine, text
 from pymongo import MongoClient
 from pymongo.errors import ServerSelectionTimeoutError, ConnectionFailure
+from ..core.schema_catalog import catalog
+from ..core.mongo_clients import get_mongo_client
+from ..core.mongo_schema import field_summary
+from ..core.mongo_inspect import inspect_cluster
+from ..core.admission import admitted, mongo_admission
+from ..core.metrics import stage, timings
+from ..core.json_response import ResultJSONResponse
+from ..core.result_format import documents_to_columnar, arrow_response
 from ..core.mongodb_safety import (
     detect_mongodb_injection,
     validate_mongodb_query,
@@ -22,6 +30,9 @@ router = APIRouter()
 class DatabaseRequest(BaseModel):
     db_type: str
     db_uri: Optional[str] = None
+    # MongoDB: sample each collection to infer field paths, types and indexes
+    infer_fields: bool = True
+    refresh: bool = False
 
 class MongoQueryRequest(BaseModel):
     db_name: str
@@ -29,6 +40,7 @@ class MongoQueryRequest(BaseModel):
     query: Any = {}
     operation: Literal["find","insert","update","delete","count"] = "find"
     document: Optional[Any] = None
+    result_format: Literal["rows", "columns", "arrow"] = "rows"
 
     # Allow extra fields without failing validation
     model_config = {"extra": "ignore"}
@@ -55,107 +67,7 @@ def inspect_schema(req: DatabaseRequest):
         if not db_uri:
             raise HTTPException(status_code=400, detail="DB_URI not set")
         try:
-            engine = create_engine(db_uri)
-            with engine.connect() as conn:
-                current_db = conn.execute(text("SELECT DATABASE()"))
-                dbname = list(current_db)[0][0]
-
-                # Get all tables
-                tables = conn.execute(text(
-                    """
-                    SELECT TABLE_NAME FROM information_schema.tables
-                    WHERE table_schema = :db
-                    ORDER BY TABLE_NAME
-                    """
-                ), {"db": dbname}).fetchall()
-                table_names = [t[0] for t in tables]
-
-                # Get columns with additional details
-                columns: Dict[str, List[Dict[str, Any]]] = {}
-                primary_keys: Dict[str, List[str]] = {}
-                indexes: Dict[str, List[Dict[str, Any]]] = {}
-
-                for t in table_names:
-                    # Get columns
-                    cols = conn.execute(text(
-                        """
-                        SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
-                        FROM information_schema.columns
-                        WHERE table_schema = :db AND table_name = :t
-                        ORDER BY ORDINAL_POSITION
-                        """
-                    ), {"db": dbname, "t": t}).fetchall()
-                    columns[t] = [
-                        {
-                            "name": c[0],
-                            "type": c[1],
-                            "nullable": c[2],
-                            "key": c[3],
-                            "default": c[4],
-                            "extra": c[5]
-                        } for c in cols
-                    ]
-
-                    # Get primary keys
-                    pk_cols = [c[0] for c in cols if c[3] == "PRI"]
-                    if pk_cols:
-                        primary_keys[t] = pk_cols
-
-                    # Get indexes
-                    idx_result = conn.execute(text(
-                        """
-                        SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE
-                        FROM information_schema.statistics
-                        WHERE table_schema = :db AND table_name = :t
-                        ORDER BY INDEX_NAME, SEQ_IN_INDEX
-                        """
-                    ), {"db": dbname, "t": t}).fetchall()
-
-                    idx_dict = {}
-                    for idx_name, col_name, non_unique in idx_result:
-                        if idx_name not in idx_dict:
-                            idx_dict[idx_name] = {
-                                "name": idx_name,
-                                "columns": [],
-                                "unique": non_unique == 0
-                            }
-                        idx_dict[idx_name]["columns"].append(col_name)
-                    indexes[t] = list(idx_dict.values())
-
-                # Get foreign key relationships
-                fk_result = conn.execute(text(
-                    """
-                    SELECT
-                        TABLE_NAME,
-                        COLUMN_NAME,
-                        REFERENCED_TABLE_NAME,
-                        REFERENCED_COLUMN_NAME,
-                        CONSTRAINT_NAME
-                    FROM information_schema.KEY_COLUMN_USAGE
-                    WHERE table_schema = :db
-                        AND REFERENCED_TABLE_NAME IS NOT NULL
-                    ORDER BY TABLE_NAME, CONSTRAINT_NAME
-                    """
-                ), {"db": dbname}).fetchall()
-
-                foreign_keys = []
-                for fk in fk_result:
-                    foreign_keys.append({
-                        "from_table": fk[0],
-                        "from_column": fk[1],
-                        "to_table": fk[2],
-                        "to_column": fk[3],
-                        "constraint_name": fk[4]
-                    })
-
-            return {
-                "db": dbname,
-                "tables": table_names,
-                "columns": columns,
-                "primary_keys": primary_keys,
-                "indexes": indexes,
-                "foreign_keys": foreign_keys
-            }
+            return catalog.get(db_uri).document()
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"MySQL connection error: {str(e)}")
 
@@ -164,31 +76,12 @@ def inspect_schema(req: DatabaseRequest):
             raise HTTPException(status_code=400, detail="MONGO_URI not set")
 
         try:
-            client = MongoClient(db_uri, serverSelectionTimeoutMS=5000)
-            # Test connection
-            client.admin.command('ping')
-
-            # Get database names
-            db_names = client.list_database_names()
-
-            # Get collections for each database
-            collections: Dict[str, List[str]] = {}
-            for db_name in db_names:
-                if db_name not in ['admin', 'local', 'config']:  # Skip system databases
-                    db = client[db_name]
-                    collections[db_name] = db.list_collection_names()
-
-            return {
-                "databases": db_names,
-                "collections": collections
-            }
+            # Shared client; listing and sampling fan out over the inspection pool
+            return inspect_cluster(get_mongo_client(db_uri), db_uri, req.infer_fields, req.refresh)
         except (ServerSelectionTimeoutError, ConnectionFailure) as e:
             raise HTTPException(status_code=500, detail=f"MongoDB connection error: {str(e)}")
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"MongoDB error: {str(e)}")
-        finally:
-            if 'client' in locals():
-                client.close()
 
     else:
         raise HTTPException(status_code=400, detail=f"Unsupported db_type: {db_type}")
@@ -267,7 +160,8 @@ def mongodb_nlu_parse(req: MongoNLURequest):
         "confidence": operation_result["confidence"],
         "method": operation_result["method"],
         "entities": entities,
-        "all_scores": operation_result.get("all_scores", {})
+        "all_scores": operation_result.get("all_scores", {}),
+        "timings": timings()
     }
 
 @router.post("/generate")
@@ -294,10 +188,12 @@ def mongodb_generate_queries(req: MongoGenerateRequest):
             collections_info = ""
             if schema_ctx and "collections" in schema_ctx:
                 collections_info = "\nAvailable collections:\n"
+                inferred = schema_ctx.get("schemas") or {}
                 for db_name, collections in schema_ctx["collections"].items():
                     collections_info += f"  Database: {db_name}\n"
                     for col in collections:
-                        collections_info += f"    - {col}\n"
+                        fields = field_summary(inferred.get(db_name, {}).get(col, {}))
+                        collections_info += f"    - {col}" + (f" {{{fields}}}" if fields else "") + "\n"
             
             prompt = f"""Convert this natural language request into MongoDB query syntax.
 
@@ -315,13 +211,14 @@ Generate {req.n_candidates or 3} different valid MongoDB query variations.
 Return only the MongoDB queries, one per line, no explanations."""
 
             # Generate with Mixtral
-            result = gen.generate(
-                prompt=prompt,
-                n_candidates=req.n_candidates or 3,
-                temperature=req.temperature or 0.3,
-                top_p=req.top_p or 0.95,
-                max_tokens=req.max_tokens or 300
-            )
+            with stage("llm"):
+                result = gen.generate(
+                    prompt=prompt,
+                    n_candidates=req.n_candidates or 3,
+                    temperature=req.temperature or 0.3,
+                    top_p=req.top_p or 0.95,
+                    max_tokens=req.max_tokens or 300
+                )
             
             # Extract candidates
             candidates = result.get("candidates", [])
@@ -340,7 +237,8 @@ Return only the MongoDB queries, one per line, no explanations."""
                 return {
                     "candidates": cleaned_queries,
                     "count": len(cleaned_queries),
-                    "provider": "mixtral"
+                    "provider": "mixtral",
+                    "timings": timings()
                 }
     
     except Exception as e:
@@ -360,7 +258,8 @@ Return only the MongoDB queries, one per line, no explanations."""
         "candidates": query_strings,
         "candidates_dict": variants,
         "count": len(variants),
-        "provider": "mongodb_nlu_fallback"
+        "provider": "mongodb_nlu_fallback",
+        "timings": timings()
     }
 
 @router.post("/validate")
@@ -368,25 +267,28 @@ def mongodb_validate_query(req: MongoValidateRequest):
     """
     Validate MongoDB query for injection attacks and dangerous operations.
     """
-    # Detect injection
-    injection_result = detect_mongodb_injection(req.query)
-    
-    # Validate query
-    validation_result = validate_mongodb_query(req.query, req.operation)
+    with stage("validate"):
+        # Detect injection
+        injection_result = detect_mongodb_injection(req.query)
+
+        # Validate query
+        validation_result = validate_mongodb_query(req.query, req.operation)
     
     return {
         "injection_detected": injection_result["detected"],
         "injection_threats": injection_result["threats"],
         "injection_severity": injection_result["severity"],
         "validation": validation_result,
-        "safe": not validation_result["blocked"]
+        "safe": not validation_result["blocked"],
+        "timings": timings()
     }
 
 @router.post("/execute")
-def mongodb_execute_query(req: MongoQueryRequest):
+async def mongodb_execute_query(req: MongoQueryRequest, request: Request):
     """
     Execute MongoDB query with safety validation.
-    Similar to SQL execute but for MongoDB.
+    Similar to SQL execute but for MongoDB. Runs behind the Mongo admission
+    controller; the driver call itself happens in the threadpool.
     """
     mongo_uri = os.getenv("MONGO_URI")
     if not mongo_uri:
@@ -442,8 +344,17 @@ def mongodb_execute_query(req: MongoQueryRequest):
             }
         )
     
+    async with admitted(mongo_admission, request):
+        with stage("mongo"):
+            results = await run_in_threadpool(_execute_mongo_operation, req, mongo_uri)
+    if isinstance(results, dict):
+        results["timings"] = timings()
+        return ResultJSONResponse(results)
+    return results
+
+def _execute_mongo_operation(req: MongoQueryRequest, mongo_uri: str):
     try:
-        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        client = get_mongo_client(mongo_uri)
         db = client[req.db_name]
         collection = db[req.collection_name]
         
@@ -455,14 +366,18 @@ def mongodb_execute_query(req: MongoQueryRequest):
         }
         
         if req.operation == "find":
+            # ObjectId and other BSON values are encoded by ResultJSONResponse
             docs = list(collection.find(req.query).limit(100))
-            # Convert ObjectId to string
-            for doc in docs:
-                if '_id' in doc:
-                    doc['_id'] = str(doc['_id'])
             results["success"] = True
             results["count"] = len(docs)
-            results["documents"] = docs
+            if req.result_format == "rows":
+                results["documents"] = docs
+            else:
+                columnar = documents_to_columnar(docs)
+                if req.result_format == "arrow":
+                    return arrow_response(columnar, {"X-Row-Count": str(len(docs))})
+                results.update(columnar)
+                results["format"] = "columns"
             
         elif req.operation == "insert":
             if not req.document:
@@ -494,8 +409,7 @@ def mongodb_execute_query(req: MongoQueryRequest):
         
         return results
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"MongoDB execution error: {str(e)}")
-    finally:
-        if 'client' in locals():
-            client.close()
@@ -2,12 +2,15 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from ..core.intent_classifier import classify_intent, extract_sql_entities
+from ..core.schema_catalog import schema_context
+from ..core.column_stats import stats_for
 
 router = APIRouter()
 
 class NLURequest(BaseModel):
     text: str
     db_schema: Optional[Dict[str, Any]] = None
+    schema_version: Optional[str] = None
     use_transformer: bool = True
 
 class NLUResponse(BaseModel):
@@ -83,7 +86,8 @@ def parse(req: NLURequest):
     intent_result = classify_intent(req.text, use_transformer=req.use_transformer)
     
     # 2. Named Entity Recognition (SQL entities)
-    entities = extract_sql_entities(req.text, req.db_schema)
+    schema = schema_context(req.db_schema, req.schema_version)
+    entities = extract_sql_entities(req.text, schema or None, stats_for(schema, req.schema_version))
     
     # 3. Dependency Parsing
     dependencies = extract_dependencies(req.text)
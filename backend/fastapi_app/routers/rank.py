@@ -2,6 +2,9 @@ from fastapi import APIRouter
 from pydantic import BaseModel
 from typing import List, Dict, Any
 from ..core.ranking import rank_candidates
+from ..core.metrics import stage, timings
+from ..core.schema_catalog import schema_context
+from ..core.column_stats import stats_for
 
 router = APIRouter()
 
@@ -9,9 +12,12 @@ class RankRequest(BaseModel):
     text: str
     candidates: List[str]
     db_schema: Dict[str, Any] | None = None
+    schema_version: str | None = None
     db_type: str = "mysql"
 
 @router.post("/")
 def rank(req: RankRequest):
-    ranked = rank_candidates(req.text, req.candidates, req.db_schema or {}, req.db_type)
-    return {"ranked": ranked}
+    with stage("rank"):
+        schema = schema_context(req.db_schema, req.schema_version)
+        ranked = rank_candidates(req.text, req.candidates, schema, req.db_type, stats_for(schema, req.schema_version))
+    return {"ranked": ranked, "timings": timings()}
@@ -1,130 +1,118 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, Response
 from pydantic import BaseModel
 from typing import Dict, Any, List
 import os
-from sqlalchemy import create_engine, text
-from pymongo import MongoClient
+from ..core.schema_catalog import catalog, etag, etag_matches
+from ..core.mongo_clients import get_mongo_client
+from ..core.mongo_inspect import infer_collections
+from ..core.join_graph import graph_for
+from ..core.column_stats import column_stats
+from ..core.config import settings
 
 router = APIRouter()
 
 class SchemaRequest(BaseModel):
     db_type: str | None = None
     db_uri: str | None = None
+    infer_fields: bool = True
+    refresh: bool = False
+
+class JoinPathRequest(BaseModel):
+    tables: List[str]
+    schema_version: str | None = None  # default: current catalog version of db_uri / DB_URI
+    db_uri: str | None = None
+
+def _schema_document(db_uri: str, response: Response, if_none_match: str | None, refresh: bool = False):
+    entry = catalog.get(db_uri, refresh=refresh)
+    column_stats.request(db_uri)
+    headers = {"ETag": etag(entry.version), "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, entry.version):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return entry.document()
+
+@router.get("/inspect")
+def inspect_schema_conditional(
+    response: Response,
+    schema_version: str | None = None,
+    refresh: bool = False,
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    MySQL schema from the catalog cache with an ETag of its schema_version,
+    for the database behind schema_version (default: DB_URI). Connection
+    strings are only accepted in the POST body, which honours If-None-Match too.
+    If-None-Match with the current version returns 304 without a body.
+    """
+    if schema_version:
+        db_uri = catalog.resolve(schema_version).uri
+    else:
+        if os.getenv("DB_TYPE", "mysql") != "mysql":
+            return inspect_schema(SchemaRequest(refresh=refresh), response, if_none_match)
+        db_uri = os.getenv("DB_URI")
+        if not db_uri:
+            return {"error": "DB_URI not set"}
+    return _schema_document(db_uri, response, if_none_match, refresh)
 
 @router.post("/inspect")
-def inspect_schema(req: SchemaRequest):
+def inspect_schema(req: SchemaRequest, response: Response, if_none_match: str | None = Header(default=None)):
     db_type = req.db_type or os.getenv("DB_TYPE", "mysql")
     db_uri = req.db_uri or os.getenv("DB_URI")
     if db_type == "mysql":
         if not db_uri:
             return {"error": "DB_URI not set"}
-        engine = create_engine(db_uri)
-        with engine.connect() as conn:
-            current_db = conn.execute(text("SELECT DATABASE()"))
-            dbname = list(current_db)[0][0]
-            
-            # Get all tables
-            tables = conn.execute(text(
-                """
-                SELECT TABLE_NAME FROM information_schema.tables
-                WHERE table_schema = :db
-                ORDER BY TABLE_NAME
-                """
-            ), {"db": dbname}).fetchall()
-            table_names = [t[0] for t in tables]
-            
-            # Get columns with additional details
-            columns: Dict[str, List[Dict[str, Any]]] = {}
-            primary_keys: Dict[str, List[str]] = {}
-            indexes: Dict[str, List[Dict[str, Any]]] = {}
-            
-            for t in table_names:
-                # Get columns
-                cols = conn.execute(text(
-                    """
-                    SELECT COLUMN_NAME, DATA_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA
-                    FROM information_schema.columns
-                    WHERE table_schema = :db AND table_name = :t
-                    ORDER BY ORDINAL_POSITION
-                    """
-                ), {"db": dbname, "t": t}).fetchall()
-                columns[t] = [
-                    {
-                        "name": c[0], 
-                        "type": c[1], 
-                        "nullable": c[2],
-                        "key": c[3],
-                        "default": c[4],
-                        "extra": c[5]
-                    } for c in cols
-                ]
-                
-                # Get primary keys
-                pk_cols = [c[0] for c in cols if c[3] == "PRI"]
-                if pk_cols:
-                    primary_keys[t] = pk_cols
-                
-                # Get indexes
-                idx_result = conn.execute(text(
-                    """
-                    SELECT INDEX_NAME, COLUMN_NAME, NON_UNIQUE
-                    FROM information_schema.statistics
-                    WHERE table_schema = :db AND table_name = :t
-                    ORDER BY INDEX_NAME, SEQ_IN_INDEX
-                    """
-                ), {"db": dbname, "t": t}).fetchall()
-                
-                idx_dict = {}
-                for idx_name, col_name, non_unique in idx_result:
-                    if idx_name not in idx_dict:
-                        idx_dict[idx_name] = {
-                            "name": idx_name,
-                            "columns": [],
-                            "unique": non_unique == 0
-                        }
-                    idx_dict[idx_name]["columns"].append(col_name)
-                indexes[t] = list(idx_dict.values())
-            
-            # Get foreign key relationships
-            fk_result = conn.execute(text(
-                """
-                SELECT 
-                    TABLE_NAME,
-                    COLUMN_NAME,
-                    REFERENCED_TABLE_NAME,
-                    REFERENCED_COLUMN_NAME,
-                    CONSTRAINT_NAME
-                FROM information_schema.KEY_COLUMN_USAGE
-                WHERE table_schema = :db 
-                    AND REFERENCED_TABLE_NAME IS NOT NULL
-                ORDER BY TABLE_NAME, CONSTRAINT_NAME
-                """
-            ), {"db": dbname}).fetchall()
-            
-            foreign_keys = []
-            for fk in fk_result:
-                foreign_keys.append({
-                    "from_table": fk[0],
-                    "from_column": fk[1],
-                    "to_table": fk[2],
-                    "to_column": fk[3],
-                    "constraint_name": fk[4]
-                })
-        
-        return {
-            "db": dbname, 
-            "tables": table_names, 
-            "columns": columns,
-            "primary_keys": primary_keys,
-            "indexes": indexes,
-            "foreign_keys": foreign_keys
-        }
+        return _schema_document(db_uri, response, if_none_match)
     elif db_type == "mongodb":
         mongo_uri = db_uri or os.getenv("MONGO_URI")
-        client = MongoClient(mongo_uri)
-        dbname = client.get_default_database().name if client.get_default_database() else "default"
-        db = client[dbname]
-        collections = db.list_collection_names()
-        return {"db": dbname, "collections": collections}
+        client = get_mongo_client(mongo_uri)
+        dbname = client.get_default_database(default="default").name
+        collections = client[dbname].list_collection_names()
+        result = {"db": dbname, "collections": collections}
+        if req.infer_fields:
+            errors: Dict[str, str] = {}
+            targets = [(dbname, name) for name in collections]
+            result["schemas"] = infer_collections(client, mongo_uri, targets, req.refresh, errors=errors)
+            if errors:
+                result["errors"] = errors
+        return result
     else:
         return {"error": f"Unsupported db_type: {db_type}"}
+
+@router.post("/join-path")
+def join_path(req: JoinPathRequest):
+    """FK join path connecting the given tables (shortest paths from the schema's join graph)."""
+    if req.schema_version:
+        entry = catalog.resolve(req.schema_version)
+    else:
+        db_uri = req.db_uri or os.getenv("DB_URI")
+        if not db_uri:
+            return {"error": "DB_URI not set"}
+        entry = catalog.get(db_uri)
+    graph = graph_for(entry.schema)
+    return {**graph.join_path(req.tables), "schema_version": entry.version, "graph": graph.stats()}
+
+@router.get("/stats")
+def column_statistics(schema_version: str | None = None, table: str | None = None, refresh: bool = False):
+    """
+    Column statistics (rows, distinct, null fraction, min/max, top values)
+    for a schema version, by default the current version of DB_URI.
+    Collection runs in the background; until it finishes the status is "pending".
+    """
+    if schema_version:
+        entry = catalog.resolve(schema_version)
+    else:
+        db_uri = os.getenv("DB_URI")
+        if not db_uri:
+            return {"error": "DB_URI not set"}
+        entry = catalog.get(db_uri)
+    if not settings.COLUMN_STATS_ENABLED:
+        return {"schema_version": entry.version, "status": "disabled"}
+    if refresh:
+        column_stats.invalidate(entry.uri)
+    column_stats.request(entry.uri)
+    stats = column_stats.get(entry.version)
+    if stats is None:
+        return {"schema_version": entry.version, "status": "pending"}
+    if table is not None:
+        return {"schema_version": entry.version, "status": "ready", "table": table, **(stats["tables"].get(table) or {"error": f"Unknown table: {table}"})}
+    return {**stats, "status": "ready"}
@@ -3,14 +3,19 @@ from pydantic import BaseModel
 from typing import List, Dict, Any
 import os
 from ..core.safety import validate_query
+from ..core.metrics import stage, timings
+from ..core.column_stats import stats_for
 
 router = APIRouter()
 
 class ValidateRequest(BaseModel):
     candidates: List[str]
     db_type: str = "mysql"
+    schema_version: str | None = None  # enables checks against collected column stats
 
 @router.post("/")
 def validate(req: ValidateRequest):
-    results = [validate_query(q, req.db_type) for q in req.candidates]
-    return {"results": results}
+    with stage("validate"):
+        stats = stats_for(schema_version=req.schema_version)
+        results = [validate_query(q, req.db_type, stats) for q in req.candidates]
+    return {"results": results, "timings": timings()}
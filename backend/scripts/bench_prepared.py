@@ -0,0 +1,72 @@
+"""
+Compare plain bound execution with server-side prepared statements.
+
+Runs the same parameterized statement alternately through both paths of
+fastapi_app.core.prepared on one connection and prints latency percentiles,
+so PREPARED_STATEMENTS is only enabled where it is a measured net win.
+
+    python scripts/bench_prepared.py "SELECT * FROM orders WHERE customer_id = :cid" '{"cid": 42}' --iterations 500
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+load_dotenv()
+
+from fastapi_app.core import prepared  # noqa: E402
+from fastapi_app.core.config import settings  # noqa: E402
+
+
+def run(conn, statement, params, enabled):
+    settings.PREPARED_STATEMENTS = enabled
+    started = time.perf_counter()
+    prepared.execute(conn, statement, params).fetchall()
+    return (time.perf_counter() - started) * 1000
+
+
+def summary(samples):
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[int(len(ordered) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("statement", help="statement with :name placeholders")
+    parser.add_argument("params", help="JSON object of values for the placeholders")
+    parser.add_argument("--uri", default=os.getenv("DB_URI"))
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=20)
+    args = parser.parse_args()
+    if not args.uri:
+        raise SystemExit("DB_URI not set in environment (or pass --uri)")
+    params = json.loads(args.params)
+    engine = create_engine(args.uri)
+    plain, prep = [], []
+    with engine.connect() as conn:
+        for _ in range(args.warmup):
+            run(conn, args.statement, params, False)
+            run(conn, args.statement, params, True)
+        for i in range(args.iterations):
+            # Alternate the order so drift affects both paths equally
+            pair = [(plain, False), (prep, True)] if i % 2 == 0 else [(prep, True), (plain, False)]
+            for samples, enabled in pair:
+                samples.append(run(conn, args.statement, params, enabled))
+    result = {"plain": summary(plain), "prepared": summary(prep)}
+    result["prepared_speedup"] = round(result["plain"]["median_ms"] / result["prepared"]["median_ms"], 3)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
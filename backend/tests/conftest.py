@@ -0,0 +1,37 @@
+import sqlite3
+
+import pytest
+
+from fastapi_app.core import pagination, result_handles
+from fastapi_app.core.config import settings
+from fastapi_app.core.engines import dispose_all
+from fastapi_app.core.result_cache import result_cache
+
+ROWS = 25
+
+
+@pytest.fixture
+def sqlite_uri(tmp_path):
+    """File-backed SQLite database with an `items` table of ROWS rows."""
+    path = tmp_path / "items.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT NOT NULL, grp INTEGER)")
+    conn.executemany(
+        "INSERT INTO items VALUES (?, ?, ?)",
+        [(i, f"item{i:02d}", i % 3) for i in range(1, ROWS + 1)],
+    )
+    conn.commit()
+    conn.close()
+    return f"sqlite:///{path}"
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(monkeypatch):
+    """Keep process-wide caches, cursors and engines from leaking between tests."""
+    monkeypatch.setattr(settings, "MONGO_URI", None)
+    result_cache.clear()
+    yield
+    pagination.close_all()
+    result_handles.close_all()
+    result_cache.clear()
+    dispose_all()
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app.core.admission import AdmissionController, AdmissionRejected, identity, sql_admission
+from fastapi_app.core.config import settings
+from fastapi_app.main import app
+
+
+def _controller(**kwargs):
+    return AdmissionController("sql", **{"global_limit": 2, "tenant_limit": 2, "max_queue": 10, "queue_timeout_ms": 1000, **kwargs})
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        ctl = _controller(global_limit=1, max_queue=0)
+        await ctl.acquire("a")
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctl.acquire("b")
+        return exc.value, ctl
+
+    rejected, ctl = asyncio.run(scenario())
+    assert rejected.reason == "queue_full" and rejected.retry_after >= 1
+    assert ctl.stats()["rejected_queue_full"] == 1
+
+
+def test_waiter_times_out():
+    async def scenario():
+        ctl = _controller(global_limit=1, queue_timeout_ms=50)
+        await ctl.acquire("a")
+        with pytest.raises(AdmissionRejected) as exc:
+            await ctl.acquire("b")
+        return exc.value, ctl
+
+    rejected, ctl = asyncio.run(scenario())
+    assert rejected.reason == "queue_timeout"
+    assert ctl.stats()["queue_depth"] == 0
+
+
+def test_tenant_limit_does_not_block_other_tenants():
+    async def scenario():
+        ctl = _controller(global_limit=3, tenant_limit=1)
+        await ctl.acquire("a")
+        waiting = asyncio.ensure_future(ctl.acquire("a"))
+        await asyncio.sleep(0)
+        other = await asyncio.wait_for(ctl.acquire("b"), 0.5)
+        assert not waiting.done()
+        waiting.cancel()
+        return other
+
+    assert asyncio.run(scenario()).tenant == "b"
+
+
+def test_release_grants_interactive_before_batch():
+    async def scenario():
+        ctl = _controller(global_limit=1, tenant_limit=5)
+        first = await ctl.acquire("a")
+        order = []
+
+        async def wait(tenant, priority):
+            ticket = await ctl.acquire(tenant, priority)
+            order.append(tenant)
+            ticket.release()
+
+        batch = asyncio.ensure_future(wait("batch", "batch"))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(wait("interactive", "interactive"))
+        await asyncio.sleep(0)
+        first.release()
+        await asyncio.gather(batch, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "batch"]
+
+
+def test_identity_hashes_api_keys_from_a_trusted_proxy():
+    tenant, priority = identity({"x-api-key": "secret", "x-request-priority": "batch"}, "10.0.0.1", trust_headers=True)
+    assert tenant.startswith("key:") and "secret" not in tenant
+    assert priority == "batch"
+    assert identity({"x-tenant-id": "acme"}, "10.0.0.1", trust_headers=True) == ("acme", "interactive")
+    assert identity({}, "10.0.0.1") == ("ip:10.0.0.1", "interactive")
+
+
+def test_untrusted_headers_cannot_change_tenant_or_raise_priority():
+    headers = {"x-api-key": "rotated", "x-tenant-id": "someone-else", "x-request-priority": "interactive"}
+    assert identity(headers, "10.0.0.1", "batch", trust_headers=False) == ("ip:10.0.0.1", "batch")
+    # Lowering your own priority is always allowed
+    assert identity({"x-request-priority": "batch"}, "10.0.0.1", trust_headers=False) == ("ip:10.0.0.1", "batch")
+
+
+def test_header_trust_follows_the_setting(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_TRUST_HEADERS", False)
+    assert identity({"x-tenant-id": "acme"}, "10.0.0.1") == ("ip:10.0.0.1", "interactive")
+    monkeypatch.setattr(settings, "ADMISSION_TRUST_HEADERS", True)
+    assert identity({"x-tenant-id": "acme"}, "10.0.0.1") == ("acme", "interactive")
+
+
+def test_execute_returns_429_when_saturated(sqlite_uri, monkeypatch):
+    monkeypatch.setattr(sql_admission, "in_use", sql_admission.global_limit)
+    monkeypatch.setattr(sql_admission, "max_queue", 0)
+    with TestClient(app) as client:
+        resp = client.post("/execute/", json={"query": "SELECT 1", "db_uri": sqlite_uri})
+    assert resp.status_code == 429
+    assert resp.json()["error_type"] == "queue_full"
+    assert int(resp.headers["retry-after"]) >= 1
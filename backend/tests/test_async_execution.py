@@ -0,0 +1,22 @@
+import asyncio
+
+from fastapi_app.core import engines
+from fastapi_app.core.execution import execute_query_async
+
+
+def test_async_execution_returns_rows(sqlite_uri):
+    out = asyncio.run(execute_query_async("SELECT name FROM items WHERE id = 2", db_uri=sqlite_uri))
+    assert out["rows"] == [{"name": "item02"}]
+    assert out["engine"] == "sqlite"
+
+
+def test_falls_back_to_sync_engine_without_async_driver(sqlite_uri, monkeypatch):
+    monkeypatch.setattr(engines, "async_uri", lambda uri: None)
+    monkeypatch.setattr("fastapi_app.core.execution.get_async_engine", lambda uri: None)
+    out = asyncio.run(execute_query_async("SELECT COUNT(*) AS n FROM items", db_uri=sqlite_uri))
+    assert out["rows"] == [{"n": 25}]
+
+
+def test_unsupported_db_type():
+    out = asyncio.run(execute_query_async("SELECT 1", db_type="postgres", db_uri="sqlite://"))
+    assert out == {"error": "Unsupported db_type for execution: postgres"}
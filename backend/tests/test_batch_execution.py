@@ -0,0 +1,34 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from fastapi_app.core.execution import execute_batch_async
+from fastapi_app.main import app
+
+# 25^6 row combinations: runs for minutes unless interrupted
+SLOW = "SELECT COUNT(*) AS c FROM items a " + " ".join(f"JOIN items {t} ON {t}.id >= 0" for t in "bcdef")
+
+
+def test_all_mode_reports_each_candidate(sqlite_uri):
+    out = asyncio.run(execute_batch_async(
+        ["SELECT COUNT(*) AS n FROM items", "SELECT * FROM missing_table", "DELETE FROM items"],
+        db_uri=sqlite_uri, mode="all",
+    ))
+    statuses = [r["status"] for r in out["results"]]
+    assert statuses == ["success", "error", "blocked"]
+    assert out["results"][0]["result"]["rows"] == [{"n": 25}]
+
+
+def test_first_success_cancels_the_slow_candidate(sqlite_uri):
+    out = asyncio.run(execute_batch_async(
+        [SLOW, "SELECT id FROM items WHERE id = 1"], db_uri=sqlite_uri, mode="first_success",
+    ))
+    assert out["winner"] == 1
+    assert out["results"][0]["status"] == "cancelled"
+    assert out["elapsed_ms"] < 5000
+
+
+def test_batch_endpoint_rejects_more_candidates_than_generated(sqlite_uri):
+    with TestClient(app) as client:
+        resp = client.post("/execute/batch", json={"candidates": ["SELECT 1"] * 50, "db_uri": sqlite_uri})
+    assert resp.status_code == 422
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy.pool import NullPool
+
+from fastapi_app.core import engines
+from fastapi_app.core.cancellation import CancelGroup, CancelToken, add_max_execution_time
+from fastapi_app.core.execution import execute_query
+
+SLOW = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) "
+    "SELECT COUNT(*) AS c FROM n"
+)
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT a FROM t", "SELECT /*+ MAX_EXECUTION_TIME(50) */ a FROM t"),
+    (
+        "WITH c(x) AS (SELECT 1), d AS (SELECT 2) SELECT x FROM c",
+        "WITH c(x) AS (SELECT 1), d AS (SELECT 2) SELECT /*+ MAX_EXECUTION_TIME(50) */ x FROM c",
+    ),
+    (
+        "(SELECT a FROM t) UNION (SELECT a FROM u) ORDER BY a LIMIT 5",
+        "(SELECT /*+ MAX_EXECUTION_TIME(50) */ a FROM t) UNION (SELECT a FROM u) ORDER BY a LIMIT 5",
+    ),
+    (
+        "SELECT a FROM t UNION ALL SELECT b FROM u",
+        "SELECT /*+ MAX_EXECUTION_TIME(50) */ a FROM t UNION ALL SELECT b FROM u",
+    ),
+    ("SELECT /*+ BKA(t) */ a FROM t", "SELECT /*+ MAX_EXECUTION_TIME(50) BKA(t) */ a FROM t"),
+    ("SELECT SQL_CALC_FOUND_ROWS a FROM t", "SELECT /*+ MAX_EXECUTION_TIME(50) */ SQL_CALC_FOUND_ROWS a FROM t"),
+    ("SELECT /*+ MAX_EXECUTION_TIME(9) */ a FROM t", "SELECT /*+ MAX_EXECUTION_TIME(9) */ a FROM t"),
+    ("UPDATE t SET a = 1 WHERE id = 2", "UPDATE t SET a = 1 WHERE id = 2"),
+])
+def test_max_execution_time_hint_goes_on_the_outermost_select(query, expected):
+    assert add_max_execution_time(query, 50) == expected
+
+
+def test_deadline_interrupts_a_running_statement(sqlite_uri):
+    started = time.monotonic()
+    out = execute_query(SLOW, db_uri=sqlite_uri, timeout_ms=100)
+    assert out["error_type"] == "timeout"
+    assert out["timeout_ms"] == 100
+    assert time.monotonic() - started < 5
+
+
+def test_cancel_token_stops_a_running_statement(sqlite_uri):
+    token = CancelToken()
+    threading.Timer(0.1, token.cancel, args=("user request",)).start()
+    out = execute_query(SLOW, db_uri=sqlite_uri, cancel_token=token)
+    assert out == {"error": "Query cancelled: user request", "error_type": "cancelled"}
+
+
+def test_cancelled_token_refuses_to_bind():
+    token = CancelToken()
+    token.cancel("gone")
+    assert token.bind(lambda: None) is False
+
+
+def test_kill_runs_outside_the_lock_and_unbind_waits_for_it():
+    token = CancelToken()
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    def kill():
+        entered.set()
+        release.wait(2)
+        calls.append("killed")
+
+    token.bind(kill)
+    canceller = threading.Thread(target=token.cancel, args=("timeout",))
+    canceller.start()
+    entered.wait(1)
+    # The token lock is free while the kill runs
+    assert token._lock.acquire(timeout=0.5)
+    token._lock.release()
+    unbinder = threading.Thread(target=token.unbind)
+    unbinder.start()
+    unbinder.join(0.2)
+    assert unbinder.is_alive()  # the connection may not go back to the pool mid-kill
+    release.set()
+    unbinder.join(1)
+    canceller.join(1)
+    assert calls == ["killed"] and not unbinder.is_alive()
+
+
+def test_cancel_group_cancels_tokens_created_later():
+    group = CancelGroup()
+    first = group.new_token()
+    group.cancel("superseded")
+    assert first.cancelled and first.reason == "superseded"
+    late = group.new_token()
+    assert late.cancelled and late.reason == "superseded"
+
+
+def test_kill_engine_is_unpooled(sqlite_uri):
+    unpooled = engines.get_unpooled_engine(sqlite_uri)
+    assert isinstance(unpooled.pool, NullPool)
+    assert unpooled is not engines.get_engine(sqlite_uri)
+    assert engines.get_unpooled_engine(sqlite_uri) is unpooled
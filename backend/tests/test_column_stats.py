@@ -0,0 +1,55 @@
+from fastapi_app.core.column_stats import _column_stats, value_check
+from fastapi_app.core.ranking import rank_candidates
+from fastapi_app.core.safety import validate_query
+from fastapi_app.core.sql_ast import parse_sql
+
+STATUSES = ["open"] * 6 + ["closed"] * 3 + ["held"]
+CODES = [200] * 6 + [404] * 3 + [500]
+SCHEMA = {"tables": ["orders"]}
+
+
+def _stats(status):
+    return {"tables": {"orders": {"rows": 1000, "columns": {"status": status}}}}
+
+
+def test_a_partial_sample_is_never_complete():
+    col = _column_stats(CODES, "int", 1000, None, None)
+    assert col["distinct_source"] == "sample"
+    assert col["complete"] is False
+
+
+def test_a_sample_of_every_row_is_complete():
+    assert _column_stats(STATUSES, "varchar", len(STATUSES), None, None)["complete"] is True
+
+
+def test_an_index_count_can_confirm_a_partial_sample():
+    index = {"unique": False, "cardinality": 3}
+    assert _column_stats(STATUSES, "varchar", 1000, index, None)["complete"] is True
+    index["cardinality"] = 4
+    assert _column_stats(STATUSES, "varchar", 1000, index, None)["complete"] is False
+
+
+def test_values_missing_from_a_partial_sample_are_informational():
+    stats = _stats(_column_stats(CODES, "int", 1000, None, None))
+    tree = parse_sql("SELECT * FROM orders WHERE status = 302")
+    assert value_check(tree, stats) == {"known": [], "unknown": [], "unseen": ["orders.status = '302'"]}
+
+    reasons = validate_query("SELECT * FROM orders WHERE status = 302 LIMIT 5", stats=stats)["reasons"]
+    assert not any(r.startswith("VALUE_NOT_FOUND") for r in reasons)
+    assert any(r.startswith("VALUE_NOT_SAMPLED") for r in reasons)
+
+    ranked = rank_candidates("redirected orders", ["SELECT * FROM orders WHERE status = 302"], SCHEMA, "mysql", stats)
+    assert ranked[0]["value_penalty"] == 0
+    assert ranked[0]["unsampled_values"] == ["orders.status = '302'"]
+
+
+def test_values_outside_a_complete_domain_are_penalised():
+    stats = _stats(_column_stats(STATUSES, "varchar", len(STATUSES), None, None))
+    tree = parse_sql("SELECT * FROM orders WHERE status IN ('open', 'refunded')")
+    assert value_check(tree, stats) == {"known": ["orders.status = 'open'"], "unknown": ["orders.status = 'refunded'"], "unseen": []}
+
+    reasons = validate_query("SELECT * FROM orders WHERE status = 'refunded' LIMIT 5", stats=stats)["reasons"]
+    assert any(r.startswith("VALUE_NOT_FOUND") for r in reasons)
+
+    ranked = rank_candidates("refunded orders", ["SELECT * FROM orders WHERE status = 'refunded'"], SCHEMA, "mysql", stats)
+    assert ranked[0]["value_penalty"] > 0
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+
+from fastapi_app.core import cost_guard
+from fastapi_app.core.config import settings
+
+PLAN = {
+    "query_block": {
+        "cost_info": {"query_cost": "1234.5"},
+        "ordering_operation": {
+            "using_filesort": True,
+            "nested_loop": [
+                {"table": {"table_name": "orders", "access_type": "ALL", "rows_examined_per_scan": 2000,
+                           "rows_produced_per_join": 2000}},
+                {"table": {"table_name": "customers", "access_type": "eq_ref", "rows_examined_per_scan": 1,
+                           "rows_produced_per_join": 2000}},
+                {"table": {"table_name": "regions", "access_type": "ALL", "rows_examined_per_scan": 50,
+                           "using_join_buffer": "hash join"}},
+            ],
+        },
+    }
+}
+
+
+class FakeConn:
+    class dialect:
+        name = "mysql"
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.explains = 0
+
+    def execute(self, statement, params=None):
+        self.explains += 1
+        plan = self.plan
+
+        class Result:
+            def scalar(self):
+                return json.dumps(plan)
+        return Result()
+
+
+@pytest.fixture(autouse=True)
+def empty_plan_cache():
+    cost_guard._plans.clear()
+    yield
+    cost_guard._plans.clear()
+
+
+def test_inner_tables_are_scanned_once_per_outer_row():
+    summary = cost_guard.summarize_plan(PLAN)
+    scans = {t["table"]: t["scans"] for t in summary["tables"]}
+    assert scans == {"orders": 1, "customers": 2000, "regions": 1}
+    assert summary["rows_examined"] == 2000 + 2000 + 50
+    assert summary["cartesian_joins"] == ["regions"]
+    assert summary["filesort"] is True
+    assert summary["query_cost"] == 1234.5
+
+
+def test_block_mode_blocks_over_threshold(monkeypatch):
+    monkeypatch.setattr(settings, "COST_GUARD_MODE", "block")
+    monkeypatch.setattr(settings, "COST_GUARD_MAX_ROWS", 1000)
+    result = cost_guard.evaluate(cost_guard.summarize_plan(PLAN))
+    assert result["blocked"] is True
+    assert any("exceeds 1000" in r for r in result["reasons"])
+    assert "cost_guard" == cost_guard.blocked_error(result)["error_type"]
+
+
+def test_warn_mode_turns_problems_into_warnings(monkeypatch):
+    monkeypatch.setattr(settings, "COST_GUARD_MODE", "warn")
+    monkeypatch.setattr(settings, "COST_GUARD_MAX_ROWS", 1000)
+    result = cost_guard.evaluate(cost_guard.summarize_plan(PLAN))
+    assert result["blocked"] is False and result["reasons"] == []
+    assert any("exceeds 1000" in w for w in result["warnings"])
+
+
+def test_plans_are_cached_per_fingerprint(monkeypatch):
+    monkeypatch.setattr(settings, "COST_GUARD_MODE", "warn")
+    conn = FakeConn(PLAN)
+    first = cost_guard.check(conn, "mysql://db", "SELECT * FROM orders")
+    second = cost_guard.check(conn, "mysql://db", "select *  from orders")
+    assert conn.explains == 1
+    assert first["cached"] is False and second["cached"] is True
+
+
+def test_writes_and_other_dialects_are_not_checked(monkeypatch):
+    monkeypatch.setattr(settings, "COST_GUARD_MODE", "block")
+    conn = FakeConn(PLAN)
+    assert cost_guard.check(conn, "mysql://db", "DELETE FROM orders WHERE id = 1") is None
+    conn.dialect = type("D", (), {"name": "sqlite"})
+    assert cost_guard.check(conn, "sqlite://", "SELECT * FROM orders") is None
+    assert conn.explains == 0
+
+
+@pytest.fixture
+def blocking_guard(monkeypatch):
+    monkeypatch.setattr(settings, "COST_GUARD_MODE", "block")
+    monkeypatch.setattr(settings, "COST_GUARD_MAX_ROWS", 1000)
+    checked = []
+
+    def check(conn, uri, query, params=None):
+        checked.append(query)
+        return cost_guard.evaluate(cost_guard.summarize_plan(PLAN))
+
+    monkeypatch.setattr(cost_guard, "check", check)
+    return checked
+
+
+def test_stream_is_blocked_before_it_runs(sqlite_uri, blocking_guard):
+    from fastapi.testclient import TestClient
+    from fastapi_app.core.execution import stream_query
+    from fastapi_app.main import app
+
+    items = list(stream_query("SELECT * FROM items", db_uri=sqlite_uri))
+    assert len(items) == 1 and items[0]["error_type"] == "cost_guard"
+    with TestClient(app) as client:
+        res = client.post("/execute/stream", json={"query": "SELECT * FROM items", "db_uri": sqlite_uri})
+    assert res.json()["error_type"] == "cost_guard"
+    assert len(blocking_guard) == 2
+
+
+def test_materialize_is_blocked_before_it_runs(sqlite_uri, blocking_guard):
+    from fastapi_app.core.result_handles import materialize, resident_bytes
+
+    out = materialize("SELECT * FROM items", db_uri=sqlite_uri)
+    assert out["error_type"] == "cost_guard" and "handle" not in out
+    assert blocking_guard and resident_bytes() == 0
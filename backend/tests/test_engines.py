@@ -0,0 +1,26 @@
+from fastapi_app.core import engines
+from fastapi_app.core.config import settings
+from fastapi_app.core.execution import execute_query
+
+
+def test_get_engine_is_shared_per_uri(sqlite_uri):
+    assert engines.get_engine(sqlite_uri) is engines.get_engine(sqlite_uri)
+
+
+def test_least_recently_used_engine_is_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DB_ENGINE_CACHE_SIZE", 2)
+    uris = [f"sqlite:///{tmp_path / f'db{i}.db'}" for i in range(3)]
+    first = engines.get_engine(uris[0])
+    engines.get_engine(uris[1])
+    engines.get_engine(uris[0])  # touch: uris[1] is now the oldest
+    engines.get_engine(uris[2])
+    assert list(engines._engines) == [uris[0], uris[2]]
+    assert engines.get_engine(uris[0]) is first
+
+
+def test_execute_query_reuses_the_registered_engine(sqlite_uri):
+    engine = engines.get_engine(sqlite_uri)
+    out = execute_query("SELECT COUNT(*) AS n FROM items", db_uri=sqlite_uri)
+    assert out["rows"] == [{"n": 25}]
+    assert engines.get_engine(sqlite_uri) is engine
+    assert engine.pool.checkedout() == 0
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from fastapi_app.core.introspection import _COLUMNS_SQL, _FOREIGN_KEYS_SQL, _INDEXES_SQL, describe
+
+COLUMNS = [
+    ("customers", "id", "int", "NO", "PRI", None, "auto_increment"),
+    ("customers", "email", "varchar", "NO", "UNI", None, ""),
+    ("order_items", "order_id", "int", "NO", "PRI", None, ""),
+    ("order_items", "sku", "varchar", "NO", "PRI", None, ""),
+    ("orders", "id", "int", "NO", "PRI", None, "auto_increment"),
+    ("orders", "customer_id", "int", "YES", "MUL", None, ""),
+]
+INDEXES = [
+    ("customers", "PRIMARY", "id", 0),
+    ("customers", "email", "email", 0),
+    ("order_items", "PRIMARY", "order_id", 0),
+    ("order_items", "PRIMARY", "sku", 0),
+    ("orders", "PRIMARY", "id", 0),
+    ("orders", "customer_id", "customer_id", 1),
+]
+FOREIGN_KEYS = [
+    ("order_items", "order_id", "orders", "id", "fk_items_order"),
+    ("orders", "customer_id", "customers", "id", "fk_orders_customer"),
+]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        rows = {id(_COLUMNS_SQL): COLUMNS, id(_INDEXES_SQL): INDEXES, id(_FOREIGN_KEYS_SQL): FOREIGN_KEYS}.get(id(statement))
+        if rows is None:
+            return SimpleNamespace(scalar=lambda: "shop")
+        assert params == {"db": "shop"}
+        return iter(rows)
+
+
+def test_whole_schema_in_three_bulk_queries():
+    conn = FakeConnection()
+    schema = describe(conn)
+    assert conn.statements[1:] == [_COLUMNS_SQL, _INDEXES_SQL, _FOREIGN_KEYS_SQL]
+    assert schema["db"] == "shop"
+    assert schema["tables"] == ["customers", "order_items", "orders"]
+
+
+def test_rows_are_grouped_per_table():
+    schema = describe(FakeConnection())
+    assert [c["name"] for c in schema["columns"]["orders"]] == ["id", "customer_id"]
+    assert schema["columns"]["orders"][1]["nullable"] == "YES"
+    assert schema["primary_keys"] == {"customers": ["id"], "order_items": ["order_id", "sku"], "orders": ["id"]}
+    assert schema["indexes"]["order_items"] == [{"name": "PRIMARY", "columns": ["order_id", "sku"], "unique": True}]
+    assert {"name": "customer_id", "columns": ["customer_id"], "unique": False} in schema["indexes"]["orders"]
+    assert schema["foreign_keys"][1] == {
+        "from_table": "orders", "from_column": "customer_id",
+        "to_table": "customers", "to_column": "id", "constraint_name": "fk_orders_customer",
+    }
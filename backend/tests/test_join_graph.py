@@ -0,0 +1,60 @@
+from fastapi_app.core.join_graph import graph_for, join_conformance
+from fastapi_app.core.schema_selector import select_schema
+from fastapi_app.core.sql_ast import parse_sql
+
+
+def _fk(a, ac, b, bc):
+    return {"from_table": a, "from_column": ac, "to_table": b, "to_column": bc}
+
+
+SCHEMA = {
+    "tables": ["customers", "orders", "order_items", "products", "suppliers", "audit_log"],
+    "foreign_keys": [
+        _fk("orders", "customer_id", "customers", "id"),
+        _fk("order_items", "order_id", "orders", "id"),
+        _fk("order_items", "product_id", "products", "id"),
+        _fk("products", "supplier_id", "suppliers", "id"),
+    ],
+}
+
+
+def test_graphs_are_cached_per_fk_set():
+    graph = graph_for(SCHEMA)
+    assert graph_for({**SCHEMA, "columns": {}}) is graph
+    assert graph_for({**SCHEMA, "foreign_keys": SCHEMA["foreign_keys"][:1]}) is not graph
+    assert graph.stats() == {"tables": 6, "edges": 4}
+
+
+def test_shortest_paths():
+    graph = graph_for(SCHEMA)
+    assert graph.distance("customers", "suppliers") == 4
+    assert [e.condition() for e in graph.path("customers", "orders")] == ["orders.customer_id = customers.id"]
+    assert graph.path("customers", "audit_log") is None
+
+
+def test_join_path_adds_intermediate_tables_and_reports_the_rest():
+    out = graph_for(SCHEMA).join_path(["customers", "products", "audit_log", "ghost"])
+    assert out["intermediate"] == ["order_items", "orders"]
+    assert [e["condition"] for e in out["edges"]] == [
+        "order_items.product_id = products.id",
+        "order_items.order_id = orders.id",
+        "orders.customer_id = customers.id",
+    ]
+    assert out["unreachable"] == ["ghost", "audit_log"]
+
+
+def test_join_path_of_unknown_tables_has_the_full_shape():
+    assert graph_for(SCHEMA).join_path(["ghost"]) == {"tables": [], "edges": [], "intermediate": [], "unreachable": ["ghost"]}
+    assert select_schema("anything", {"tables": []}).tables == []
+
+
+def test_conformance_flags_joins_off_the_fk_graph():
+    graph = graph_for(SCHEMA)
+    on_graph = parse_sql("SELECT * FROM orders o JOIN customers c ON o.customer_id = c.id")
+    assert join_conformance(on_graph, graph) == {"joins": 1, "off_graph": []}
+    off = parse_sql("SELECT * FROM orders o JOIN customers c ON o.id = c.id")
+    assert len(join_conformance(off, graph)["off_graph"]) == 1
+    comma = parse_sql("SELECT * FROM orders o, customers c, products p WHERE o.customer_id = c.id")
+    assert len(join_conformance(comma, graph)["off_graph"]) == 1
+    unresolved = parse_sql("SELECT * FROM orders JOIN customers ON customer_id = id")
+    assert join_conformance(unresolved, graph)["off_graph"] == []
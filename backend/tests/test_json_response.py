@@ -0,0 +1,52 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from bson import Decimal128, ObjectId
+
+from fastapi_app.core import json_response
+from fastapi_app.core.json_response import ResultJSONResponse, dumps
+
+
+def test_values_keep_the_jsonable_encoder_shapes():
+    oid = ObjectId("0123456789abcdef01234567")
+    row = {
+        "n": decimal.Decimal("12"),
+        "price": decimal.Decimal("2.50"),
+        "nan": decimal.Decimal("NaN"),
+        "big": Decimal128("7"),
+        "id": oid,
+        "text": b"abc",
+        "blob": b"\xff\x00",
+        "when": datetime.date(2024, 5, 1),
+        "took": datetime.timedelta(seconds=90),
+        "tags": {"a"},
+        "nested": [{"oid": oid}],
+    }
+    assert json.loads(dumps(row)) == {
+        "n": 12,
+        "price": 2.5,
+        "nan": None,
+        "big": 7,
+        "id": "0123456789abcdef01234567",
+        "text": "abc",
+        "blob": "/wA=",
+        "when": "2024-05-01",
+        "took": 90.0,
+        "tags": ["a"],
+        "nested": [{"oid": "0123456789abcdef01234567"}],
+    }
+
+
+def test_stdlib_fallback_matches(monkeypatch):
+    row = {"id": uuid.UUID(int=1), "at": datetime.datetime(2024, 5, 1, 12, 0), "n": decimal.Decimal("1.5"), "wide": 2 ** 70}
+    fast = json.loads(dumps(row))
+    monkeypatch.setattr(json_response, "orjson", None)
+    assert json.loads(dumps(row)) == fast
+    assert fast["wide"] == 2 ** 70
+
+
+def test_response_renders_utf8():
+    body = ResultJSONResponse({"rows": [{"name": "café"}]}).body
+    assert body.decode("utf-8") == '{"rows":[{"name":"café"}]}'
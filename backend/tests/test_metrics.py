@@ -0,0 +1,41 @@
+from fastapi.testclient import TestClient
+
+from fastapi_app.core.metrics import BUCKETS, Histogram, server_timing, stage, timings
+from fastapi_app.main import app
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("t_seconds", "Test.", ("route",))
+    h.observe(("/a",), 0.003)
+    h.observe(("/a",), 0.02)
+    h.observe(("/a",), 100.0)
+    lines = h.render()
+    assert 't_seconds_bucket{route="/a",le="0.005"} 1' in lines
+    assert 't_seconds_bucket{route="/a",le="0.025"} 2' in lines
+    assert f't_seconds_bucket{{route="/a",le="{BUCKETS[-1]!r}"}} 2' in lines
+    assert 't_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{route="/a"} 3' in lines
+
+
+def test_stages_outside_a_request_are_not_attributed():
+    with stage("db"):
+        pass
+    assert timings() == {}
+
+
+def test_server_timing_format():
+    assert server_timing({"db": 1.5, "total": 3.0}) == "db;dur=1.5, total;dur=3.0"
+
+
+def test_request_reports_stages_and_feeds_metrics(sqlite_uri):
+    with TestClient(app) as client:
+        res = client.post("/execute/", json={"query": "SELECT id FROM items WHERE id = 1", "db_uri": sqlite_uri})
+        assert res.status_code == 200
+        stages = dict(part.split(";dur=") for part in res.headers["server-timing"].split(", "))
+        assert {"db", "total"} <= set(stages)
+        assert float(stages["total"]) >= float(stages["db"])
+
+        body = client.get("/metrics").text
+    assert 'twdb_request_duration_seconds_count{method="POST",route="/execute/",status="200"}' in body
+    assert 'twdb_stage_duration_seconds_count{route="/execute/",stage="db"}' in body
+    assert "twdb_cache_hits_total" in body
@@ -0,0 +1,54 @@
+import pytest
+
+from fastapi_app.core.config import settings
+from fastapi_app.core.mirror import AnalyticMirror
+
+GROUPS = "SELECT grp, COUNT(*) AS n FROM items GROUP BY grp ORDER BY grp"
+
+
+@pytest.fixture
+def mirror(sqlite_uri, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MIRROR_REFRESH_INTERVAL", 3600)
+    m = AnalyticMirror(sqlite_uri, ["items"], "sqlite", str(tmp_path / "mirror.sqlite"))
+    m.refresh(m.tables["items"])
+    yield m
+    m.stop()
+
+
+def test_aggregates_are_answered_from_the_snapshot(mirror, sqlite_uri):
+    assert mirror.tables["items"].rows == 25
+    out = mirror.answer(sqlite_uri, GROUPS, None, "rows")
+    assert out["engine"] == "sqlite"
+    assert out["rows"] == [{"grp": 0, "n": 8}, {"grp": 1, "n": 9}, {"grp": 2, "n": 8}]
+    assert mirror.stats()["routed"] == 1
+
+
+def test_bound_parameters_and_columns_format(mirror, sqlite_uri):
+    out = mirror.answer(sqlite_uri, "SELECT COUNT(*) AS n FROM items WHERE grp = :g", {"g": 1}, "columns")
+    assert out["columns"] == ["n"] and out["data"] == [[9]]
+
+
+def test_strings_compare_case_insensitively_like_mysql(mirror, sqlite_uri):
+    out = mirror.answer(sqlite_uri, "SELECT COUNT(*) AS n FROM items WHERE name = 'ITEM01'", None, "rows")
+    assert out["rows"] == [{"n": 1}]
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT id FROM items",                              # not an aggregate
+    "SELECT COUNT(*) AS n FROM other",                   # table not mirrored
+    "SELECT COUNT(*) AS n FROM items FOR UPDATE",        # needs the primary
+])
+def test_other_statements_run_on_the_source(mirror, sqlite_uri, query):
+    assert mirror.answer(sqlite_uri, query, None, "rows") is None
+
+
+def test_stale_snapshots_and_other_databases_are_not_used(mirror, sqlite_uri, monkeypatch):
+    assert mirror.answer("sqlite:///elsewhere.db", GROUPS, None, "rows") is None
+    monkeypatch.setattr(settings, "MIRROR_MAX_STALENESS", -1)
+    assert mirror.answer(sqlite_uri, GROUPS, None, "rows") is None
+    assert mirror.stats()["skipped_stale"] == 1
+
+
+def test_mirror_errors_fall_back(mirror, sqlite_uri):
+    assert mirror.answer(sqlite_uri, "SELECT COUNT(missing) AS n FROM items", None, "rows") is None
+    assert mirror.stats()["fallbacks"] == 1
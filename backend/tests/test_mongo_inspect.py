@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from fastapi_app.core import mongo_inspect
+from fastapi_app.core.config import settings
+from fastapi_app.core.mongo_inspect import infer_collections, inspect_cluster
+
+
+class FakeDatabase:
+    def __init__(self, names, delay=0.0, error=None):
+        self.names = names
+        self.delay = delay
+        self.error = error
+
+    def list_collection_names(self, authorizedCollections=False):
+        time.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return list(self.names)
+
+
+class FakeClient:
+    def __init__(self, databases):
+        self.databases = databases
+
+    def list_databases(self, nameOnly=False, authorizedDatabases=False):
+        return [{"name": name} for name in self.databases]
+
+    def __getitem__(self, name):
+        return self.databases[name]
+
+
+@pytest.fixture(autouse=True)
+def stub_inference(monkeypatch):
+    monkeypatch.setattr(mongo_inspect, "_infer", lambda client, uri, db, name, refresh: {"collection": name, "db": db})
+    yield
+    mongo_inspect.shutdown()
+
+
+def test_lists_user_databases_and_samples_their_collections():
+    client = FakeClient({"admin": FakeDatabase(["system.users"]), "shop": FakeDatabase(["orders", "carts"]), "crm": FakeDatabase(["leads"])})
+    out = inspect_cluster(client, "mongodb://h")
+    assert out["databases"] == ["admin", "shop", "crm"]
+    assert out["collections"] == {"shop": ["carts", "orders"], "crm": ["leads"]}
+    assert out["schemas"]["shop"]["orders"] == {"collection": "orders", "db": "shop"}
+    assert out["partial"] is False and "errors" not in out
+
+
+def test_databases_are_listed_in_parallel():
+    client = FakeClient({f"db{i}": FakeDatabase(["c"], delay=0.2) for i in range(4)})
+    started = time.monotonic()
+    out = inspect_cluster(client, "mongodb://h", infer_fields=False)
+    assert time.monotonic() - started < 0.6
+    assert len(out["collections"]) == 4 and "schemas" not in out
+
+
+def test_failed_and_slow_databases_give_a_partial_result(monkeypatch):
+    monkeypatch.setattr(settings, "MONGO_INSPECT_TIMEOUT_MS", 300)
+    client = FakeClient({
+        "ok": FakeDatabase(["a"]),
+        "broken": FakeDatabase([], error="not authorized"),
+        "slow": FakeDatabase(["b"], delay=1.0),
+    })
+    out = inspect_cluster(client, "mongodb://h")
+    assert out["collections"] == {"ok": ["a"]}
+    assert out["errors"] == {"broken": "not authorized", "slow": "timed out"}
+    assert out["partial"] is True
+
+
+def test_slow_collection_samples_are_reported(monkeypatch):
+    monkeypatch.setattr(settings, "MONGO_INSPECT_TIMEOUT_MS", 200)
+    release = threading.Event()
+
+    def infer(client, uri, db, name, refresh):
+        if name == "slow":
+            release.wait(2)
+        return {"collection": name}
+
+    monkeypatch.setattr(mongo_inspect, "_infer", infer)
+    errors = {}
+    try:
+        schemas = infer_collections(None, "mongodb://h", [("db", "fast"), ("db", "slow")], errors=errors)
+    finally:
+        release.set()
+    assert schemas == {"db": {"fast": {"collection": "fast"}}}
+    assert errors == {"db.slow": "timed out"}
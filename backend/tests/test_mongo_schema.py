@@ -0,0 +1,99 @@
+import datetime
+
+from bson import Int64, ObjectId
+
+from fastapi_app.core.config import settings
+from fastapi_app.core.mongo_schema import MongoSchemaCache, bson_type, field_summary, infer_collection
+
+DOCS = [
+    {"_id": ObjectId(), "name": "a", "tags": ["x", "y"], "address": {"city": "Oslo"}, "n": 1},
+    {"_id": ObjectId(), "name": "b", "tags": [], "address": {"city": "Rome", "zip": "00100"}, "n": 2.5},
+    {"_id": ObjectId(), "name": None, "items": [{"sku": "s1"}, {"sku": "s2"}], "n": Int64(3)},
+    {"_id": ObjectId(), "name": "d", "created": datetime.datetime(2024, 1, 1)},
+]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.docs)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    name = "people"
+
+    def __init__(self, docs=DOCS):
+        self.docs = docs
+        self.pipelines = []
+
+    def index_information(self):
+        return {"_id_": {"key": [("_id", 1)]}, "city_1": {"key": [("address.city", 1)], "sparse": True}}
+
+    def estimated_document_count(self, maxTimeMS=None):
+        return 1_000_000
+
+    def aggregate(self, pipeline, maxTimeMS=None, batchSize=None):
+        self.pipelines.append(pipeline)
+        size = pipeline[0]["$sample"]["size"]
+        return FakeCursor(self.docs[:size])
+
+
+class FakeClient(dict):
+    pass
+
+
+def _fields(inferred):
+    return {f["path"]: f for f in inferred["fields"]}
+
+
+def test_bson_types():
+    assert [bson_type(v) for v in (None, True, 1, 2 ** 40, Int64(1), 1.5, "s", {}, [])] == [
+        "null", "bool", "int", "long", "long", "double", "string", "object", "array",
+    ]
+
+
+def test_fields_types_and_frequencies_from_a_bounded_sample(monkeypatch):
+    monkeypatch.setattr(settings, "MONGO_SCHEMA_SAMPLE_SIZE", 4)
+    collection = FakeCollection()
+    inferred = infer_collection(collection)
+    assert collection.pipelines == [[{"$sample": {"size": 4}}]]
+    assert inferred["sampled"] == 4 and inferred["estimated_count"] == 1_000_000
+    fields = _fields(inferred)
+    assert fields["name"]["types"] == {"string": 0.75, "null": 0.25}
+    assert fields["n"]["types"] == {"int": 0.3333, "double": 0.3333, "long": 0.3333}
+    assert fields["n"]["frequency"] == 0.75
+    assert fields["tags[]"]["types"] == {"string": 1.0} and fields["tags[]"]["frequency"] == 0.25
+    assert fields["items[].sku"]["frequency"] == 0.25
+    assert fields["address.zip"]["frequency"] == 0.25
+    assert fields["address.city"]["indexed"] is True and fields["name"]["indexed"] is False
+    assert {"name": "city_1", "keys": [["address.city", 1]], "unique": False, "sparse": True} in inferred["indexes"]
+
+
+def test_field_limit_marks_the_result_truncated(monkeypatch):
+    monkeypatch.setattr(settings, "MONGO_SCHEMA_MAX_FIELDS", 3)
+    inferred = infer_collection(FakeCollection())
+    assert inferred["truncated_fields"] is True
+    assert len(inferred["fields"]) == 3
+
+
+def test_schemas_are_cached_per_collection():
+    collection = FakeCollection()
+    client = FakeClient(db=FakeClient(people=collection))
+    cache = MongoSchemaCache(refresh_interval=60)
+    first = cache.collection(client, "mongodb://h", "db", "people")
+    assert cache.collection(client, "mongodb://h", "db", "people") is first
+    assert len(collection.pipelines) == 1
+    cache.collection(client, "mongodb://h", "db", "people", refresh=True)
+    assert len(collection.pipelines) == 2
+
+
+def test_field_summary_lists_frequent_fields_first():
+    summary = field_summary(infer_collection(FakeCollection()), limit=3)
+    assert summary.startswith("_id:objectId, name:string")
+    assert "?" in summary.split(", ")[2]
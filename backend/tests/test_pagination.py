@@ -0,0 +1,148 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from fastapi_app.core import pagination
+from fastapi_app.core.config import settings
+from fastapi_app.core.execution import execute_query
+
+ITEMS_SCHEMA = {
+    "db": "main",
+    "tables": ["items"],
+    "columns": {"items": [
+        {"name": "id", "nullable": "NO"},
+        {"name": "name", "nullable": "NO"},
+        {"name": "grp", "nullable": "YES"},
+    ]},
+    "primary_keys": {"items": ["id"]},
+    "indexes": {"items": []},
+    "foreign_keys": [],
+}
+
+
+class StubCatalog:
+    def __init__(self, schema):
+        self.schema = schema
+        self.calls = 0
+
+    def get(self, uri):
+        self.calls += 1
+        return SimpleNamespace(schema=self.schema)
+
+
+@pytest.fixture
+def stub_catalog(monkeypatch):
+    catalog = StubCatalog(ITEMS_SCHEMA)
+    monkeypatch.setattr(pagination, "catalog", catalog)
+    monkeypatch.setattr(settings, "SELECT_LIMIT_CAP", 10)
+    return catalog
+
+
+def _all_pages(uri, query, key="id", **kwargs):
+    out = execute_query(query, db_uri=uri, **kwargs)
+    pages = [out]
+    while "next_cursor" in pages[-1]:
+        pages.append(pagination.fetch_next(pages[-1]["next_cursor"]))
+    rows = [r[key] for p in pages for r in p["rows"]]
+    return pages, rows
+
+
+def test_pages_by_primary_key(sqlite_uri, stub_catalog):
+    pages, ids = _all_pages(sqlite_uri, "SELECT * FROM items ORDER BY id DESC")
+    assert [p["row_count"] for p in pages] == [10, 10, 5]
+    assert pages[0]["pagination"] == "keyset"
+    assert ids == list(range(25, 0, -1))
+
+
+def test_ties_get_a_key_tiebreaker_and_never_repeat(sqlite_uri, stub_catalog):
+    pages, ids = _all_pages(sqlite_uri, "SELECT id, grp FROM items ORDER BY grp")
+    expected = sorted(range(1, 26), key=lambda i: (i % 3, i))
+    assert ids == expected
+    assert len(pages) == 3
+
+
+@pytest.mark.parametrize("comment", ["-- by group", "# by group", "/* by group */"])
+def test_tiebreaker_is_not_swallowed_by_a_trailing_comment(sqlite_uri, stub_catalog, comment):
+    assert pagination.extend_order_by(f"SELECT id FROM t ORDER BY grp {comment}", "t.id") == f"SELECT id FROM t ORDER BY grp, t.id {comment}"
+    assert pagination.extend_order_by(f"SELECT id FROM t ORDER BY grp LIMIT 5; {comment}", "t.id") == f"SELECT id FROM t ORDER BY grp, t.id LIMIT 5 {comment}"
+    if comment.startswith("#"):
+        return  # MySQL-only comment syntax; SQLite rejects it
+    pages, ids = _all_pages(sqlite_uri, f"SELECT id, grp FROM items ORDER BY grp {comment}")
+    assert ids == sorted(range(1, 26), key=lambda i: (i % 3, i))
+
+
+def test_nullable_order_column_descending(sqlite_uri, stub_catalog):
+    conn = sqlite3.connect(sqlite_uri.removeprefix("sqlite:///"))
+    conn.execute("UPDATE items SET grp = NULL WHERE id % 4 = 0")
+    conn.commit()
+    conn.close()
+    _, ids = _all_pages(sqlite_uri, "SELECT id, grp AS g FROM items ORDER BY grp DESC, id")
+    grp = {i: (None if i % 4 == 0 else i % 3) for i in range(1, 26)}
+    # NULLs sort last descending, ties by id ascending
+    expected = sorted(range(1, 26), key=lambda i: (grp[i] is None, -(grp[i] or 0), i))
+    assert ids == expected
+
+
+def test_user_limit_above_cap_is_honoured(sqlite_uri, stub_catalog):
+    pages, ids = _all_pages(sqlite_uri, "SELECT id FROM items ORDER BY id LIMIT 15")
+    assert ids == list(range(1, 16))
+    assert "next_cursor" not in pages[-1]
+
+
+def test_columns_format_pages(sqlite_uri, stub_catalog):
+    first = execute_query("SELECT id, name FROM items ORDER BY name", db_uri=sqlite_uri, result_format="columns")
+    second = pagination.fetch_next(first["next_cursor"])
+    assert first["data"][0] + second["data"][0] == list(range(1, 21))
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM items",  # unordered
+    "SELECT name FROM items ORDER BY grp",  # key not returned, so no tiebreaker
+    "SELECT grp, COUNT(*) AS n FROM items GROUP BY grp ORDER BY grp",
+    "SELECT id FROM items ORDER BY LOWER(name)",
+])
+def test_no_cursor_without_a_total_order(sqlite_uri, stub_catalog, query):
+    out = execute_query(query, db_uri=sqlite_uri)
+    assert "next_cursor" not in out
+
+
+def test_no_cursor_when_the_catalog_has_no_key(sqlite_uri, stub_catalog):
+    stub_catalog.schema = {**ITEMS_SCHEMA, "primary_keys": {}}
+    out = execute_query("SELECT * FROM items ORDER BY grp", db_uri=sqlite_uri)
+    assert out["row_count"] == 10
+    assert "next_cursor" not in out
+
+
+def test_limits_within_the_cap_skip_the_catalog(sqlite_uri, stub_catalog):
+    execute_query("SELECT * FROM items ORDER BY grp LIMIT 5", db_uri=sqlite_uri)
+    assert stub_catalog.calls == 0
+
+
+def test_closed_cursor_is_gone(sqlite_uri, stub_catalog):
+    out = execute_query("SELECT * FROM items ORDER BY id", db_uri=sqlite_uri)
+    assert pagination.close_cursor(out["next_cursor"])
+    assert pagination.fetch_next(out["next_cursor"])["error_type"] == "cursor_expired"
+
+
+def test_unique_keys_come_from_the_catalog(stub_catalog):
+    stub_catalog.schema = {
+        **ITEMS_SCHEMA,
+        "indexes": {"items": [
+            {"name": "uq_name", "columns": ["name"], "unique": True},
+            {"name": "uq_grp", "columns": ["grp"], "unique": True},  # nullable: not a key
+        ]},
+    }
+    table = pagination.parse_sql("SELECT * FROM ITEMS ORDER BY id").args["from"].this
+    assert pagination._unique_keys("uri", table) == ("id", "name")
+
+
+def test_next_endpoint(sqlite_uri, stub_catalog):
+    from fastapi.testclient import TestClient
+    from fastapi_app.main import app
+
+    with TestClient(app) as client:
+        first = client.post("/execute/", json={"query": "SELECT id FROM items ORDER BY id", "db_uri": sqlite_uri}).json()
+        second = client.post("/execute/next", json={"cursor": first["next_cursor"]}).json()
+        assert client.delete(f"/execute/cursor/{second['next_cursor']}").json() == {"closed": True}
+    assert [r["id"] for r in second["rows"]] == list(range(11, 21))
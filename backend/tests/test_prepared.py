@@ -0,0 +1,83 @@
+import pytest
+
+from fastapi_app.core import prepared
+from fastapi_app.core.config import settings
+
+
+class UnknownStatement(Exception):
+    def __init__(self):
+        super().__init__()
+        self.orig = type("Orig", (), {"args": (prepared.UNKNOWN_STATEMENT_ERROR, "Unknown prepared statement")})()
+
+
+class FakeMySQLConn:
+    class dialect:
+        name = "mysql"
+
+    def __init__(self):
+        self.info = {}
+        self.sent = []
+        self.lose_next_execute = False
+
+    def exec_driver_sql(self, sql, params=None):
+        self.sent.append((sql, params))
+        if sql.startswith("EXECUTE") and self.lose_next_execute:
+            self.lose_next_execute = False
+            raise UnknownStatement()
+        return sql
+
+    def execute(self, clause, params=None):
+        self.sent.append((str(clause), params))
+        return str(clause)
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(settings, "PREPARED_STATEMENTS", True)
+
+
+def test_disabled_by_default_binds_in_one_round_trip():
+    assert settings.PREPARED_STATEMENTS is False
+    conn = FakeMySQLConn()
+    prepared.execute(conn, "SELECT * FROM t WHERE a = :a", {"a": 1})
+    assert conn.sent == [("SELECT * FROM t WHERE a = :a", {"a": 1})]
+
+
+def test_template_is_prepared_once_per_connection(enabled):
+    conn = FakeMySQLConn()
+    prepared.execute(conn, "SELECT * FROM t WHERE a = :a AND b = :b", {"a": 1, "b": "x"})
+    prepared.execute(conn, "SELECT * FROM t WHERE a = :a AND b = :b", {"a": 2, "b": "y"})
+    kinds = [sql.split()[0] for sql, _ in conn.sent]
+    assert kinds == ["SET", "PREPARE", "EXECUTE", "SET", "EXECUTE"]
+    assert conn.sent[3] == ("SET @twdb_p0 = %s, @twdb_p1 = %s", (2, "y"))
+    assert conn.sent[4][0].endswith("USING @twdb_p0, @twdb_p1")
+
+
+def test_lost_statement_is_prepared_again(enabled):
+    conn = FakeMySQLConn()
+    prepared.execute(conn, "SELECT * FROM t WHERE a = :a", {"a": 1})
+    conn.lose_next_execute = True
+    prepared.execute(conn, "SELECT * FROM t WHERE a = :a", {"a": 2})
+    kinds = [sql.split()[0] for sql, _ in conn.sent[3:]]
+    assert kinds == ["SET", "EXECUTE", "PREPARE", "EXECUTE"]
+
+
+def test_cache_is_bounded_per_connection(enabled, monkeypatch):
+    monkeypatch.setattr(settings, "PREPARED_STATEMENT_CACHE_SIZE", 1)
+    conn = FakeMySQLConn()
+    prepared.execute(conn, "SELECT * FROM t WHERE a = :a", {"a": 1})
+    prepared.execute(conn, "SELECT * FROM u WHERE a = :a", {"a": 1})
+    assert any(sql.startswith("DEALLOCATE PREPARE") for sql, _ in conn.sent)
+    assert len(conn.info[prepared._INFO_KEY]) == 1
+
+
+def test_missing_value_is_an_error(enabled):
+    with pytest.raises(ValueError, match="'b'"):
+        prepared.execute(FakeMySQLConn(), "SELECT * FROM t WHERE a = :a AND b = :b", {"a": 1})
+
+
+def test_sqlite_binds_through_text(sqlite_uri, enabled):
+    from fastapi_app.core.execution import execute_query
+
+    out = execute_query("SELECT name FROM items WHERE id = :id", db_uri=sqlite_uri, params={"id": 3})
+    assert out["rows"] == [{"name": "item03"}]
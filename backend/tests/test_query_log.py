@@ -0,0 +1,62 @@
+from fastapi_app.core import query_log as ql
+from fastapi_app.core.config import settings
+from fastapi_app.core.query_log import QueryLogSink
+
+
+class FakeCollection:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    def insert_many(self, docs, ordered=True):
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.batches.append(list(docs))
+
+
+class FakeClient:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get_default_database(self, default=None):
+        return {settings.QUERY_LOG_COLLECTION: self.collection}
+
+
+def _sink(monkeypatch, collection, **kwargs):
+    monkeypatch.setattr(settings, "MONGO_URI", "mongodb://logs")
+    monkeypatch.setattr(ql, "get_mongo_client", lambda uri: FakeClient(collection))
+    return QueryLogSink(**{"max_queue": 100, "batch_size": 10, "flush_interval": 5.0, **kwargs})
+
+
+def test_documents_are_written_in_batches(monkeypatch):
+    collection = FakeCollection()
+    sink = _sink(monkeypatch, collection)
+    for i in range(25):
+        assert sink.submit({"i": i})
+    sink.flush()
+    assert [len(b) for b in collection.batches] == [10, 10, 5]
+    assert [d["i"] for b in collection.batches for d in b] == list(range(25))
+    assert sink.stats()["written"] == 25
+    assert sink.stats()["batches"] == 3
+
+
+def test_full_queue_drops_without_blocking(monkeypatch):
+    sink = _sink(monkeypatch, FakeCollection(), max_queue=1)
+    monkeypatch.setattr(sink, "_ensure_worker", lambda: None)  # nothing drains the queue
+    assert sink.submit({"i": 1})
+    assert not sink.submit({"i": 2})
+    assert sink.stats()["dropped"] == 1
+
+
+def test_write_failures_are_counted(monkeypatch):
+    sink = _sink(monkeypatch, FakeCollection(fail=True))
+    sink.submit({"i": 1})
+    sink.flush()
+    assert sink.stats()["failed"] == 1
+    assert sink.stats()["written"] == 0
+
+
+def test_nothing_is_queued_without_mongo_uri():
+    sink = QueryLogSink(max_queue=10, batch_size=10, flush_interval=0.1)
+    assert not sink.submit({"i": 1})
+    assert sink.stats()["enqueued"] == 0
@@ -0,0 +1,91 @@
+from fastapi_app.core.execution import execute_query
+from fastapi_app.core.result_cache import cache_key, lookup, record, result_cache
+from fastapi_app.core.sql_ast import parse_sql
+
+URI = "mysql+pymysql://u@db/app"
+OTHER = "mysql+pymysql://u@db/other"
+
+
+def _store(query, uri=URI, params=None, result_format="rows"):
+    return record(uri, query, result_format, {"rows": [{"x": 1}], "row_count": 1}, params)
+
+
+def test_key_normalizes_statement_text():
+    assert cache_key(URI, "select  *   from t where a = 1", "rows") == cache_key(URI, "SELECT * FROM t WHERE a = 1", "rows")
+
+
+def test_key_keeps_column_labels_apart():
+    # Same fingerprint, different result column names
+    assert cache_key(URI, "select count(*) from t", "rows") != cache_key(URI, "select COUNT(*) from t", "rows")
+    assert cache_key(URI, "select ifnull(a,0) from t", "rows") != cache_key(URI, "select coalesce(a,0) from t", "rows")
+    assert cache_key(URI, "select a, count(*) n from t group by a", "rows") == cache_key(URI, "SELECT a, count(*) n FROM t GROUP BY a", "rows")
+
+
+def test_cache_hit_keeps_the_callers_column_names(sqlite_uri):
+    assert execute_query("select count(*) from items", db_uri=sqlite_uri)["rows"] == [{"count(*)": 25}]
+    out = execute_query("select COUNT(*) from items", db_uri=sqlite_uri)
+    assert out["rows"] == [{"COUNT(*)": 25}]
+    assert out["cache"]["hit"] is False
+
+
+def test_key_separates_uri_params_and_format():
+    base = cache_key(URI, "SELECT * FROM t WHERE a = :a", "rows", {"a": 1})
+    assert cache_key(OTHER, "SELECT * FROM t WHERE a = :a", "rows", {"a": 1}) != base
+    assert cache_key(URI, "SELECT * FROM t WHERE a = :a", "rows", {"a": 2}) != base
+    assert cache_key(URI, "SELECT * FROM t WHERE a = :a", "columns", {"a": 1}) != base
+    assert cache_key(URI, "SELECT * FROM t WHERE a = :a", "rows", {"a": 1}) == base
+
+
+def test_lookup_hits_only_the_same_key():
+    _store("SELECT * FROM t WHERE a = :a", params={"a": 1})
+    assert lookup(URI, "SELECT * FROM t WHERE a = :a", "rows", {"a": 1})["cache"]["hit"] is True
+    assert lookup(URI, "SELECT * FROM t WHERE a = :a", "rows", {"a": 2}) is None
+    assert lookup(URI, "SELECT * FROM t WHERE a = :a", "columns", {"a": 1}) is None
+    assert lookup(OTHER, "SELECT * FROM t WHERE a = :a", "rows", {"a": 1}) is None
+
+
+def test_volatile_queries_are_not_cached():
+    _store("SELECT NOW() AS ts FROM t")
+    assert lookup(URI, "SELECT NOW() AS ts FROM t", "rows") is None
+
+
+def test_write_invalidates_only_tables_it_touches():
+    _store("SELECT * FROM t")
+    _store("SELECT * FROM u")
+    _store("SELECT * FROM t JOIN u ON t.id = u.id")
+    _store("SELECT * FROM t", uri=OTHER)
+    out = record(URI, "UPDATE t SET a = 2 WHERE id = 1", "rows", {"row_count": 1})
+    assert out["cache"]["invalidated"] == 2
+    assert lookup(URI, "SELECT * FROM t", "rows") is None
+    assert lookup(URI, "SELECT * FROM t JOIN u ON t.id = u.id", "rows") is None
+    assert lookup(URI, "SELECT * FROM u", "rows") is not None
+    assert lookup(OTHER, "SELECT * FROM t", "rows") is not None
+
+
+def test_unparseable_statement_invalidates_everything_for_the_uri():
+    _store("SELECT * FROM t")
+    _store("SELECT * FROM u")
+    _store("SELECT * FROM t", uri=OTHER)
+    assert parse_sql("HANDLER t READ FIRST") is None
+    out = record(URI, "HANDLER t READ FIRST", "rows", {"row_count": 0})
+    assert out["cache"]["invalidated"] == 2
+    assert lookup(URI, "SELECT * FROM u", "rows") is None
+    assert lookup(OTHER, "SELECT * FROM t", "rows") is not None
+
+
+def test_command_statement_invalidates_everything_for_the_uri():
+    _store("SELECT * FROM t")
+    _store("SELECT * FROM u")
+    out = record(URI, "CALL refresh_totals()", "rows", {"row_count": 0})
+    assert out["cache"]["invalidated"] == 2
+    assert result_cache.stats()["entries"] == 0
+
+
+def test_execute_query_serves_cache_until_a_write(sqlite_uri):
+    first = execute_query("SELECT name FROM items WHERE id = 1", db_uri=sqlite_uri)
+    assert first["cache"]["hit"] is False
+    assert execute_query("select name from items where id = 1", db_uri=sqlite_uri)["cache"]["hit"] is True
+    execute_query("UPDATE items SET name = 'renamed' WHERE id = 1", db_uri=sqlite_uri)
+    after = execute_query("SELECT name FROM items WHERE id = 1", db_uri=sqlite_uri)
+    assert after["cache"]["hit"] is False
+    assert after["rows"] == [{"name": "renamed"}]
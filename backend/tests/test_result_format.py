@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+from fastapi_app.core.result_format import arrow_available, documents_to_columnar, rows_to_columnar
+from fastapi_app.main import app
+
+
+def test_rows_to_columnar_transposes_and_keeps_empty_columns():
+    assert rows_to_columnar(["a", "b"], [(1, "x"), (2, "y")]) == {"columns": ["a", "b"], "data": [[1, 2], ["x", "y"]]}
+    assert rows_to_columnar(["a", "b"], []) == {"columns": ["a", "b"], "data": [[], []]}
+
+
+def test_documents_to_columnar_fills_missing_keys():
+    out = documents_to_columnar([{"a": 1}, {"b": 2, "a": 3}])
+    assert out == {"columns": ["a", "b"], "data": [[1, 3], [None, 2]]}
+
+
+def test_execute_columns_format(sqlite_uri):
+    with TestClient(app) as client:
+        body = client.post("/execute/", json={
+            "query": "SELECT id, grp FROM items WHERE id <= 3 ORDER BY id",
+            "db_uri": sqlite_uri, "result_format": "columns",
+        }).json()
+    assert body["format"] == "columns"
+    assert body["columns"] == ["id", "grp"]
+    assert body["data"] == [[1, 2, 3], [1, 2, 0]]
+    assert body["row_count"] == 3
+
+
+def test_execute_arrow_format(sqlite_uri):
+    with TestClient(app) as client:
+        resp = client.post("/execute/", json={
+            "query": "SELECT id FROM items WHERE id <= 3", "db_uri": sqlite_uri, "result_format": "arrow",
+        })
+    if arrow_available():
+        assert resp.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        assert resp.headers["x-row-count"] == "3"
+    else:
+        assert resp.status_code == 400
+        assert resp.json()["error_type"] == "unsupported_format"
+    assert "server-timing" in resp.headers
@@ -0,0 +1,71 @@
+import datetime
+import decimal
+
+from fastapi_app.core import result_handles
+from fastapi_app.core.config import settings
+from fastapi_app.core.result_handles import ResultHandle, fetch, materialize, resident_bytes
+
+
+def _handle(rows):
+    handle = ResultHandle(columns=["id", "value"], expires=0.0)
+    handle.append(rows)
+    return handle
+
+
+def test_small_results_stay_in_memory(sqlite_uri):
+    page = materialize("SELECT id, name FROM items ORDER BY id", db_uri=sqlite_uri, page_size=5)
+    assert page["spilled"] is False
+    assert page["total_rows"] == 25
+    assert [r["id"] for r in page["rows"]] == [1, 2, 3, 4, 5]
+    assert resident_bytes() > 0
+    assert result_handles.close_handle(page["handle"]) is True
+    assert resident_bytes() == 0
+
+
+def test_budget_is_shared_across_handles(sqlite_uri, monkeypatch):
+    first = materialize("SELECT id, name FROM items ORDER BY id", db_uri=sqlite_uri)
+    one = resident_bytes()
+    # Room for one handle's rows but not two
+    monkeypatch.setattr(settings, "RESULT_HANDLE_SPILL_BYTES", one + one // 2)
+    second = materialize("SELECT id, name FROM items WHERE id <= 20 ORDER BY id", db_uri=sqlite_uri)
+    assert second["spilled"] is False
+    assert resident_bytes() <= settings.RESULT_HANDLE_SPILL_BYTES
+
+    # The larger, older handle was moved to disk and still reads back the same rows
+    page = fetch(first["handle"], offset=20, limit=5, sort="id", descending=True)
+    assert page["spilled"] is True
+    assert [r["id"] for r in page["rows"]] == [5, 4, 3, 2, 1]
+    assert fetch(second["handle"], offset=18)["rows"] == [{"id": 19, "name": "item19"}, {"id": 20, "name": "item20"}]
+
+
+def test_a_handle_over_the_budget_spills_itself(sqlite_uri, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_HANDLE_SPILL_BYTES", 1)
+    page = materialize("SELECT id, name FROM items ORDER BY id", db_uri=sqlite_uri, page_size=3)
+    assert page["spilled"] is True
+    assert page["rows"] == [{"id": 1, "name": "item01"}, {"id": 2, "name": "item02"}, {"id": 3, "name": "item03"}]
+    assert resident_bytes() == 0
+
+
+def test_object_columns_are_spilled_as_json():
+    when = datetime.datetime(2024, 5, 1, 12, 30)
+    huge = 2 ** 70
+    handle = _handle([(1, decimal.Decimal("2.50")), (2, when), (3, b"raw"), (4, huge), (5, None)])
+    handle.spill()
+    handle.finish()
+    try:
+        data = handle.mapped()[:]
+        assert b"\x80\x04" not in data and b"\x80\x05" not in data  # no pickle frames
+        assert handle.fetch(0, 5)[1] == [2.5, "2024-05-01T12:30:00", "raw", huge, None]
+    finally:
+        handle.close()
+
+
+def test_spilling_a_sealed_handle_remaps_it():
+    handle = _handle([(1, "a"), (2, "b")])
+    handle.finish()
+    handle.spill()
+    try:
+        assert handle.spilled
+        assert handle.fetch(0, 2, sort_column=1, descending=True) == [[2, 1], ["b", "a"]]
+    finally:
+        handle.close()
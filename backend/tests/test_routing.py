@@ -0,0 +1,61 @@
+import shutil
+
+import pytest
+
+from fastapi_app.core import routing
+from fastapi_app.core.config import settings
+from fastapi_app.core.execution import execute_query
+from fastapi_app.core.routing import ReplicaRouter, requires_primary
+
+
+@pytest.fixture
+def replica_router(sqlite_uri, tmp_path, monkeypatch):
+    replica_path = tmp_path / "replica.db"
+    shutil.copy(sqlite_uri.removeprefix("sqlite:///"), replica_path)
+    router = ReplicaRouter(sqlite_uri, [f"sqlite:///{replica_path}"])
+    monkeypatch.setattr(router, "_ensure_monitor", lambda: None)
+    monkeypatch.setattr(routing, "router", router)
+    return router
+
+
+@pytest.mark.parametrize("query, primary", [
+    ("SELECT * FROM items", False),
+    ("SELECT * FROM items FOR UPDATE", True),
+    ("UPDATE items SET grp = 1", True),
+    ("SELECT id INTO @x FROM items LIMIT 1", True),
+])
+def test_requires_primary(query, primary):
+    assert requires_primary(query) is primary
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(sqlite_uri, replica_router):
+    assert execute_query("SELECT COUNT(*) AS n FROM items", db_uri=sqlite_uri)["route"] == "replica-0"
+    assert execute_query("UPDATE items SET grp = 9 WHERE id = 1", db_uri=sqlite_uri)["route"] == "primary"
+    assert execute_query("SELECT grp FROM items WHERE id = 1", db_uri=sqlite_uri, use_primary=True)["rows"] == [{"grp": 9}]
+    assert replica_router.replicas[0].in_flight == 0
+
+
+def test_unreachable_replica_falls_back_to_the_primary(sqlite_uri, tmp_path, monkeypatch):
+    router = ReplicaRouter(sqlite_uri, [f"sqlite:///{tmp_path}/missing/dir/replica.db"])
+    monkeypatch.setattr(router, "_ensure_monitor", lambda: None)
+    monkeypatch.setattr(routing, "router", router)
+    out = execute_query("SELECT COUNT(*) AS n FROM items", db_uri=sqlite_uri)
+    assert out["rows"] == [{"n": 25}]
+    assert out["route"] == "primary"
+    assert router.replicas[0].healthy is False
+    assert router.stats()["fallbacks"] == 1
+
+
+def test_lagging_replica_is_skipped(sqlite_uri, replica_router, monkeypatch):
+    monkeypatch.setattr(settings, "DB_REPLICA_MAX_LAG_SECONDS", 5)
+    replica_router.replicas[0].lag_seconds = 30
+    assert replica_router.route(sqlite_uri, "SELECT 1").name == "primary"
+    replica_router.replicas[0].lag_seconds = 1
+    assert replica_router.route(sqlite_uri, "SELECT 1").name == "replica-0"
+
+
+def test_probe_restores_a_replica(replica_router):
+    replica = replica_router.replicas[0]
+    replica.healthy = False
+    replica_router.probe(replica)
+    assert replica.healthy is True and replica.lag_seconds == 0.0
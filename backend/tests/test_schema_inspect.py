@@ -0,0 +1,80 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from fastapi_app.core.schema_catalog import CatalogEntry, SchemaVersionNotFound
+from fastapi_app.main import app
+from fastapi_app.routers import schema as schema_router
+
+URI = "mysql+pymysql://app:secret@db/app"
+
+
+class StubCatalog:
+    def __init__(self):
+        self.version = "v1"
+        self.uris = []
+
+    def _entry(self, uri):
+        return CatalogEntry(uri, self.version, {"db": "app", "tables": ["t"]}, (), None, 0.0)
+
+    def get(self, uri, refresh=False):
+        self.uris.append(uri)
+        return self._entry(uri)
+
+    def resolve(self, version):
+        if version not in ("v0", "v1"):
+            raise SchemaVersionNotFound(version)
+        return self._entry(URI)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    stub = StubCatalog()
+    monkeypatch.setattr(schema_router, "catalog", stub)
+    monkeypatch.setattr(schema_router.column_stats, "request", lambda uri: None)
+    monkeypatch.setenv("DB_TYPE", "mysql")
+    monkeypatch.setenv("DB_URI", URI)
+    with TestClient(app) as c:
+        c.stub = stub
+        yield c
+
+
+def test_get_returns_etag_then_304(client):
+    first = client.get("/schema/inspect")
+    assert first.status_code == 200
+    assert first.headers["ETag"] == '"v1"'
+    assert first.json()["schema_version"] == "v1"
+
+    again = client.get("/schema/inspect", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+
+    client.stub.version = "v2"
+    changed = client.get("/schema/inspect", headers={"If-None-Match": '"v1"'})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] == '"v2"'
+
+
+def test_get_identifies_the_database_by_schema_version(client):
+    res = client.get("/schema/inspect", params={"schema_version": "v0"}, headers={"If-None-Match": '"v1"'})
+    assert res.status_code == 304
+    assert client.stub.uris == [URI]
+    assert client.get("/schema/inspect", params={"schema_version": "gone"}).json()["error_type"] == "schema_version_not_found"
+
+
+def test_get_ignores_a_connection_string_in_the_query(client):
+    client.get("/schema/inspect", params={"db_uri": "mysql+pymysql://other:pw@elsewhere/x"})
+    assert client.stub.uris == [URI]
+
+
+def test_post_honours_if_none_match(client):
+    body = {"db_type": "mysql", "db_uri": URI}
+    first = client.post("/schema/inspect", json=body)
+    assert first.status_code == 200 and first.headers["ETag"] == '"v1"'
+    assert client.post("/schema/inspect", json=body, headers={"If-None-Match": '"v1"'}).status_code == 304
+
+
+def test_stats_resolve_the_database_without_a_connection_string(client, monkeypatch):
+    monkeypatch.setattr(schema_router.settings, "COLUMN_STATS_ENABLED", False)
+    res = client.get("/schema/stats", params={"db_uri": "mysql+pymysql://other:pw@elsewhere/x"}).json()
+    assert res == {"schema_version": "v1", "status": "disabled"}
+    assert client.stub.uris == [URI]
@@ -0,0 +1,70 @@
+import pytest
+
+from fastapi_app.core import schema_selector
+from fastapi_app.core.config import settings
+from fastapi_app.core.schema_selector import select_schema, tokens
+
+SCHEMA = {
+    "tables": ["audit_log", "customers", "order_items", "orders", "products", "app_settings"],
+    "columns": {
+        "audit_log": ["id", "actor", "action", "created_at"],
+        "customers": ["id", "name", "email", "country"],
+        "order_items": ["id", "order_id", "product_id", "quantity", "unit_price"],
+        "orders": ["id", "customer_id", "status", "created_at"],
+        "products": ["id", "title", "category"],
+        "app_settings": ["key", "value"],
+    },
+    "primary_keys": {t: ["id"] for t in ("audit_log", "customers", "order_items", "orders", "products")},
+    "foreign_keys": [
+        {"from_table": "orders", "from_column": "customer_id", "to_table": "customers", "to_column": "id"},
+        {"from_table": "order_items", "from_column": "order_id", "to_table": "orders", "to_column": "id"},
+        {"from_table": "order_items", "from_column": "product_id", "to_table": "products", "to_column": "id"},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def lexical_only(monkeypatch):
+    # Scores from identifier overlap only, whether or not sentence-transformers is installed
+    monkeypatch.setattr(schema_selector, "embedding_model", lambda: None)
+
+
+def test_tokens_split_identifiers_and_singularise():
+    assert tokens("orderItems unit_price categories") == {"order", "item", "unit", "price", "category"}
+    assert tokens("show all the customers") == {"customer"}
+
+
+def test_picks_named_tables_and_bridges_them():
+    selection = select_schema("which products did each customer buy", SCHEMA, top_k=2)
+    assert selection.tables[:2] == ["customers", "products"]
+    assert selection.bridges == ["order_items", "orders"]
+    assert "audit_log" not in selection.tables and selection.pruned
+    conditions = {e["condition"] for e in selection.join_path}
+    assert conditions == {
+        "orders.customer_id = customers.id",
+        "order_items.order_id = orders.id",
+        "order_items.product_id = products.id",
+    }
+    rendered = selection.render()
+    assert "Table customers(id, name, email, country)" in rendered
+    assert "FK " not in rendered  # every FK between the selected tables is on the join path
+    assert rendered.splitlines()[-1].startswith("Join path: ")
+
+
+def test_top_k_and_token_budget():
+    # A table whose name and columns both match ranks first
+    assert list(select_schema("customers orders products", SCHEMA, top_k=1).scores) == ["orders"]
+    tight = select_schema("customers orders products audit log", SCHEMA, token_budget=12)
+    assert len(tight.tables) < 4
+
+
+def test_wide_tables_keep_keys_and_matching_columns(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEMA_PROMPT_MAX_COLUMNS", 3)
+    selection = select_schema("order item quantity", SCHEMA)
+    # Keys are always kept; unit_price is the one column neither a key nor in the question
+    assert selection.columns["order_items"] == ["id", "order_id", "product_id", "quantity"]
+
+
+def test_unmatched_question_keeps_catalog_order():
+    selection = select_schema("zzz", SCHEMA, top_k=2)
+    assert selection.tables[:2] == ["audit_log", "customers"]
@@ -0,0 +1,77 @@
+import pytest
+
+from fastapi_app.core import sql_ast
+from fastapi_app.core.config import settings
+from fastapi_app.core.execution import execute_query
+from fastapi_app.core.sql_ast import enforce_limit, parameterize, positional
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("SELECT a FROM t", "SELECT a FROM t LIMIT 100"),
+    ("SELECT a FROM t;", "SELECT a FROM t LIMIT 100"),
+    ("SELECT a FROM t LIMIT 5", "SELECT a FROM t LIMIT 5"),
+    ("SELECT a FROM t LIMIT 5000", "SELECT a FROM t LIMIT 100"),
+    ("SELECT a FROM t LIMIT 10, 5000", "SELECT a FROM t LIMIT 10, 100"),
+    ("SELECT a FROM t LIMIT 5000 OFFSET 3", "SELECT a FROM t LIMIT 100 OFFSET 3"),
+    ("SELECT a FROM t FOR UPDATE", "SELECT a FROM t LIMIT 100 FOR UPDATE"),
+    ("SELECT a FROM (SELECT a FROM t LIMIT 5) x", "SELECT a FROM (SELECT a FROM t LIMIT 5) x LIMIT 100"),
+    ("(SELECT a FROM t) UNION (SELECT b FROM u)", "(SELECT a FROM t) UNION (SELECT b FROM u) LIMIT 100"),
+    ("SELECT a FROM t LIMIT :n", "SELECT * FROM (SELECT a FROM t LIMIT :n) AS _capped LIMIT 100"),
+    ("UPDATE t SET a = 1 WHERE id = 2", "UPDATE t SET a = 1 WHERE id = 2"),
+])
+def test_enforce_limit(query, expected):
+    assert enforce_limit(query, 100) == expected
+
+
+@pytest.mark.parametrize("comment", ["-- all rows", "# all rows", "/* all rows */"])
+def test_limit_goes_before_a_trailing_comment(comment):
+    assert enforce_limit(f"SELECT a FROM t {comment}", 100) == f"SELECT a FROM t LIMIT 100 {comment}"
+    assert enforce_limit(f"SELECT a FROM t; {comment}", 100) == f"SELECT a FROM t LIMIT 100 {comment}"
+    assert enforce_limit(f"SELECT a FROM t LIMIT 5000 {comment}", 100) == f"SELECT a FROM t LIMIT 100 {comment}"
+    assert enforce_limit(f"SELECT a FROM t LIMIT :n {comment}", 100) == f"SELECT * FROM (SELECT a FROM t LIMIT :n) AS _capped LIMIT 100 {comment}"
+
+
+def test_trailing_comment_does_not_lift_the_cap(sqlite_uri, monkeypatch):
+    monkeypatch.setattr(settings, "SELECT_LIMIT_CAP", 1)
+    monkeypatch.setattr(settings, "PAGINATION_ENABLED", False)
+    assert execute_query("SELECT id FROM items -- all rows", db_uri=sqlite_uri)["row_count"] == 1
+
+
+def test_unparseable_select_is_judged_from_its_tokens():
+    # "limit" inside a literal used to make the text check think the query was already bounded;
+    # a derived-table wrap would fail on the duplicate id columns
+    query = "SELECT STRAIGHT_JOIN t.id, u.id FROM t JOIN u ON t.id = u.id WHERE t.note = 'over the limit'"
+    assert sql_ast.parse_sql(query) is None
+    assert enforce_limit(query, 100) == f"{query} LIMIT 100"
+    assert enforce_limit(f"{query} LIMIT 5", 100) == f"{query} LIMIT 5"
+    assert enforce_limit(f"{query} LIMIT 500 -- c", 100) == f"{query} LIMIT 100 -- c"
+    assert enforce_limit(f"{query} FOR UPDATE", 100) == f"{query} LIMIT 100 FOR UPDATE"
+
+
+def test_literal_variants_share_one_cap_decision(monkeypatch):
+    parses = []
+    real_parse = sql_ast.parse_sql
+    monkeypatch.setattr(sql_ast, "parse_sql", lambda q, d="mysql": parses.append(q) or real_parse(q, d))
+    assert enforce_limit("SELECT a FROM shape_t WHERE b = 1 AND c = 'x'", 100).endswith("LIMIT 100")
+    assert enforce_limit("SELECT a FROM shape_t WHERE b = 2 AND c = 'y'", 100) == "SELECT a FROM shape_t WHERE b = 2 AND c = 'y' LIMIT 100"
+    assert len(parses) == 1
+
+
+def test_outer_limit_value_is_part_of_the_shape():
+    assert enforce_limit("SELECT a FROM shape_u LIMIT 50", 100) == "SELECT a FROM shape_u LIMIT 50"
+    assert enforce_limit("SELECT a FROM shape_u LIMIT 500", 100) == "SELECT a FROM shape_u LIMIT 100"
+
+
+def test_execute_query_caps_rows(sqlite_uri, monkeypatch):
+    monkeypatch.setattr(settings, "SELECT_LIMIT_CAP", 10)
+    monkeypatch.setattr(settings, "PAGINATION_ENABLED", False)
+    assert execute_query("SELECT id FROM items", db_uri=sqlite_uri)["row_count"] == 10
+    assert execute_query("SELECT id FROM items LIMIT 3", db_uri=sqlite_uri)["row_count"] == 3
+
+
+def test_parameterize_lifts_filter_literals_only():
+    template, params = parameterize("SELECT a FROM t WHERE b = 5 AND c = 'x' LIMIT 10")
+    assert params == {"_p0": 5, "_p1": "x"}
+    assert "LIMIT 10" in template
+    statement, names = positional(template)
+    assert statement.count("?") == 2 and names == ("_p0", "_p1")
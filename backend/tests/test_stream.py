@@ -0,0 +1,57 @@
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from fastapi_app.core.admission import sql_admission
+from fastapi_app.main import app
+from fastapi_app.routers.execute import _SerializedChunks
+
+
+def test_stream_ndjson_rows_and_releases_slot(sqlite_uri):
+    with TestClient(app) as client:
+        resp = client.post("/execute/stream", json={
+            "query": "SELECT id, name FROM items ORDER BY id", "db_uri": sqlite_uri, "chunk_size": 7,
+        })
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert resp.status_code == 200
+    assert [r["id"] for r in lines] == list(range(1, 26))
+    assert sql_admission.in_use == 0
+
+
+def test_stream_json_document(sqlite_uri):
+    with TestClient(app) as client:
+        resp = client.post("/execute/stream", json={
+            "query": "SELECT id FROM items WHERE id <= 3 ORDER BY id", "db_uri": sqlite_uri, "format": "json",
+        })
+    body = resp.json()
+    assert body["columns"] == ["id"]
+    assert body["rows"] == [{"id": 1}, {"id": 2}, {"id": 3}]
+    assert body["row_count"] == 3
+
+
+def test_close_waits_for_next_in_another_thread():
+    entered = threading.Event()
+    finalized = []
+
+    def chunks():
+        try:
+            yield {"columns": ["x"]}
+            entered.set()
+            time.sleep(0.2)
+            yield {"rows": [{"x": 1}]}
+        finally:
+            finalized.append(True)
+
+    stream = _SerializedChunks(chunks())
+    assert next(stream) == {"columns": ["x"]}
+    got = []
+    reader = threading.Thread(target=lambda: got.append(next(stream)))
+    reader.start()
+    entered.wait(1)
+    stream.close()  # would raise "generator already executing" without the lock
+    reader.join(1)
+    assert got == [{"rows": [{"x": 1}]}]
+    assert finalized == [True]
+    assert list(stream) == []